@@ -0,0 +1,337 @@
+"""Benchmark harness for the storage layer, the B-tree and end-to-end SQL.
+
+Run from the repository root:
+
+    python benchmarks/bench.py --sizes 1000 10000 --degrees 3 16 --output results.json
+    python benchmarks/bench.py --compare baseline.json --output results.json
+
+Every benchmark runs in a fresh temporary data directory with a fixed random seed and is
+repeated `--repeat` times; the median wall time is what comparisons use.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from btree import BTree  # noqa: E402
+from dbms import Database  # noqa: E402
+
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_DEGREES = [3, 16]
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.10
+SEED = 1234
+
+
+class Benchmark:
+    def __init__(self, name, setup, run, ops, params, teardown=None):
+        self.name = name
+        self.setup = setup        # setup(workdir) -> state passed to run, excluded from timing
+        self.run = run            # run(state)
+        self.teardown = teardown  # teardown(state), excluded from timing
+        self.ops = ops
+        self.params = params
+
+
+def _btree_benchmarks(size, t):
+    params = {'size': size, 't': t}
+    rng = random.Random(SEED)
+    keys = list(range(size))
+    shuffled = keys[:]
+    rng.shuffle(shuffled)
+    probes = [rng.randrange(size) for _ in range(min(size, 1000))]
+
+    def empty_tree(workdir):
+        return BTree(t=t, storage_path=os.path.join(workdir, 'tree'))
+
+    def filled_tree(workdir):
+        btree = empty_tree(workdir)
+        for key in shuffled:
+            btree.insert(key, {'id': key, 'payload': f"row-{key}"})
+        return btree
+
+    def insert_all(order):
+        def run(btree):
+            for key in order:
+                btree.insert(key, {'id': key, 'payload': f"row-{key}"})
+        return run
+
+    def search(btree):
+        for key in probes:
+            btree.search(key)
+
+    def traverse(btree):
+        for _ in btree.iter_items():
+            pass
+
+    def delete(btree):
+        for key in shuffled[:size // 2]:
+            btree.delete(key)
+
+    return [
+        Benchmark('btree.insert_sequential', empty_tree, insert_all(keys), size, params),
+        Benchmark('btree.insert_random', empty_tree, insert_all(shuffled), size, params),
+        Benchmark('btree.search', filled_tree, search, len(probes), params),
+        Benchmark('btree.traverse', filled_tree, traverse, size, params),
+        Benchmark('btree.delete', filled_tree, delete, size // 2, params),
+    ]
+
+
+def _sql_benchmarks(size, t):
+    params = {'size': size, 't': t}
+    rng = random.Random(SEED)
+    keys = list(range(size))
+    rng.shuffle(keys)
+    probes = [rng.randrange(size) for _ in range(min(size, 200))]
+    create = f"CREATE TABLE bench (id, name, score) WITH (fanout={2 * t})"
+
+    def empty_db(workdir):
+        db = Database(data_dir=workdir)
+        db.execute(create)
+        return db
+
+    def empty_lsm_db(workdir):
+        db = Database(data_dir=workdir)
+        db.execute("CREATE TABLE bench (id, name, score) ENGINE=lsm")
+        return db
+
+    def filled_db(workdir):
+        db = empty_db(workdir)
+        for key in keys:
+            db.execute(f"INSERT INTO bench VALUES ({key}, 'name{key % 100}', {key % 1000})")
+        return db
+
+    def run_all(statements):
+        def run(db):
+            for statement in statements:
+                db.execute(statement)
+        return run
+
+    inserts = [f"INSERT INTO bench VALUES ({key}, 'name{key % 100}', {key % 1000})" for key in keys]
+    point_selects = [f"SELECT * FROM bench WHERE id = {key}" for key in probes]
+    updates = [f"UPDATE bench SET score=0 WHERE id = {key}" for key in probes]
+    deletes = [f"DELETE FROM bench WHERE id = {key}" for key in probes]
+    return [
+        Benchmark('sql.create_table', lambda workdir: Database(data_dir=workdir), run_all([create]), 1, params),
+        Benchmark('sql.insert', empty_db, run_all(inserts), size, params),
+        Benchmark('sql.insert_lsm', empty_lsm_db, run_all(inserts), size, params, lambda db: db.close()),
+        Benchmark('sql.select_all', filled_db, run_all(["SELECT * FROM bench"]), size, params),
+        Benchmark('sql.select_point', filled_db, run_all(point_selects), len(probes), params),
+        Benchmark('sql.select_order_by', filled_db, run_all(["SELECT id FROM bench ORDER BY score DESC LIMIT 10"]), size, params),
+        Benchmark('sql.update', filled_db, run_all(updates), len(probes), params),
+        Benchmark('sql.delete', filled_db, run_all(deletes), len(probes), params),
+    ]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _http_benchmarks(size, t):
+    params = {'size': size, 't': t}
+    requests_count = min(size, 500)
+    rng = random.Random(SEED)
+    keys = list(range(size))
+    rng.shuffle(keys)
+    probes = [rng.randrange(size) for _ in range(requests_count)]
+
+    def create_table(workdir, rows=()):
+        # Written before the server starts, which then opens the same data directory
+        db = Database(data_dir=os.path.join(workdir, 'data'))
+        db.execute(f"CREATE TABLE bench (id, name) WITH (fanout={2 * t})")
+        for key in rows:
+            db.execute(f"INSERT INTO bench VALUES ({key}, 'name{key}')")
+        db.close()
+
+    def start_server(workdir):
+        import requests
+        port = _free_port()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'server:app', '--port', str(port), '--log-level', 'warning'],
+            cwd=workdir, env={**os.environ, 'PYTHONPATH': SRC_DIR},
+        )
+        session = requests.Session()
+        url = f"http://127.0.0.1:{port}/execute"
+        deadline = time.time() + 15
+        while True:
+            try:
+                _post(session, url, "SELECT * FROM bench WHERE id = -1")
+                break
+            except requests.exceptions.ConnectionError:
+                if time.time() > deadline or process.poll() is not None:
+                    process.kill()
+                    raise RuntimeError("uvicorn did not start")
+                time.sleep(0.1)
+        return process, session, url
+
+    def empty_server(workdir):
+        create_table(workdir)
+        return start_server(workdir)
+
+    def filled_server(workdir):
+        create_table(workdir, keys)
+        return start_server(workdir)
+
+    def stop_server(state):
+        process, session, _ = state
+        session.close()
+        process.terminate()
+        process.wait()
+
+    def insert_requests(state):
+        _, session, url = state
+        for key in range(requests_count):
+            _post(session, url, f"INSERT INTO bench VALUES ({key}, 'name{key}')")
+
+    def select_requests(state):
+        _, session, url = state
+        for key in probes:
+            _post(session, url, f"SELECT * FROM bench WHERE id = {key}")
+
+    return [
+        Benchmark('http.insert', empty_server, insert_requests, requests_count, params, stop_server),
+        Benchmark('http.select_point', filled_server, select_requests, requests_count, params, stop_server),
+    ]
+
+
+def _post(session, url, command):
+    response = session.post(url, json={'command': command})
+    if response.status_code != 200:
+        raise RuntimeError(f"{command!r} failed with HTTP {response.status_code}: {response.text}")
+    return response
+
+
+def run_benchmark(benchmark, repeat):
+    timings = []
+    for _ in range(repeat):
+        workdir = tempfile.mkdtemp(prefix='simpldb-bench-')
+        try:
+            state = benchmark.setup(workdir)
+            try:
+                start = time.perf_counter()
+                benchmark.run(state)
+                timings.append(time.perf_counter() - start)
+            finally:
+                if benchmark.teardown:
+                    benchmark.teardown(state)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    median = statistics.median(timings)
+    return {
+        'name': benchmark.name,
+        'params': benchmark.params,
+        'ops': benchmark.ops,
+        'seconds': {'min': min(timings), 'median': median, 'mean': statistics.mean(timings)},
+        'ops_per_sec': benchmark.ops / median if median else None,
+    }
+
+
+def collect(sizes, degrees, suites, repeat, name_filter=None, log=print):
+    builders = {'btree': _btree_benchmarks, 'sql': _sql_benchmarks, 'http': _http_benchmarks}
+    results = []
+    for suite in suites:
+        for size in sizes:
+            for t in degrees:
+                for benchmark in builders[suite](size, t):
+                    if name_filter and name_filter not in benchmark.name:
+                        continue
+                    result = run_benchmark(benchmark, repeat)
+                    log(f"{result['name']:<28} size={size:<8} t={t:<4} "
+                        f"median={result['seconds']['median'] * 1000:10.2f} ms  "
+                        f"{result['ops_per_sec'] or 0:12.1f} ops/s")
+                    results.append(result)
+    return {'meta': _metadata(repeat), 'results': results}
+
+
+def _metadata(repeat):
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=SRC_DIR, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'commit': commit,
+        'repeat': repeat,
+        'seed': SEED,
+    }
+
+
+def _result_key(result):
+    return (result['name'], tuple(sorted(result['params'].items())))
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Pairs up results by name and parameters and flags median slowdowns beyond `threshold`."""
+    baseline_results = {_result_key(result): result for result in baseline['results']}
+    comparisons = []
+    for result in current['results']:
+        previous = baseline_results.get(_result_key(result))
+        if previous is None:
+            continue
+        before = previous['seconds']['median']
+        after = result['seconds']['median']
+        change = (after - before) / before if before else 0.0
+        comparisons.append({
+            'name': result['name'],
+            'params': result['params'],
+            'baseline_median': before,
+            'median': after,
+            'change': change,
+            'regression': change > threshold,
+        })
+    return comparisons
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='table sizes (rows)')
+    parser.add_argument('--degrees', type=int, nargs='+', default=DEFAULT_DEGREES, help='B-tree minimum degrees t')
+    parser.add_argument('--suites', nargs='+', choices=['btree', 'sql', 'http'], default=['btree', 'sql'])
+    parser.add_argument('--filter', help='only run benchmarks whose name contains this string')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='compare against a saved results file')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative median slowdown that counts as a regression (default 0.10)')
+    args = parser.parse_args(argv)
+
+    current = collect(args.sizes, args.degrees, args.suites, args.repeat, args.filter)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        comparisons = compare(baseline, current, args.threshold)
+        regressions = [c for c in comparisons if c['regression']]
+        for c in comparisons:
+            flag = 'REGRESSION' if c['regression'] else 'ok'
+            print(f"{c['name']:<28} {json.dumps(c['params']):<28} {c['change'] * 100:+8.1f}%  {flag}")
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold * 100:.0f}%")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
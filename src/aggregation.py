@@ -0,0 +1,147 @@
+AGGREGATE_FUNCTIONS = ('count', 'sum', 'min', 'max', 'avg')
+
+
+class Aggregator:
+    """Computes the aggregates of a SELECT list per GROUP BY group.
+
+    Each group keeps one partial state per aggregate, and the states of two aggregators over
+    disjoint sets of rows combine with `merge`, so separate scans (e.g. of different subtrees)
+    can each aggregate their own rows and be merged afterwards.
+    """
+
+    def __init__(self, items, group_by=None):
+        self.items = list(items)  # Group columns and Aggregate nodes, in output order
+        self.group_by = list(group_by or [])
+        self.aggregates = [item for item in self.items if not isinstance(item, str)]
+        self.groups = {}  # group values -> list of partial states, one per aggregate
+
+    def empty(self):
+        """Returns an aggregator for the same SELECT list that has seen no rows."""
+        return Aggregator(self.items, self.group_by)
+
+    def group_of(self, row):
+        return tuple(row[column] for column in self.group_by)
+
+    def add(self, row):
+        group = self.group_of(row)
+        states = self.groups.get(group)
+        if states is None:
+            states = initial_states(self.aggregates)
+        self.groups[group] = add_row(self.aggregates, states, row)
+
+    def extend(self, rows):
+        for row in rows:
+            self.add(row)
+        return self
+
+    def merge(self, other):
+        for group, other_states in other.groups.items():
+            states = self.groups.get(group)
+            if states is None:
+                self.groups[group] = other_states
+            else:
+                self.groups[group] = [
+                    _combine(aggregate, a, b) for aggregate, a, b in zip(self.aggregates, states, other_states)
+                ]
+        return self
+
+    def results(self):
+        """Returns one row per group, ordered by the group values."""
+        groups = dict(self.groups)
+        if not groups and not self.group_by:
+            # Aggregating no rows without GROUP BY still yields a single row
+            groups[()] = initial_states(self.aggregates)
+        try:
+            ordered = sorted(groups.items())
+        except TypeError:
+            ordered = list(groups.items())
+        return [self.output_row(group, states) for group, states in ordered]
+
+    def output_row(self, group, states):
+        values = dict(zip(self.group_by, group))
+        values.update((aggregate.label, _final(aggregate, state)) for aggregate, state in zip(self.aggregates, states))
+        return {output_name(item): values[output_name(item)] for item in self.items}
+
+
+def output_name(item):
+    """Returns the result column name of a SELECT list item: the column, or e.g. 'count(*)'."""
+    return item if isinstance(item, str) else item.label
+
+
+def initial_states(aggregates):
+    return [_initial(aggregate) for aggregate in aggregates]
+
+
+def add_row(aggregates, states, row):
+    """Returns the partial states after adding `row` to the rows they summarize."""
+    return [_step(aggregate, state, _value(aggregate, row)) for aggregate, state in zip(aggregates, states)]
+
+
+def remove_row(aggregates, states, row):
+    """Returns the partial states after removing `row`, or None when a MIN or MAX loses its
+    current value and has to be recomputed from the remaining rows.
+    """
+    updated = []
+    for aggregate, state in zip(aggregates, states):
+        value = _value(aggregate, row)
+        function = aggregate.function
+        if function == 'count':
+            updated.append(state - (aggregate.column == '*' or value is not None))
+        elif value is None:
+            updated.append(state)
+        elif function in ('sum', 'avg'):
+            updated.append((state[0] - value, state[1] - 1))
+        elif value == state:
+            return None
+        else:
+            updated.append(state)
+    return updated
+
+
+def _value(aggregate, row):
+    return None if aggregate.column == '*' else row[aggregate.column]
+
+
+def _initial(aggregate):
+    if aggregate.function == 'count':
+        return 0
+    if aggregate.function in ('sum', 'avg'):
+        # Running total and the number of values in it
+        return (0, 0)
+    return None
+
+
+def _step(aggregate, state, value):
+    function = aggregate.function
+    if function == 'count':
+        return state + (aggregate.column == '*' or value is not None)
+    if value is None:
+        return state
+    if function in ('sum', 'avg'):
+        return state[0] + value, state[1] + 1
+    if state is None:
+        return value
+    if function == 'min':
+        return min(state, value)
+    return max(state, value)
+
+
+def _combine(aggregate, a, b):
+    function = aggregate.function
+    if function == 'count':
+        return a + b
+    if function in ('sum', 'avg'):
+        return a[0] + b[0], a[1] + b[1]
+    if a is None or b is None:
+        return b if a is None else a
+    if function == 'min':
+        return min(a, b)
+    return max(a, b)
+
+
+def _final(aggregate, state):
+    if aggregate.function == 'sum':
+        return state[0] if state[1] else None
+    if aggregate.function == 'avg':
+        return state[0] / state[1] if state[1] else None
+    return state
@@ -2,9 +2,30 @@ class SQLStatement:
     pass
 
 class CreateTableStatement(SQLStatement):
-    def __init__(self, table_name, columns):
+    def __init__(self, table_name, columns, options=None, partition_by=None):
         self.table_name = table_name
         self.columns = columns
+        self.options = options or {}
+        self.partition_by = partition_by
+
+class CreateViewStatement(SQLStatement):
+    def __init__(self, view_name, select, select_sql=None):
+        self.view_name = view_name
+        self.select = select  # SelectStatement the view materializes
+        self.select_sql = select_sql  # Text of that SELECT
+
+class CreateIndexStatement(SQLStatement):
+    def __init__(self, index_name, table_name, column, index_type='hash'):
+        self.index_name = index_name
+        self.table_name = table_name
+        self.column = column
+        self.index_type = index_type
+
+class AlterTableStatement(SQLStatement):
+    def __init__(self, table_name, add_partition=None, drop_partition=None):
+        self.table_name = table_name
+        self.add_partition = add_partition  # PartitionDefinition
+        self.drop_partition = drop_partition  # Partition name
 
 class InsertStatement(SQLStatement):
     def __init__(self, table_name, values):
@@ -12,9 +33,13 @@ class InsertStatement(SQLStatement):
         self.values = values
 
 class SelectStatement(SQLStatement):
-    def __init__(self, columns, table_name):
+    def __init__(self, columns, table_name, where_clause=None, order_by=None, limit=None, group_by=None):
         self.columns = columns
         self.table_name = table_name
+        self.where_clause = where_clause
+        self.order_by = order_by
+        self.limit = limit
+        self.group_by = group_by
 
 class UpdateStatement(SQLStatement):
     def __init__(self, table_name, set_clause, where_clause):
@@ -27,12 +52,52 @@ class DeleteStatement(SQLStatement):
         self.table_name = table_name
         self.where_clause = where_clause
 
+class AnalyzeStatement(SQLStatement):
+    def __init__(self, table_name):
+        self.table_name = table_name
+
+class VacuumStatement(SQLStatement):
+    def __init__(self, table_name):
+        self.table_name = table_name
+
+class ExplainStatement(SQLStatement):
+    def __init__(self, statement, analyze=False):
+        self.statement = statement
+        self.analyze = analyze
+
 class SetClause:
     def __init__(self, column, value):
         self.column = column
         self.value = value
 
 class WhereClause:
-    def __init__(self, column, value):
+    def __init__(self, column, value, operator='='):
         self.column = column
         self.value = value
+        self.operator = operator
+
+class PartitionClause:
+    def __init__(self, method, column, partitions=None, count=None):
+        self.method = method
+        self.column = column
+        self.partitions = partitions  # PartitionDefinitions of a range partitioning
+        self.count = count  # Number of hash partitions
+
+class PartitionDefinition:
+    def __init__(self, name, bound):
+        self.name = name
+        self.bound = bound  # Exclusive upper bound of the partition's values
+
+class Aggregate:
+    def __init__(self, function, column):
+        self.function = function
+        self.column = column  # '*' for COUNT(*)
+
+    @property
+    def label(self):
+        return f"{self.function}({self.column})"
+
+class OrderByClause:
+    def __init__(self, column, descending=False):
+        self.column = column
+        self.descending = descending
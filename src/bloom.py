@@ -0,0 +1,236 @@
+import hashlib
+import math
+import os
+import pickle
+import struct
+import weakref
+
+DEFAULT_ERROR_RATE = 0.01
+BLOOM_FILE = 'bloom.pkl'
+LOG_FILE = 'bloom.log'
+LENGTH = struct.Struct('<I')
+# Keys the log holds before it may be rolled into a new snapshot
+LOG_MIN_KEYS = 1024
+
+
+def key_digest(key):
+    """Hashes a key to a stable 128-bit integer; keys that compare equal (1 and 1.0) hash alike."""
+    if isinstance(key, float) and key.is_integer():
+        key = int(key)
+    tag = 'num' if isinstance(key, (int, float)) else type(key).__name__
+    data = f"{tag}:{key!r}".encode()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=16).digest(), 'little')
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for `capacity` keys at the given false positive rate."""
+
+    def __init__(self, capacity, error_rate=DEFAULT_ERROR_RATE):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: derive every probe position from the two halves of one digest
+        digest = key_digest(key)
+        h1, h2 = digest & 0xFFFFFFFFFFFFFFFF, digest >> 64 | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class ScalableBloomFilter:
+    """Bloom filter that grows with its key count.
+
+    Whenever the newest filter is full another one, `growth` times larger and with a tighter
+    error rate, is added, so the combined false positive rate stays below `error_rate`.
+    """
+
+    def __init__(self, initial_capacity=1024, error_rate=DEFAULT_ERROR_RATE, growth=2, tightening=0.5):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = []
+
+    def add(self, key):
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            n = len(self.filters)
+            capacity = self.initial_capacity * self.growth ** n
+            error_rate = self.error_rate * (1 - self.tightening) * self.tightening ** n
+            self.filters.append(BloomFilter(capacity, error_rate))
+        self.filters[-1].add(key)
+
+    def __contains__(self, key):
+        return any(key in bloom for bloom in self.filters)
+
+    @property
+    def count(self):
+        return sum(bloom.count for bloom in self.filters)
+
+
+class KeyFilter:
+    """The persistent Bloom filter over the keys of one table or index.
+
+    Every new key is appended to `bloom.log` before it is added to the filter. `bloom.pkl`
+    holds a snapshot of the filter and the id of the log that follows it. On close, and
+    whenever the log holds as many keys as the snapshot, the filter is saved as a new snapshot
+    with a new empty log, so the log stays bounded and opening replays only the keys added
+    since the last snapshot; storage that was not closed cleanly loses no keys. Handles on the
+    same storage in one process (e.g. the tables of two Database objects on one directory)
+    read each other's appends before they trust a negative answer, and skip keys the filter
+    already holds, so they all build the same filter. Deleted keys stay in the filter until
+    `rebuild`.
+    """
+
+    def __init__(self, storage_path, keys):
+        self.path = os.path.join(storage_path, BLOOM_FILE)
+        self.log_path = os.path.join(storage_path, LOG_FILE)
+        self._keys = keys
+        self._log = None
+        self._reader = None
+        self._tail = _LogTail.of(self.log_path)
+        if os.path.exists(self.path) and os.path.exists(self.log_path):
+            self._load()
+        else:
+            self.rebuild(keys())
+
+    def add(self, key):
+        """Adds `key` and returns True, or returns False if the filter may already hold it."""
+        if key in self:
+            return False
+        data = pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)
+        self._log.write(LENGTH.pack(len(data)) + data)
+        self._log.flush()
+        self.bloom.add(key)
+        self._offset = self._log.tell()
+        self._logged += 1
+        self._tail.log_id, self._tail.size = self._log_id, self._offset
+        if self._logged >= LOG_MIN_KEYS and 2 * self._logged >= self.bloom.count:
+            self.save()
+        return True
+
+    def __contains__(self, key):
+        if key in self.bloom:
+            return True
+        if self._tail.log_id == self._log_id and self._tail.size == self._offset:
+            # No other handle in this process appended since this one last read the log
+            return False
+        self._catch_up()
+        return key in self.bloom
+
+    def close(self):
+        if self._log is None:
+            return
+        self._catch_up()
+        if self._logged:
+            self.save()
+        self._close_log()
+
+    def rebuild(self, keys):
+        self.bloom = ScalableBloomFilter()
+        for key in keys:
+            self.bloom.add(key)
+        self.save()
+
+    def save(self):
+        """Saves the filter as a new snapshot followed by a new, empty log."""
+        # The log is replaced rather than truncated, so other handles see a new file and reload
+        temp_log = self.log_path + '.tmp'
+        open(temp_log, 'wb').close()
+        log_id = os.stat(temp_log).st_ino
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump((self.bloom, log_id), f)
+        os.replace(temp_path, self.path)
+        os.replace(temp_log, self.log_path)
+        self._open_log()
+        self._offset = self._logged = 0
+        self._tail.log_id, self._tail.size = self._log_id, 0
+
+    def _load(self):
+        with open(self.path, 'rb') as f:
+            saved = pickle.load(f)
+        self._open_log()
+        # A snapshot saved by a crashed `save` does not match the log that follows it
+        if not isinstance(saved, tuple) or len(saved) != 2 or saved[1] != self._log_id:
+            self.rebuild(self._keys())
+            return
+        self.bloom = saved[0]
+        self._offset = self._logged = 0
+        self._catch_up()
+        if self._tail.log_id != self._log_id:
+            self._tail.log_id, self._tail.size = self._log_id, self._offset
+        if os.fstat(self._reader.fileno()).st_size > self._offset:
+            # Drop a key torn by a crash mid-write, which later appends would otherwise follow
+            os.truncate(self.log_path, self._offset)
+
+    def _open_log(self):
+        self._close_log()
+        self._log = open(self.log_path, 'ab')
+        self._reader = open(self.log_path, 'rb')
+        self._log_id = os.fstat(self._reader.fileno()).st_ino
+
+    def _close_log(self):
+        if self._log is not None:
+            self._log.close()
+            self._reader.close()
+            self._log = self._reader = None
+
+    def _catch_up(self):
+        """Adds the keys appended to the log since this handle last read it."""
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._log_id:
+            self._load()
+            return
+        if stat.st_size <= self._offset:
+            return
+        self._reader.seek(self._offset)
+        data = self._reader.read(stat.st_size - self._offset)
+        offset = 0
+        while offset + LENGTH.size <= len(data):
+            length, = LENGTH.unpack_from(data, offset)
+            end = offset + LENGTH.size + length
+            if end > len(data):
+                # Torn by a crash mid-write
+                break
+            key = pickle.loads(data[offset + LENGTH.size:end])
+            if key not in self.bloom:
+                self.bloom.add(key)
+            self._logged += 1
+            offset = end
+        self._offset += offset
+        if self._tail.log_id == self._log_id:
+            self._tail.size = max(self._tail.size, self._offset)
+
+
+class _LogTail:
+    """The end of a key filter's log as last written by the handles of this process."""
+
+    _tails = weakref.WeakValueDictionary()
+
+    def __init__(self):
+        self.log_id = None
+        self.size = 0
+
+    @classmethod
+    def of(cls, log_path):
+        """Returns the tail shared by every handle on the log at `log_path`."""
+        path = os.path.abspath(log_path)
+        tail = cls._tails.get(path)
+        if tail is None:
+            tail = cls._tails[path] = cls()
+        return tail
@@ -1,7 +1,32 @@
 import pickle
 import os
 import math
-from node_manager import NodeManager
+from bisect import bisect_left
+from collections import Counter
+from operator import itemgetter
+from node_manager import NodeManager, FILE_MODE, MMAP_MODE
+from page_codecs import get_codec
+from bloom import KeyFilter
+
+DEFAULT_PAGE_SIZE = 4096
+# Rough pickled sizes used to estimate how many rows fit in a page before any data exists
+ESTIMATED_ROW_OVERHEAD = 32
+ESTIMATED_VALUE_SIZE = 16
+MIN_DEGREE = 2
+# Share of keys kept in the left node when a node on the rightmost path splits during appends
+APPEND_SPLIT_RATIO = 0.9
+# Share of each node filled by vacuum, leaving room for some inserts before nodes split again
+VACUUM_FILL_FACTOR = 0.9
+
+
+def estimate_row_size(columns):
+    return ESTIMATED_ROW_OVERHEAD + sum(len(column) + ESTIMATED_VALUE_SIZE for column in columns)
+
+
+def degree_for_page_size(page_size, row_size):
+    """Returns the largest minimum degree t whose full nodes (2t - 1 rows) fit in `page_size` bytes."""
+    rows_per_page = page_size // max(1, row_size)
+    return max(MIN_DEGREE, (rows_per_page + 1) // 2)
 
 class BTreeNode:
     def __init__(self, t, leaf=True, node_id=None):
@@ -11,55 +36,80 @@ class BTreeNode:
         self.children = []  # List of child nodes
         self.node_id = node_id # Unique identifier for disk storage
 
-    def insert_non_full(self, key, value, btree):
-        i = len(self.keys) - 1
+    @classmethod
+    def from_record(cls, t, record, node_id):
+        leaf, keys, children = record
+        node = cls(t, leaf=leaf, node_id=node_id)
+        node.keys = keys
+        node.children = children
+        return node
+
+    def find(self, key):
+        """Binary-searches for the position of the first key that is not less than `key`."""
+        return bisect_left(self.keys, key, key=itemgetter(0))
+
+    def insert_non_full(self, key, value, btree, append=False, new=False):
+        """Inserts into the subtree rooted here and returns the leaf (or node) that took the key.
+
+        With `new`, the key is known to be absent and no node is checked for it.
+        """
+        i = self.find(key)
+        if not new and i < len(self.keys) and self.keys[i][0] == key:
+            self.keys[i] = (key, value)
+            btree.node_manager.update_node(self)
+            return self
         if self.leaf:
-            for idx, (k, _) in enumerate(self.keys):
-                if k == key:
-                    self.keys[idx] = (key, value)
-                    btree.node_manager.update_node(self)
-                    return
-            self.keys.append((key, value))
-            self.keys.sort(key=lambda x: x[0])
+            self.keys.insert(i, (key, value))
             btree.node_manager.update_node(self)
-        else:
-            while i >= 0 and key < self.keys[i][0]:
-                i -= 1
-            i += 1
-            child_id = self.children[i]
-            child = btree.node_manager.load_node(child_id)
-            if len(child.keys) == (2 * btree.t) - 1:
-                self.split_child(i, btree)
-                if key > self.keys[i][0]:
-                    i += 1
-                child_id = self.children[i]
-                child = btree.node_manager.load_node(child_id)
-            child.insert_non_full(key, value, btree)
+            return self
+        child = btree.node_manager.load_node(self.children[i])
+        if len(child.keys) == (2 * btree.t) - 1:
+            child, right = self.split_child(i, btree, append, child)
+            if not new and key == self.keys[i][0]:
+                self.keys[i] = (key, value)
+                btree.node_manager.update_node(self)
+                return self
+            if key > self.keys[i][0]:
+                child = right
+        return child.insert_non_full(key, value, btree, append, new)
+
+    def split_child(self, i, btree, append=False, y=None):
+        """Splits the full child at index i and returns the two halves.
 
-    def split_child(self, i, btree):
+        Appends split so that the left node keeps ~append_split_ratio of the keys: the
+        left node is never written to again, so leaving it half empty would waste the page.
+        """
         t = btree.t
-        y_id = self.children[i]
-        y = btree.node_manager.load_node(y_id)
+        btree.stats['splits'] += 1
+        if y is None:
+            y = btree.node_manager.load_node(self.children[i])
         z = BTreeNode(t, leaf=y.leaf)
 
-        # z gets y's keys from index t onwards
-        z.keys = y.keys[t:]
-        y.keys = y.keys[:t]
+        n = len(y.keys)
+        mid = t - 1
+        if append:
+            mid = max(t - 1, min(n - 2, int(n * btree.append_split_ratio)))
+
+        # z gets the keys after the median, which moves up into self.keys
+        z.keys = y.keys[mid + 1:]
+        median = y.keys[mid]
+        y.keys = y.keys[:mid]
 
         if not y.leaf:
-            z.children = y.children[t:]
-            y.children = y.children[:t]
+            z.children = y.children[mid + 1:]
+            y.children = y.children[:mid + 1]
 
         # Insert z into self.children
         z_id = btree.node_manager.save_node(z)
+        if y.node_id == btree._rightmost_leaf_id:
+            # The largest keys moved to the new right half
+            btree._rightmost_leaf_id = z_id
         self.children.insert(i + 1, z_id)
-
-        # Move y's last key up to self.keys
-        self.keys.insert(i, y.keys.pop(-1))
+        self.keys.insert(i, median)
 
         btree.node_manager.update_node(y)
         btree.node_manager.update_node(self)
-        btree.node_manager.update_node(z)
+        return y, z
 
     def traverse(self, btree, results=None):
         if results is None:
@@ -101,11 +151,24 @@ class BTreeNode:
 
 
 class BTree:
-    def __init__(self, t=3, storage_path='data/btree'):
+    def __init__(self, t=3, storage_path='data/btree', append_split_ratio=APPEND_SPLIT_RATIO, read_mode=FILE_MODE,
+                 compression=None):
         self.t = t
-        self.node_manager = NodeManager(storage_path)
+        self.append_split_ratio = append_split_ratio
+        self.node_manager = NodeManager(
+            storage_path, read_mode=read_mode, node_factory=self._node_from_record, codec=get_codec(compression)
+        )
         self.storage_path = storage_path
         self.metadata_file = os.path.join(self.storage_path, 'metadata.pkl')
+        # Cumulative operation counters: inserts, appends, deletes, searches, scans, splits, bloom_negatives
+        self.stats = Counter()
+        self.io_stats = self.node_manager.stats
+        # Readers in progress per root id, and the nodes of replaced roots kept until their readers finish
+        self._pins = Counter()
+        self._retired = {}
+        # Cached id of the rightmost leaf and the largest key, used to append without descending
+        self._rightmost_leaf_id = None
+        self._max_key = None
 
         os.makedirs(self.storage_path, exist_ok=True)
 
@@ -117,90 +180,462 @@ class BTree:
             root = BTreeNode(self.t, leaf=True)
             self.root_id = self.node_manager.save_node(root)
             self._save_metadata()
+        # Answers lookups of absent keys without loading any node
+        self.key_filter = KeyFilter(self.storage_path, self._keys)
 
     def insert(self, key, value):
-        root = self.node_manager.load_node(self.root_id)
-        if len(root.keys) == (2 * self.t - 1): # TODO: sometimes len(keys) still exceeds this
+        self.stats['inserts'] += 1
+        new = self.key_filter.add(key)
+        leaf = self._rightmost_leaf() if self._rightmost_leaf_id is None else None
+        append = self._max_key is None or key > self._max_key
+        if append and leaf is None:
+            leaf = self._cached_rightmost_leaf()
+            append = self._max_key is None or key > self._max_key
+        if append and len(leaf.keys) < 2 * self.t - 1:
+            # Keys beyond the current maximum always belong at the end of the rightmost leaf
+            self.stats['appends'] += 1
+            leaf.keys.append((key, value))
+            self.node_manager.update_node(leaf)
+            self._max_key = key
+            return
+
+        if leaf is not None and leaf.node_id == self.root_id:
+            root = leaf
+        else:
+            root = self.node_manager.load_node(self.root_id)
+        if len(root.keys) == (2 * self.t - 1):
             new_root = BTreeNode(self.t, leaf=False)
             new_root.children.append(root.node_id)
-            new_root.split_child(0, self)
             self.root_id = self.node_manager.save_node(new_root)
             self._save_metadata()
-            new_root.insert_non_full(key, value, self)
+            new_root.split_child(0, self, append, root)
+            target = new_root.insert_non_full(key, value, self, append, new)
         else:
-            root.insert_non_full(key, value, self)
+            target = root.insert_non_full(key, value, self, append, new)
+
+        if append and target.leaf:
+            self._rightmost_leaf_id = target.node_id
+            self._max_key = key
+
+    def _cached_rightmost_leaf(self):
+        """Loads the cached rightmost leaf, or finds it again if another handle has changed it."""
+        try:
+            leaf = self.node_manager.load_node(self._rightmost_leaf_id)
+        except FileNotFoundError:
+            return self._rightmost_leaf()
+        if not leaf.leaf or (leaf.keys[-1][0] if leaf.keys else None) != self._max_key:
+            return self._rightmost_leaf()
+        return leaf
+
+    def _rightmost_leaf(self):
+        node = self.node_manager.load_node(self.root_id)
+        while not node.leaf:
+            node = self.node_manager.load_node(node.children[-1])
+        self._rightmost_leaf_id = node.node_id
+        self._max_key = node.keys[-1][0] if node.keys else None
+        return node
 
     def delete(self, key):
+        self.stats['deletes'] += 1
+        if key == self._max_key:
+            # The next append finds the new largest key
+            self._rightmost_leaf_id = None
         root = self.node_manager.load_node(self.root_id)
         self._delete_recursive(root, key)
 
         if len(root.keys) == 0 and not root.leaf:
+            # The root's last two children were merged, so the tree loses a level
             self.root_id = root.children[0]
-            self.node_manager.update_node(root) 
-            self.node_manager.delete_node(root.node_id)
             self._save_metadata()
+            self.node_manager.delete_node(root.node_id)
 
     def search(self, key):
+        self.stats['searches'] += 1
+        if key not in self.key_filter:
+            self.stats['bloom_negatives'] += 1
+            return None
         root = self.node_manager.load_node(self.root_id)
         return root.search(key, self)
 
+    async def search_async(self, key):
+        """Awaitable form of `search` that reads nodes with `load_record_async`."""
+        self.stats['searches'] += 1
+        if key not in self.key_filter:
+            self.stats['bloom_negatives'] += 1
+            return None
+        root_id = self.pin()
+        try:
+            leaf, keys, children = await self.node_manager.load_record_async(root_id)
+            while True:
+                i = bisect_left(keys, key, key=itemgetter(0))
+                if i < len(keys) and keys[i][0] == key:
+                    return keys[i][1]
+                if leaf:
+                    return None
+                leaf, keys, children = await self.node_manager.load_record_async(children[i])
+        finally:
+            self.unpin(root_id)
+
     def traverse(self):
+        self.stats['scans'] += 1
         root = self.node_manager.load_node(self.root_id)
         return root.traverse(self)
 
+    def iter_items(self, reverse=False):
+        """Lazily yields (key, value) pairs in key order, loading one path of nodes at a time."""
+        return self.iter_range(reverse=reverse)
+
+    def iter_range(self, low=None, high=None, low_inclusive=True, high_inclusive=True, reverse=False):
+        """Lazily yields the (key, value) pairs whose keys fall between `low` and `high`.
+
+        A bound of None leaves that side open. Subtrees outside the range are never loaded,
+        and nodes are read as raw records rather than BTreeNode objects.
+        """
+        self.stats['scans'] += 1
+        root_id = self.pin()
+        try:
+            root = self.node_manager.load_record(root_id)
+            yield from self._scan(root, low, high, low_inclusive, high_inclusive, reverse)
+        finally:
+            self.unpin(root_id)
+
+    def pin(self):
+        """Returns the current root id and keeps its nodes from being freed until `unpin`."""
+        self._pins[self.root_id] += 1
+        return self.root_id
+
+    def unpin(self, root_id):
+        self._pins[root_id] -= 1
+        if self._pins[root_id] <= 0:
+            del self._pins[root_id]
+            for node_id in self._retired.pop(root_id, ()):
+                self.node_manager.delete_node(node_id)
+
+    async def iter_range_async(self, low=None, high=None, low_inclusive=True, high_inclusive=True, reverse=False):
+        """Async generator form of `iter_range` that reads nodes with `load_record_async`."""
+        self.stats['scans'] += 1
+        root_id = self.pin()
+        try:
+            root = await self.node_manager.load_record_async(root_id)
+            async for item in scan_subtree_async(
+                self.node_manager.load_record_async, root, low, high, low_inclusive, high_inclusive, reverse
+            ):
+                yield item
+        finally:
+            self.unpin(root_id)
+
+    def split_range(self, pieces, low=None, high=None, low_inclusive=True, high_inclusive=True):
+        """Splits a range scan into about `pieces` independently scannable parts, in key order.
+
+        Each part is either ('subtree', node_id), whose keys in the range are read with
+        `scan_subtree`, or ('item', (key, value)) for a separator key of the nodes that were
+        expanded. Nodes are expanded level by level from the root until there are enough
+        subtrees or only leaves are left.
+        """
+        self.stats['scans'] += 1
+        parts = [('subtree', self.root_id)]
+        while sum(kind == 'subtree' for kind, _ in parts) < pieces:
+            expanded = []
+            for kind, value in parts:
+                if kind != 'subtree':
+                    expanded.append((kind, value))
+                    continue
+                leaf, keys, children = self.node_manager.load_record(value)
+                if leaf:
+                    return parts
+                for i in range(len(keys) + 1):
+                    if _child_in_range(keys, i, low, high):
+                        expanded.append(('subtree', children[i]))
+                    if i < len(keys) and _in_range(keys[i][0], low, high, low_inclusive, high_inclusive):
+                        expanded.append(('item', keys[i]))
+            parts = expanded
+        return parts
+
+    def _scan(self, record, low, high, low_inclusive, high_inclusive, reverse):
+        return scan_subtree(self.node_manager.load_record, record, low, high, low_inclusive, high_inclusive, reverse)
+
+    def rebuild_key_filter(self):
+        """Rebuilds the key filter from the tree, dropping the keys deleted since it was built."""
+        self.key_filter.rebuild(self._keys())
+
+    def vacuum(self, fill_factor=VACUUM_FILL_FACTOR):
+        """Rebuilds the tree into packed nodes laid out in key order and drops unreachable nodes.
+
+        The new tree is written next to the old one from a scan of the old one, so only one
+        node per level is held in memory. Readers keep using the old root until the metadata
+        file is atomically replaced; the old nodes are deleted (and their ids reused) once the
+        last reader pinned to the old root finishes. New nodes take the ids freed by earlier
+        deletes first. Returns a summary of the rebuild.
+        """
+        old_ids = set()
+        rows = 0
+        level = [self.root_id]
+        while level:
+            old_ids.update(level)
+            records = [self.node_manager.load_record(node_id) for node_id in level]
+            rows += sum(len(keys) for _, keys, _ in records)
+            level = [child for _, _, children in records for child in children]
+        # Nodes no tree references any more, e.g. left behind by an interrupted split or vacuum
+        retired = set().union(*self._retired.values())
+        orphans = self.node_manager.node_ids() - old_ids - retired
+        for node_id in orphans:
+            self.node_manager.delete_node(node_id)
+
+        per_node = max(self.t - 1, min(2 * self.t - 1, int((2 * self.t - 1) * fill_factor)))
+        # Entries per level from the leaves up: the separators of a level are the entries of the next
+        sizes = [rows]
+        while _PackedLevel.node_count(sizes[-1], per_node) > 1:
+            sizes.append(_PackedLevel.node_count(sizes[-1], per_node) - 1)
+        leaves = None
+        for depth in range(len(sizes) - 1, -1, -1):
+            leaves = _PackedLevel(self, sizes[depth], per_node, leaves, leaf=depth == 0)
+        for item in self.iter_items():
+            leaves.add_entry(item)
+        if rows == 0:
+            leaves.emit()
+        top = leaves
+        while top.parent is not None:
+            top = top.parent
+
+        old_root = self.root_id
+        self.root_id = top.root_id
+        self._save_metadata()
+        if self._pins[old_root]:
+            self._retired[old_root] = old_ids
+        else:
+            for node_id in old_ids:
+                self.node_manager.delete_node(node_id)
+        self._rightmost_leaf_id = None
+        self.rebuild_key_filter()
+        if self.node_manager.read_mode == MMAP_MODE:
+            self.node_manager.compact()
+        return {
+            'rows': rows,
+            'nodes_before': len(old_ids),
+            'nodes_after': len(self.node_manager.node_ids()) - sum(map(len, self._retired.values())),
+            'orphans_removed': len(orphans),
+            'height': len(sizes),
+        }
+
+    def close(self):
+        self.key_filter.close()
+        self.node_manager.close()
+
+    def _keys(self):
+        root = self.node_manager.load_record(self.root_id)
+        return (key for key, _ in self._scan(root, None, None, True, True, False))
+
+    def _node_from_record(self, record, node_id):
+        return BTreeNode.from_record(self.t, record, node_id)
+
     def _save_metadata(self):
-        with open(self.metadata_file, 'wb') as f:
+        # The nodes under the new root reach the disk first, and the root id is written to a
+        # temporary file and renamed, so it is replaced atomically
+        self.node_manager.sync()
+        temp_path = self.metadata_file + '.tmp'
+        with open(temp_path, 'wb') as f:
             pickle.dump({'root_id': self.root_id}, f)
+        os.replace(temp_path, self.metadata_file)
 
     def _delete_recursive(self, node, key):
-        for i, (k, _) in enumerate(node.keys):
-            if k == key:
+        """Deletes `key` from the subtree rooted at `node`, returning whether it was found.
+
+        Each child is topped up to at least t keys before the descent, by borrowing from or
+        merging with a sibling, so the key can be removed without leaving a node below t - 1
+        keys and no node has to be fixed up on the way back.
+        """
+        i = node.find(key)
+        found = i < len(node.keys) and node.keys[i][0] == key
+        if node.leaf:
+            if found:
                 node.keys.pop(i)
                 self.node_manager.update_node(node)
+            return found
+        if not found:
+            return self._delete_recursive(self._fill_child(node, i), key)
 
-                if len(node.keys) == 0:
-                    if node.leaf:
-                        return True
-                    else:
-                        self._promote_child(node, 0)
-                        return True
-                return True
+        left = self.node_manager.load_node(node.children[i])
+        if len(left.keys) >= self.t:
+            # Replace the key with its predecessor and delete that from the left subtree
+            node.keys[i] = self._edge_leaf(left, rightmost=True).keys[-1]
+            self.node_manager.update_node(node)
+            return self._delete_recursive(left, node.keys[i][0])
+        right = self.node_manager.load_node(node.children[i + 1])
+        if len(right.keys) >= self.t:
+            node.keys[i] = self._edge_leaf(right, rightmost=False).keys[0]
+            self.node_manager.update_node(node)
+            return self._delete_recursive(right, node.keys[i][0])
+        return self._delete_recursive(self._merge_children(node, i, left, right), key)
 
-        if node.leaf:
-            return False
-
-        for i in range(len(node.keys)):
-            if key < node.keys[i][0]:
-                child_id = node.children[i]
-                child_node = self.node_manager.load_node(child_id)
-                if self._delete_recursive(child_node, key):
-                    if len(child_node.keys) == 0:
-                        self._promote_child(node, i)
-                    return True
-                break
-        else:
-            child_id = node.children[-1]
-            child_node = self.node_manager.load_node(child_id)
-            if self._delete_recursive(child_node, key):
-                if len(child_node.keys) == 0:
-                    self._promote_child(node, len(node.keys))
-                return True
+    def _fill_child(self, node, i):
+        """Returns child i of `node`, after moving a key into it if it holds fewer than t keys."""
+        child = self.node_manager.load_node(node.children[i])
+        if len(child.keys) >= self.t:
+            return child
+        left = self.node_manager.load_node(node.children[i - 1]) if i > 0 else None
+        if left is not None and len(left.keys) >= self.t:
+            # Rotate through the parent: its separator moves down, the left sibling's last key moves up
+            child.keys.insert(0, node.keys[i - 1])
+            node.keys[i - 1] = left.keys.pop()
+            if not child.leaf:
+                child.children.insert(0, left.children.pop())
+            self._update_nodes(left, child, node)
+            return child
+        right = self.node_manager.load_node(node.children[i + 1]) if i + 1 < len(node.children) else None
+        if right is not None and len(right.keys) >= self.t:
+            child.keys.append(node.keys[i])
+            node.keys[i] = right.keys.pop(0)
+            if not child.leaf:
+                child.children.append(right.children.pop(0))
+            self._update_nodes(right, child, node)
+            return child
+        if left is not None:
+            return self._merge_children(node, i - 1, left, child)
+        return self._merge_children(node, i, child, right)
 
-        return False
+    def _merge_children(self, node, i, left, right):
+        """Merges child i + 1 and the separator between them into child i, which is returned.
 
-    def _promote_child(self, node, index):
-        if index < len(node.children):
-            child_id = node.children[index]
-            child_node = self.node_manager.load_node(child_id)
- 
-            node.keys.insert(index, child_node.keys.pop(-1))
+        Both children hold fewer than t keys, so the merged node has at most 2t - 1.
+        """
+        left.keys.append(node.keys.pop(i))
+        left.keys.extend(right.keys)
+        left.children.extend(right.children)
+        node.children.pop(i + 1)
+        self._update_nodes(left, node)
+        self.node_manager.delete_node(right.node_id)
+        if right.node_id == self._rightmost_leaf_id:
+            self._rightmost_leaf_id = left.node_id
+        return left
+
+    def _update_nodes(self, *nodes):
+        for node in nodes:
             self.node_manager.update_node(node)
-            self.node_manager.update_node(child_node)
-            
-            if not child_node.leaf:
-                node.children.insert(index + 1, child_node.children.pop(-1))
-                self.node_manager.update_node(child_node)
+
+    def _edge_leaf(self, node, rightmost):
+        while not node.leaf:
+            node = self.node_manager.load_node(node.children[-1 if rightmost else 0])
+        return node
 
     def __str__(self):
         root = self.node_manager.load_node(self.root_id)
         return root.to_string(self)
+
+
+class _PackedLevel:
+    """One level of a tree that `BTree.vacuum` builds from a key-ordered stream of entries.
+
+    The number of entries of the level is known up front, so they are spread evenly over its
+    nodes and no node ends up below the minimum fill. Completed nodes are saved right away and
+    handed to the level above along with the separator entry that follows them.
+    """
+
+    def __init__(self, btree, entries, per_node, parent, leaf):
+        self.btree = btree
+        self.parent = parent
+        self.leaf = leaf
+        self.count = self.node_count(entries, per_node)
+        self.base, self.extra = divmod(entries - self.count + 1, self.count)
+        self.index = 0  # Position of the node being filled
+        self.node = BTreeNode(btree.t, leaf=leaf)
+        self.separator_next = False
+        self.root_id = None
+
+    @staticmethod
+    def node_count(entries, per_node):
+        return max(1, math.ceil((entries + 1) / (per_node + 1)))
+
+    def add_entry(self, entry):
+        if self.separator_next:
+            self.separator_next = False
+            self.parent.add_entry(entry)
+            return
+        self.node.keys.append(entry)
+        if self.leaf and len(self.node.keys) == self._size():
+            self.emit()
+
+    def add_child(self, node_id):
+        self.node.children.append(node_id)
+        if len(self.node.children) == self._size() + 1:
+            self.emit()
+
+    def emit(self):
+        node_id = self.btree.node_manager.save_node(self.node)
+        if self.parent is None:
+            self.root_id = node_id
+        else:
+            self.parent.add_child(node_id)
+        self.index += 1
+        self.node = BTreeNode(self.btree.t, leaf=self.leaf)
+        self.separator_next = self.index < self.count
+
+    def _size(self):
+        return self.base + (1 if self.index < self.extra else 0)
+
+
+def scan_subtree(load_record, record, low, high, low_inclusive, high_inclusive, reverse):
+    """Yields the (key, value) pairs of a node record's subtree that fall in the range, in key order."""
+    leaf, keys, children = record
+    n = len(keys)
+    positions = range(n, -1, -1) if reverse else range(n + 1)
+    for i in positions:
+        # Child i holds the keys strictly between keys[i - 1] and keys[i]
+        if not leaf and _child_in_range(keys, i, low, high):
+            child = load_record(children[i])
+            yield from scan_subtree(load_record, child, low, high, low_inclusive, high_inclusive, reverse)
+        idx = i - 1 if reverse else i
+        if idx < 0 or idx >= n:
+            continue
+        key = keys[idx][0]
+        if low is not None and (key < low or (key == low and not low_inclusive)):
+            if reverse:
+                return
+            continue
+        if high is not None and (key > high or (key == high and not high_inclusive)):
+            if reverse:
+                continue
+            return
+        yield keys[idx]
+
+
+async def scan_subtree_async(load_record_async, record, low, high, low_inclusive, high_inclusive, reverse):
+    """Async generator form of `scan_subtree`, awaiting each child record it descends into."""
+    leaf, keys, children = record
+    n = len(keys)
+    positions = range(n, -1, -1) if reverse else range(n + 1)
+    for i in positions:
+        if not leaf and _child_in_range(keys, i, low, high):
+            child = await load_record_async(children[i])
+            async for item in scan_subtree_async(
+                load_record_async, child, low, high, low_inclusive, high_inclusive, reverse
+            ):
+                yield item
+        idx = i - 1 if reverse else i
+        if idx < 0 or idx >= n:
+            continue
+        key = keys[idx][0]
+        if low is not None and (key < low or (key == low and not low_inclusive)):
+            if reverse:
+                return
+            continue
+        if high is not None and (key > high or (key == high and not high_inclusive)):
+            if reverse:
+                continue
+            return
+        yield keys[idx]
+
+
+def _in_range(key, low, high, low_inclusive, high_inclusive):
+    if low is not None and (key < low or (key == low and not low_inclusive)):
+        return False
+    if high is not None and (key > high or (key == high and not high_inclusive)):
+        return False
+    return True
+
+
+def _child_in_range(keys, i, low, high):
+    if low is not None and i < len(keys) and keys[i][0] <= low:
+        return False
+    if high is not None and i > 0 and keys[i - 1][0] >= high:
+        return False
+    return True
@@ -1,8 +1,15 @@
+import itertools
 import requests
 
+# Statements that only read, and so may be served by a replica
+READ_COMMANDS = ('select', 'explain')
+
 class SQLClient:
-    def __init__(self, host='localhost', port=8000):
+    def __init__(self, host='localhost', port=8000, replicas=()):
         self.base_url = f"http://{host}:{port}"
+        # (host, port) of read replicas; SELECT and EXPLAIN go to them in turn
+        self.replica_urls = [f"http://{replica_host}:{replica_port}" for replica_host, replica_port in replicas]
+        self._next_replica = itertools.cycle(self.replica_urls)
 
     def repl(self):
         try:
@@ -20,15 +27,27 @@ class SQLClient:
             print("\nExiting.")
 
     def send_command(self, command):
+        words = command.split(None, 1)
+        if self.replica_urls and words and words[0].lower() in READ_COMMANDS:
+            for _ in self.replica_urls:
+                response = self._post(next(self._next_replica), command)
+                if not response.get('unreachable'):
+                    return response
+            # Every replica is down: reads fall back to the primary
+        return self._post(self.base_url, command)
+
+    def _post(self, base_url, command):
         try:
             response = requests.post(
-                f"{self.base_url}/execute",
+                f"{base_url}/execute",
                 json={"command": command}
             )
             if response.status_code == 200:
                 return response.json()
             else:
                 return {'error': response.json().get('detail', 'Unknown error')}
+        except requests.exceptions.ConnectionError as e:
+            return {'error': str(e), 'unreachable': True}
         except requests.exceptions.RequestException as e:
             return {'error': str(e)}
 
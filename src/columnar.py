@@ -0,0 +1,320 @@
+import heapq
+import os
+import pickle
+import struct
+from collections import Counter, deque
+from itertools import count
+from operator import itemgetter
+import numpy as np
+from planner import COMPARISONS
+
+META_FILE = 'meta.pkl'
+LOG_FILE = 'tail.log'
+# Rows per column chunk; each chunk carries a min/max zone map for every column
+DEFAULT_CHUNK_ROWS = 4096
+
+LENGTH = struct.Struct('<I')
+
+
+class ColumnarTable:
+    """Column-oriented table storage for analytical scans.
+
+    Rows are appended to an in-memory tail (backed by an operation log) and sealed into
+    chunks of `chunk_rows` rows, stored as one NumPy array file per column. Every sealed chunk
+    records the min and max of each column, so scans skip chunks whose zone maps rule out the
+    predicate and load only the columns they reference. Deleted and overwritten rows are
+    masked out by position; a key-to-position index is rebuilt from the key column on open.
+    """
+
+    def __init__(self, storage_path, columns, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.storage_path = storage_path
+        self.columns = list(columns)
+        self.key_column = self.columns[0]
+        self.meta_file = os.path.join(storage_path, META_FILE)
+        self.log_path = os.path.join(storage_path, LOG_FILE)
+        # Cumulative operation counters: inserts, deletes, searches, scans, chunks_scanned, chunks_skipped
+        self.stats = Counter()
+        # Cumulative I/O counters, named like NodeManager's with column chunks counted as nodes
+        self.io_stats = Counter()
+
+        os.makedirs(self.storage_path, exist_ok=True)
+        meta = {'chunk_rows': chunk_rows, 'chunks': [], 'deleted': {}}
+        if os.path.exists(self.meta_file):
+            with open(self.meta_file, 'rb') as f:
+                meta = pickle.load(f)
+        self.chunk_rows = meta['chunk_rows']
+        self.chunks = meta['chunks']
+        self.deleted = meta['deleted']  # chunk number -> set of deleted row offsets
+        self.tail = []
+        self.index = {}
+        for chunk_no in range(len(self.chunks)):
+            keys = self._load(chunk_no, self.key_column).tolist()
+            dead = self.deleted.get(chunk_no, ())
+            for offset, key in enumerate(keys):
+                if offset not in dead:
+                    self.index[key] = chunk_no * self.chunk_rows + offset
+        self._replay_log()
+        self._log = open(self.log_path, 'ab')
+
+    def insert(self, key, value):
+        self.stats['inserts'] += 1
+        self._write_log(('insert', key, value))
+        self._insert(key, value)
+        if len(self.tail) >= self.chunk_rows:
+            self._seal()
+
+    def delete(self, key):
+        self.stats['deletes'] += 1
+        if key in self.index:
+            self._write_log(('delete', key, None))
+            self._delete(key)
+
+    def search(self, key):
+        self.stats['searches'] += 1
+        position = self.index.get(key)
+        if position is None:
+            return None
+        chunk_no, offset = divmod(position, self.chunk_rows)
+        if chunk_no == len(self.chunks):
+            return dict(self.tail[offset])
+        return {column: self._load(chunk_no, column)[offset:offset + 1].tolist()[0] for column in self.columns}
+
+    def iter_items(self, reverse=False):
+        return self.iter_range(reverse=reverse)
+
+    def iter_range(self, low=None, high=None, low_inclusive=True, high_inclusive=True, reverse=False):
+        predicates = []
+        if low is not None:
+            predicates.append((self.key_column, '>=' if low_inclusive else '>', low))
+        if high is not None:
+            predicates.append((self.key_column, '<=' if high_inclusive else '<', high))
+        return ((row[self.key_column], row) for row in self.scan(None, predicates, reverse))
+
+    def scan(self, columns, predicates, reverse=False):
+        """Lazily yields the live rows matching every (column, operator, value) predicate, in key order.
+
+        Rows hold only `columns` (all columns if None) plus the key column. The sorted rows of
+        each chunk are merged, and a chunk is only read once the merge reaches the smallest key
+        in its zone map (the largest when `reverse`), so a scan that stops early, e.g. for a
+        LIMIT, does not read the chunks beyond the rows it used.
+        """
+        self.stats['scans'] += 1
+        needed = self.columns if columns is None else [c for c in self.columns if c in columns or c == self.key_column]
+        order = _Descending if reverse else _ascending
+        sort_key = lambda row: order(row[self.key_column])
+        heap = []
+        sequence = count()
+
+        def push(rows):
+            rows = iter(sorted(rows, key=sort_key))
+            row = next(rows, None)
+            if row is not None:
+                heapq.heappush(heap, (sort_key(row), next(sequence), row, rows))
+
+        pending = []
+        for chunk_no, chunk in enumerate(self.chunks):
+            if any(_zone_excludes(chunk['zones'].get(column), operator, value) for column, operator, value in predicates):
+                self.stats['chunks_skipped'] += 1
+                continue
+            zone = chunk['zones'].get(self.key_column)
+            if zone is None:
+                # Without a zone map the chunk may hold any key, so it is read before the merge starts
+                push(self._scan_chunk(chunk_no, chunk, needed, predicates))
+            else:
+                pending.append((order(zone[1] if reverse else zone[0]), chunk_no, chunk))
+        pending = deque(sorted(pending, key=itemgetter(0, 1)))
+        dead = self.deleted.get(len(self.chunks), ())
+        push(
+            {column: row[column] for column in needed} for offset, row in enumerate(self.tail)
+            if offset not in dead and all(COMPARISONS[op](row[column], value) for column, op, value in predicates)
+        )
+        while heap or pending:
+            while pending and (not heap or not heap[0][0] < pending[0][0]):
+                _, chunk_no, chunk = pending.popleft()
+                push(self._scan_chunk(chunk_no, chunk, needed, predicates))
+            if not heap:
+                return
+            _, _, row, rows = heap[0]
+            yield row
+            following = next(rows, None)
+            if following is None:
+                heapq.heappop(heap)
+            else:
+                heapq.heapreplace(heap, (sort_key(following), next(sequence), following, rows))
+
+    def _scan_chunk(self, chunk_no, chunk, needed, predicates):
+        """Returns the live rows of a chunk matching the predicates, loading only the columns used."""
+        self.stats['chunks_scanned'] += 1
+        mask = np.ones(chunk['rows'], dtype=bool)
+        dead = self.deleted.get(chunk_no)
+        if dead:
+            mask[list(dead)] = False
+        loaded = {}
+        for column, operator, value in predicates:
+            if not mask.any():
+                break
+            if column not in loaded:
+                loaded[column] = self._load(chunk_no, column)
+            mask &= _compare(loaded[column], operator, value)
+        positions = np.flatnonzero(mask)
+        if not len(positions):
+            return []
+        values = [
+            (loaded[column] if column in loaded else self._load(chunk_no, column))[positions].tolist()
+            for column in needed
+        ]
+        return [dict(zip(needed, row)) for row in zip(*values)]
+
+    def block_count(self):
+        return len(self.chunks) * len(self.columns) + (1 if self.tail else 0)
+
+    def lookup_cost(self):
+        # The key index is in memory, so a lookup reads one chunk per column
+        return len(self.columns)
+
+    def close(self):
+        self._log.close()
+
+    def _insert(self, key, value):
+        if key in self.index:
+            self._delete(key)
+        self.index[key] = len(self.chunks) * self.chunk_rows + len(self.tail)
+        self.tail.append(value)
+
+    def _delete(self, key):
+        chunk_no, offset = divmod(self.index.pop(key), self.chunk_rows)
+        self.deleted.setdefault(chunk_no, set()).add(offset)
+
+    def _seal(self):
+        """Writes the tail out as a new chunk of column files and starts a fresh log."""
+        chunk_no = len(self.chunks)
+        zones = {}
+        for column in self.columns:
+            values = [row[column] for row in self.tail]
+            array = _to_array(values)
+            with open(self._chunk_path(chunk_no, column), 'wb') as f:
+                np.save(f, array, allow_pickle=True)
+                self.io_stats['node_writes'] += 1
+                self.io_stats['bytes_written'] += f.tell()
+            zones[column] = _zone(values) if array.dtype != object else None
+        self.chunks.append({'rows': len(self.tail), 'zones': zones})
+        self.tail = []
+        self._save_meta()
+        self._log.close()
+        self._log = open(self.log_path, 'wb')
+
+    def _load(self, chunk_no, column):
+        path = self._chunk_path(chunk_no, column)
+        self.io_stats['node_loads'] += 1
+        self.io_stats['bytes_read'] += os.path.getsize(path)
+        return np.load(path, allow_pickle=True)
+
+    def _chunk_path(self, chunk_no, column):
+        return os.path.join(self.storage_path, f"{chunk_no}.{self.columns.index(column)}.npy")
+
+    def _save_meta(self):
+        temp_path = self.meta_file + '.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump({'chunk_rows': self.chunk_rows, 'chunks': self.chunks, 'deleted': self.deleted}, f)
+        os.replace(temp_path, self.meta_file)
+
+    def _write_log(self, entry):
+        data = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        self._log.write(LENGTH.pack(len(data)) + data)
+        self._log.flush()
+
+    def _replay_log(self):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'rb') as f:
+            data = f.read()
+        offset = 0
+        while offset + LENGTH.size <= len(data):
+            length, = LENGTH.unpack_from(data, offset)
+            end = offset + LENGTH.size + length
+            if end > len(data):
+                break
+            action, key, value = pickle.loads(data[offset + LENGTH.size:end])
+            if action == 'insert':
+                self._insert(key, value)
+            elif key in self.index:
+                self._delete(key)
+            offset = end
+        if offset < len(data):
+            # Drop a record torn by a crash mid-write
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(offset)
+
+
+def _ascending(key):
+    return key
+
+
+class _Descending:
+    """Orders keys from largest to smallest, for merging in reverse with a min-heap."""
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+def _to_array(values):
+    """Stores a column chunk in a native dtype when all its values share one type."""
+    kinds = {type(value) for value in values}
+    try:
+        if kinds == {int}:
+            return np.array(values, dtype=np.int64)
+        if kinds == {float}:
+            return np.array(values, dtype=np.float64)
+        if kinds == {str} and not any('\0' in value for value in values):
+            return np.array(values, dtype=str)
+    except OverflowError:
+        pass
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _zone(values):
+    try:
+        return min(values), max(values)
+    except (TypeError, ValueError):
+        return None
+
+
+def _zone_excludes(zone, operator, value):
+    """Returns True when no value between the zone's min and max can satisfy the predicate."""
+    if zone is None:
+        return False
+    low, high = zone
+    try:
+        if operator == '=':
+            return value < low or value > high
+        if operator == '!=':
+            return low == high == value
+        if operator == '<':
+            return low >= value
+        if operator == '<=':
+            return low > value
+        if operator == '>':
+            return high <= value
+        if operator == '>=':
+            return high < value
+    except TypeError:
+        pass
+    return False
+
+
+def _compare(array, operator, value):
+    """Evaluates a predicate over a column chunk, vectorized when the types line up."""
+    numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+    if (array.dtype.kind in 'if' and numeric) or (array.dtype.kind == 'U' and isinstance(value, str)):
+        return COMPARISONS[operator](array, value)
+    compare = COMPARISONS[operator]
+    return np.fromiter((compare(item, value) for item in array.tolist()), dtype=bool, count=len(array))
@@ -1,19 +1,108 @@
+import asyncio
 import os
 import pickle
-from btree import BTree
-from parser import parser
+import shutil
+import time
+from collections import Counter
+from contextlib import aclosing, nullcontext
+from functools import partial
+from itertools import chain, islice
+from operator import itemgetter
+from btree import BTree, DEFAULT_PAGE_SIZE, MIN_DEGREE, degree_for_page_size, estimate_row_size
+from lsm import LSMTree, DEFAULT_MEMTABLE_SIZE
+from columnar import ColumnarTable, DEFAULT_CHUNK_ROWS
+from hash_index import HashIndex, SecondaryIndex, DEFAULT_BUCKET_CAPACITY
+from node_manager import FILE_MODE, READ_MODES
+from page_codecs import NO_COMPRESSION, codec_names
+from parser import parse
+from planner import Planner, matches, FULL_SCAN, KEY_LOOKUP, KEY_RANGE_SCAN, INDEX_LOOKUP
+from sorting import ExternalSorter, TopK, DEFAULT_SORT_BUFFER_SIZE
+from table_stats import collect_statistics, collect_scan_statistics
+from metrics import MetricsRegistry, QueryProfile
+from result_cache import ResultCache
+from aggregation import Aggregator, AGGREGATE_FUNCTIONS, output_name
+from parallel import ParallelScanner
+from replication import ChangeLog
+from partitioning import PartitionedTable, PARTITION_METHODS, RANGE_PARTITIONING, HASH_PARTITIONING
+from views import MaterializedView, view_aggregator
+from locks import StatementLock
 from ast_nodes import (
     CreateTableStatement,
+    CreateViewStatement,
+    CreateIndexStatement,
+    AlterTableStatement,
     InsertStatement,
     SelectStatement,
     UpdateStatement,
     DeleteStatement,
+    AnalyzeStatement,
+    VacuumStatement,
+    ExplainStatement,
+    WhereClause,
+    Aggregate,
 )
 
+NO_SORT = 'none'
+INDEX_ORDER = 'index order'
+TOP_K = 'top-k heap'
+EXTERNAL_SORT = 'external merge sort'
+
+# Degree of tables created before the degree was recorded in the catalog
+LEGACY_DEGREE = 3
+# Directory in a partitioned table's storage that holds one directory per partition
+PARTITIONS_DIR = 'partitions'
+BTREE_ENGINE = 'btree'
+LSM_ENGINE = 'lsm'
+COLUMNAR_ENGINE = 'columnar'
+HASH_ENGINE = 'hash'
+INDEX_TYPES = ('hash',)
+# Options accepted in CREATE TABLE ... WITH (...), by storage engine
+TABLE_OPTIONS = {
+    BTREE_ENGINE: {'engine', 'fanout', 'page_size', 'read_mode', 'compression'},
+    LSM_ENGINE: {'engine', 'memtable_size'},
+    COLUMNAR_ENGINE: {'engine', 'chunk_rows'},
+    HASH_ENGINE: {'engine', 'bucket_capacity'},
+}
+
+STATEMENT_NAMES = {
+    CreateTableStatement: 'create_table',
+    CreateViewStatement: 'create_view',
+    CreateIndexStatement: 'create_index',
+    AlterTableStatement: 'alter_table',
+    InsertStatement: 'insert',
+    SelectStatement: 'select',
+    UpdateStatement: 'update',
+    DeleteStatement: 'delete',
+    AnalyzeStatement: 'analyze',
+    VacuumStatement: 'vacuum',
+    ExplainStatement: 'explain',
+}
+
+# Statements that only read, and so are neither logged for replicas nor refused by them
+READ_STATEMENTS = (SelectStatement, ExplainStatement)
+# Rows an async scan reads before letting other tasks on the event loop run
+ASYNC_BATCH_SIZE = 256
+# Estimated node loads below which a scan is read in-process even when workers are configured
+PARALLEL_MIN_COST = 100
+
 class Database:
-    def __init__(self, data_dir='data'):
+    def __init__(self, data_dir='data', sort_buffer_size=DEFAULT_SORT_BUFFER_SIZE, result_cache_bytes=0,
+                 parallel_workers=1, change_log=False, read_only=False):
         self.data_dir = data_dir
+        # A primary logs its write statements for replicas; a replica refuses writes from clients
+        self.read_only = read_only
+        # Statements run one at a time, also when a replica applies changes from another thread;
+        # async reads only keep writes out while they yield between batches
+        self.lock = StatementLock()
+        self.sort_buffer_size = sort_buffer_size  # Max rows held in memory per ORDER BY sort run
+        # B-tree scans are split across worker processes only when more than one is configured
+        self.parallel = ParallelScanner(parallel_workers) if parallel_workers > 1 else None
+        # SELECT results are cached only when given a memory budget
+        self.result_cache = ResultCache(result_cache_bytes) if result_cache_bytes else None
+        # Bumped by every write to a table, so cached results read before it are discarded
+        self.table_versions = Counter()
         os.makedirs(self.data_dir, exist_ok=True)
+        self.change_log = ChangeLog(self.data_dir) if change_log else None
         self.tables_meta = os.path.join(self.data_dir, 'tables_meta.pkl')
         if os.path.exists(self.tables_meta):
             with open(self.tables_meta, 'rb') as f:
@@ -23,14 +112,163 @@ class Database:
             with open(self.tables_meta, 'wb') as f:
                 pickle.dump(self.tables, f)
         self.btrees = {}
+        self.index_handles = {}
+        self.views = {}
+        self.metrics = MetricsRegistry()
+        self._describe_metrics()
+        self.last_profile = None
+        if self.change_log is not None:
+            self._redo_uncommitted_changes()
 
     def execute(self, query):
+        with self.lock:
+            return self._execute(query)
+
+    def apply_change(self, statement):
+        """Executes a write statement replicated from the primary, even on a read-only replica."""
+        with self.lock:
+            return self._execute(statement, replicated=True)
+
+    def _redo_uncommitted_changes(self):
+        # A crash between logging a write and committing it may have left it unapplied, partly
+        # applied or failed. It is run again and committed, or discarded if it fails now.
+        for lsn, _, statement in self.change_log.uncommitted():
+            try:
+                with self.lock:
+                    self._execute(statement, redo=True)
+            except ValueError:
+                self.change_log.discard(lsn)
+            else:
+                self.change_log.commit(lsn)
+
+    async def execute_async(self, query, batch_size=ASYNC_BATCH_SIZE):
+        """Executes a statement from a coroutine without blocking the event loop.
+
+        SELECTs run on the loop: B-tree nodes are read with awaitable reads and the scan lets
+        other tasks run after every `batch_size` rows, so cancelling the calling task stops the
+        scan at its next batch. Other statements run with `execute` in a worker thread; once
+        started they run to completion even if the caller is cancelled. Writes must not be run
+        with `execute` on the event loop's own thread, as they would wait there for the async
+        reads in progress. `last_profile` is this statement's profile right after it returns.
+        """
+        profile = QueryProfile()
+        start = time.perf_counter()
+        try:
+            with profile.phase('parse'):
+                ast = parse(query)
+        except SyntaxError:
+            ast = None
+        if not isinstance(ast, SelectStatement):
+            result, self.last_profile = await asyncio.to_thread(self._execute_profiled, query)
+            return result
+        profile.statement = STATEMENT_NAMES[SelectStatement]
+        await self.lock.add_reader_async()
+        with self.lock:
+            # Also counts the reads of statements running at the same time
+            io_before = self.io_counters()
+        try:
+            cache_key = None
+            if self.result_cache is not None:
+                with self.lock:
+                    cache_key = self.result_cache.normalize(query)
+                    cached = self._cached_result(cache_key)
+                if cached is not None:
+                    profile.rows = len(cached)
+                    return cached
+            result = await self.select_async(ast, batch_size)
+            profile.rows = len(result)
+            if cache_key is not None:
+                with self.lock:
+                    self.result_cache.put(cache_key, ast.table_name, self.table_versions[ast.table_name], result)
+            return result
+        except Exception:
+            with self.lock:
+                self.metrics.inc('simpldb_query_errors_total', statement=profile.statement)
+            raise
+        finally:
+            self.lock.remove_reader()
+            profile.timings['total'] = time.perf_counter() - start
+            with self.lock:
+                profile.counters = self.io_counters() - io_before
+                self._record_metrics(profile)
+            self.last_profile = profile
+
+    def _execute_profiled(self, query):
+        with self.lock:
+            return self._execute(query), self.last_profile
+
+    def _execute(self, query, replicated=False, redo=False):
+        profile = QueryProfile()
+        self.last_profile = profile
+        io_before = self.io_counters()
+        start = time.perf_counter()
         try:
-            ast = parser.parse(query)
-        except SyntaxError as e:
-            return f"Syntax error: {e}"
+            cache_key = None
+            if self.result_cache is not None:
+                with profile.phase('cache'):
+                    cache_key = self.result_cache.normalize(query)
+                    cached = self._cached_result(cache_key)
+                if cached is not None:
+                    profile.statement = STATEMENT_NAMES[SelectStatement]
+                    profile.rows = len(cached)
+                    return cached
+            try:
+                with profile.phase('parse'):
+                    ast = parse(query)
+            except SyntaxError as e:
+                profile.statement = 'invalid'
+                return f"Syntax error: {e}"
+            profile.statement = STATEMENT_NAMES.get(type(ast), 'unknown')
+            writes = not isinstance(ast, READ_STATEMENTS)
+            if writes and self.read_only and not replicated:
+                raise ValueError("This database is a read-only replica; send writes to the primary.")
+            if writes:
+                self.lock.wait_for_readers()
+            lsn = None
+            if writes and self.change_log is not None and not redo:
+                # Logged durably before the tables change, so a crash cannot lose a write from the log
+                lsn = self.change_log.write(query)
+            try:
+                with profile.phase('execute'):
+                    result = self._execute_statement(ast)
+            except Exception:
+                if lsn is not None:
+                    self.change_log.discard(lsn)
+                raise
+            if lsn is not None:
+                self.change_log.commit(lsn)
+            if isinstance(result, list):
+                profile.rows = len(result)
+                if cache_key is not None and isinstance(ast, SelectStatement):
+                    self.result_cache.put(cache_key, ast.table_name, self.table_versions[ast.table_name], result)
+            return result
+        except Exception:
+            self.metrics.inc('simpldb_query_errors_total', statement=profile.statement)
+            raise
+        finally:
+            profile.timings['total'] = time.perf_counter() - start
+            profile.counters = self.io_counters() - io_before
+            self._record_metrics(profile)
+
+    def _cached_result(self, cache_key):
+        if cache_key is None:
+            return None
+        cached = self.result_cache.get(cache_key, self.table_versions)
+        if cached is None:
+            self.metrics.inc('simpldb_cache_misses_total', cache='result')
+        else:
+            self.metrics.inc('simpldb_cache_hits_total', cache='result')
+        return cached
+
+    def _execute_statement(self, ast):
         if isinstance(ast, CreateTableStatement):
             return self.create_table(ast)
+        elif isinstance(ast, CreateViewStatement):
+            return self.create_view(ast)
+        elif isinstance(ast, CreateIndexStatement):
+            return self.create_index(ast)
+        elif isinstance(ast, AlterTableStatement):
+            return self.alter_table(ast)
         elif isinstance(ast, InsertStatement):
             return self.insert_into(ast)
         elif isinstance(ast, SelectStatement):
@@ -39,6 +277,12 @@ class Database:
             return self.update_table(ast)
         elif isinstance(ast, DeleteStatement):
             return self.delete_from(ast)
+        elif isinstance(ast, AnalyzeStatement):
+            return self.analyze_table(ast)
+        elif isinstance(ast, VacuumStatement):
+            return self.vacuum_table(ast)
+        elif isinstance(ast, ExplainStatement):
+            return self.explain(ast)
         else:
             return "Unsupported SQL statement"
 
@@ -49,32 +293,411 @@ class Database:
         if table_name in self.tables:
             raise ValueError(f"Table {table_name} already exists.")
 
+        options = stmt.options
+        engine = options.get('engine', BTREE_ENGINE)
+        if engine not in TABLE_OPTIONS:
+            raise ValueError(f"engine must be one of {', '.join(TABLE_OPTIONS)}.")
+        unknown = set(options) - TABLE_OPTIONS[engine]
+        if unknown:
+            raise ValueError(f"Unknown table option {sorted(unknown)[0]} for the {engine} engine.")
         storage_path = os.path.join(self.data_dir, table_name)
-        BTree(t=3, storage_path=storage_path)
-        self.tables[table_name] = {
+        if engine == LSM_ENGINE:
+            memtable_size = self.parse_value(options.get('memtable_size', DEFAULT_MEMTABLE_SIZE))
+            if not isinstance(memtable_size, int) or memtable_size <= 0:
+                raise ValueError("memtable_size must be a positive integer.")
+            table = {
+                'columns': columns,
+                'engine': engine,
+                'storage_path': storage_path,
+                'memtable_size': memtable_size,
+            }
+        elif engine == COLUMNAR_ENGINE:
+            chunk_rows = self.parse_value(options.get('chunk_rows', DEFAULT_CHUNK_ROWS))
+            if not isinstance(chunk_rows, int) or chunk_rows <= 0:
+                raise ValueError("chunk_rows must be a positive integer.")
+            table = {
+                'columns': columns,
+                'engine': engine,
+                'storage_path': storage_path,
+                'chunk_rows': chunk_rows,
+            }
+        elif engine == HASH_ENGINE:
+            bucket_capacity = self.parse_value(options.get('bucket_capacity', DEFAULT_BUCKET_CAPACITY))
+            if not isinstance(bucket_capacity, int) or bucket_capacity <= 0:
+                raise ValueError("bucket_capacity must be a positive integer.")
+            table = {
+                'columns': columns,
+                'engine': engine,
+                'storage_path': storage_path,
+                'bucket_capacity': bucket_capacity,
+            }
+        else:
+            degree, page_size = self._table_degree(columns, options)
+            read_mode = options.get('read_mode', FILE_MODE)
+            if read_mode not in READ_MODES:
+                raise ValueError(f"read_mode must be one of {', '.join(READ_MODES)}.")
+            compression = options.get('compression', NO_COMPRESSION)
+            if compression not in codec_names():
+                raise ValueError(f"compression must be one of {', '.join(codec_names())}.")
+            table = {
+                'columns': columns,
+                'engine': engine,
+                'btree_path': storage_path,
+                't': degree,
+                'page_size': page_size,
+                'read_mode': read_mode,
+                'compression': compression,
+            }
+        if stmt.partition_by is not None:
+            if engine != BTREE_ENGINE:
+                raise ValueError("Only btree tables can be partitioned.")
+            table['partitioning'] = self._table_partitioning(columns, storage_path, stmt.partition_by)
+        self._open_btree(table).close()
+        self.tables[table_name] = table
+
+        self._save_tables_meta()
+        return f"Table {table_name} created."
+
+    def _table_partitioning(self, columns, storage_path, clause):
+        """Builds the catalog entry of PARTITION BY RANGE (col) (...) or PARTITION BY HASH (col) PARTITIONS n."""
+        if clause.method not in PARTITION_METHODS:
+            raise ValueError(f"Partitioning method must be one of {', '.join(PARTITION_METHODS)}.")
+        if clause.column not in columns:
+            raise ValueError(f"Unknown column {clause.column}.")
+        if clause.method == HASH_PARTITIONING:
+            if clause.count is None or clause.count <= 0:
+                raise ValueError("Hash partitioning needs a positive number of PARTITIONS.")
+            partitions = [
+                {'name': f"p{i}", 'id': i, 'btree_path': os.path.join(storage_path, PARTITIONS_DIR, f"p{i}")}
+                for i in range(clause.count)
+            ]
+        else:
+            if not clause.partitions:
+                raise ValueError("Range partitioning needs a list of partitions.")
+            partitions = []
+            for definition in clause.partitions:
+                partitions.append(self._range_partition(partitions, storage_path, definition, len(partitions)))
+        partitioning = {
+            'method': clause.method, 'column': clause.column, 'partitions': partitions, 'next_id': len(partitions),
+        }
+        if clause.column != columns[0]:
+            partitioning['key_map'] = {'btree_path': os.path.join(storage_path, 'key_map')}
+        return partitioning
+
+    def _range_partition(self, partitions, storage_path, definition, partition_id):
+        """Returns the catalog entry of a range partition placed after `partitions`."""
+        bound = self.parse_value(definition.bound)
+        if any(partition['name'] == definition.name for partition in partitions):
+            raise ValueError(f"Partition {definition.name} already exists.")
+        if partitions:
+            try:
+                increasing = bound > partitions[-1]['bound']
+            except TypeError:
+                increasing = False
+            if not increasing:
+                raise ValueError(f"Partition bounds must increase; {bound!r} does not follow {partitions[-1]['bound']!r}.")
+        return {
+            'name': definition.name, 'id': partition_id, 'bound': bound,
+            'btree_path': os.path.join(storage_path, PARTITIONS_DIR, definition.name),
+        }
+
+    def _table_degree(self, columns, options):
+        """Resolves the B-tree minimum degree from WITH (fanout=..., page_size=...).
+
+        An explicit fanout (the maximum number of children per node) wins; otherwise the degree
+        is the largest one whose full nodes fit in the page size given the estimated row size.
+        """
+        page_size = self.parse_value(options.get('page_size', DEFAULT_PAGE_SIZE))
+        if not isinstance(page_size, int) or page_size <= 0:
+            raise ValueError("page_size must be a positive integer.")
+        if 'fanout' in options:
+            fanout = self.parse_value(options['fanout'])
+            if not isinstance(fanout, int) or fanout < 2 * MIN_DEGREE:
+                raise ValueError(f"fanout must be an integer of at least {2 * MIN_DEGREE}.")
+            return fanout // 2, page_size
+        return degree_for_page_size(page_size, estimate_row_size(columns)), page_size
+
+    def _open_btree(self, table):
+        if table.get('engine') == LSM_ENGINE:
+            return LSMTree(storage_path=table['storage_path'], memtable_size=table['memtable_size'])
+        if table.get('engine') == COLUMNAR_ENGINE:
+            return ColumnarTable(table['storage_path'], table['columns'], chunk_rows=table['chunk_rows'])
+        if table.get('engine') == HASH_ENGINE:
+            return HashIndex(table['storage_path'], bucket_capacity=table['bucket_capacity'])
+        if 'partitioning' in table:
+            return PartitionedTable(
+                table['partitioning'], table['columns'][0], lambda partition: self._open_partition(table, partition)
+            )
+        return self._open_partition(table, table)
+
+    def _open_partition(self, table, partition):
+        return BTree(
+            t=table.get('t', LEGACY_DEGREE),
+            storage_path=partition['btree_path'],
+            read_mode=table.get('read_mode', FILE_MODE),
+            compression=table.get('compression'),
+        )
+
+    def create_view(self, stmt):
+        """Creates a materialized view: a B-tree of the aggregate states of each group, filled
+        from the source table now and updated from every later row change of it.
+        """
+        view_name = stmt.view_name
+        select = stmt.select
+        if view_name in self.tables:
+            raise ValueError(f"Table {view_name} already exists.")
+        source = self.tables.get(select.table_name)
+        if not source:
+            raise ValueError(f"Table {select.table_name} does not exist.")
+        if 'view' in source:
+            raise ValueError("Materialized views cannot be defined over other materialized views.")
+        if not self._is_aggregate(select):
+            raise ValueError("A materialized view must use aggregates or GROUP BY.")
+        if select.order_by is not None or select.limit is not None:
+            raise ValueError("A materialized view cannot have ORDER BY or LIMIT.")
+        self._check_aggregate(source, select)
+        aggregator = self._aggregate(source, select, view_aggregator(select))
+        columns = [output_name(item) for item in select.columns]
+        degree, page_size = self._table_degree(columns, {})
+        self.tables[view_name] = {
             'columns': columns,
-            'btree_path': storage_path
+            'engine': BTREE_ENGINE,
+            'btree_path': os.path.join(self.data_dir, view_name),
+            't': degree,
+            'page_size': page_size,
+            'read_mode': FILE_MODE,
+            'compression': NO_COMPRESSION,
+            'view': {'source': select.table_name, 'sql': stmt.select_sql},
         }
+        self.get_view(view_name).load(aggregator)
+        source.setdefault('views', []).append(view_name)
+        self._save_tables_meta()
+        return f"Materialized view {view_name} created."
+
+    def get_view(self, view_name):
+        """Returns the MaterializedView of a view in the catalog."""
+        if view_name not in self.views:
+            definition = self.tables[view_name]['view']
+            # The catalog keeps the SELECT as text, so it does not depend on the AST classes
+            select = parse(definition['sql'])
+            where_value = self._where_value(self.tables[definition['source']], select.where_clause)
+            self.views[view_name] = MaterializedView(select, where_value, self.get_btree(view_name))
+        return self.views[view_name]
+
+    def _update_views(self, table, old_row, new_row):
+        for view_name in table.get('views', []):
+            self.get_view(view_name).apply(old_row, new_row)
+            self.table_versions[view_name] += 1
+
+    def _refresh_views(self, table):
+        """Recomputes the view groups a statement left stale from the source rows of those groups."""
+        for view_name in table.get('views', []):
+            view = self.get_view(view_name)
+            if view.stale:
+                view.refresh(self._stale_group_rows(table, view))
+
+    def _stale_group_rows(self, table, view):
+        """Returns source rows including every row of the view's stale groups.
 
+        When the key or an index finds the rows with a given value of the first GROUP BY column,
+        each stale group's rows are looked up that way; otherwise the source is scanned once.
+        """
+        select = view.select
+        btree = self.get_btree(select.table_name)
+        planner = Planner(table)
+        if select.group_by:
+            column = select.group_by[0]
+            lookups = []
+            for value in {group[0] for group in view.stale}:
+                where_clause = WhereClause(column, value)
+                lookups.append((planner.plan(where_clause, value), where_clause, value))
+            if all(path.method in (KEY_LOOKUP, INDEX_LOOKUP) for path, _, _ in lookups):
+                return chain.from_iterable(
+                    self.scan_records(btree, path, where_clause, value) for path, where_clause, value in lookups
+                )
+        path = planner.plan(select.where_clause, view.where_value)
+        return self.scan_records(btree, path, select.where_clause, view.where_value)
+
+    def _check_writable(self, table_name, table):
+        if 'view' in table:
+            raise ValueError(f"{table_name} is a materialized view and cannot be modified directly.")
+
+    def _save_tables_meta(self):
         with open(self.tables_meta, 'wb') as f:
             pickle.dump(self.tables, f)
-        return f"Table {table_name} created."
 
     def get_btree(self, table_name):
+        """Returns the open storage of a table: a BTree, LSMTree, ColumnarTable or HashIndex by engine."""
         if table_name not in self.btrees:
             table = self.tables.get(table_name)
             if not table:
                 raise ValueError(f"Table {table_name} does not exist.")
-            btree = BTree(t=3, storage_path=table['btree_path'])
+            btree = self._open_btree(table)
             self.btrees[table_name] = btree
+            self.metrics.inc('simpldb_cache_misses_total', cache='table_handle')
+        else:
+            self.metrics.inc('simpldb_cache_hits_total', cache='table_handle')
         return self.btrees[table_name]
 
+    def create_index(self, stmt):
+        table = self.tables.get(stmt.table_name)
+        if not table:
+            raise ValueError(f"Table {stmt.table_name} does not exist.")
+        self._check_writable(stmt.table_name, table)
+        if stmt.index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type {stmt.index_type}.")
+        self._check_columns(table, [stmt.column])
+        if stmt.column == table['columns'][0]:
+            raise ValueError(f"Column {stmt.column} is the table key and is already indexed.")
+        indexes = table.setdefault('indexes', {})
+        if stmt.index_name in indexes:
+            raise ValueError(f"Index {stmt.index_name} already exists on {stmt.table_name}.")
+        index = {
+            'name': stmt.index_name,
+            'column': stmt.column,
+            'type': stmt.index_type,
+            'storage_path': os.path.join(self.data_dir, f"{stmt.table_name}_indexes", stmt.index_name),
+        }
+        handle = self.get_index(index)
+        for key, row in self.get_btree(stmt.table_name).iter_items():
+            handle.add(row, key)
+        indexes[stmt.index_name] = index
+        self._save_tables_meta()
+        return f"Index {stmt.index_name} created on {stmt.table_name}."
+
+    def alter_table(self, stmt):
+        """Adds or drops a range partition. Dropping removes the partition's storage outright
+        instead of deleting its rows one by one. The dropped rows' key map and secondary index
+        entries stay behind: they name a dropped partition or a key no longer holding a matching
+        row, so reads skip them, and VACUUM removes them. Only materialized views of the table
+        read the dropped rows, to take them out of their groups.
+        """
+        table_name = stmt.table_name
+        table = self.tables.get(table_name)
+        if not table:
+            raise ValueError(f"Table {table_name} does not exist.")
+        partitioning = table.get('partitioning')
+        if partitioning is None or partitioning['method'] != RANGE_PARTITIONING:
+            raise ValueError(f"Table {table_name} is not range partitioned.")
+        partitions = partitioning['partitions']
+        if stmt.add_partition is not None:
+            partition = self._range_partition(partitions, table['btree_path'], stmt.add_partition, partitioning['next_id'])
+            self._close_table(table_name)
+            partitions.append(partition)
+            partitioning['next_id'] += 1
+            self._save_tables_meta()
+            self.table_versions[table_name] += 1
+            return f"Partition {partition['name']} added to {table_name}."
+        partition = next((partition for partition in partitions if partition['name'] == stmt.drop_partition), None)
+        if partition is None:
+            raise ValueError(f"Partition {stmt.drop_partition} does not exist.")
+        self._close_table(table_name)
+        # Moved aside first, so a partition that cannot be removed is never dropped from the catalog
+        dropped_path = partition['btree_path'] + '.dropped'
+        os.rename(partition['btree_path'], dropped_path)
+        position = partitions.index(partition)
+        partitions.pop(position)
+        statistics = table.pop('statistics', None)
+        try:
+            self._save_tables_meta()
+        except Exception:
+            partitions.insert(position, partition)
+            if statistics is not None:
+                table['statistics'] = statistics
+            os.rename(dropped_path, partition['btree_path'])
+            raise
+        self.table_versions[table_name] += 1
+        if table.get('views'):
+            dropped = self._open_partition(table, {'btree_path': dropped_path})
+            for _, row in dropped.iter_items():
+                self._update_views(table, row, None)
+            dropped.close()
+            self._refresh_views(table)
+        shutil.rmtree(dropped_path)
+        return f"Partition {partition['name']} dropped from {table_name}."
+
+    def _close_table(self, table_name):
+        storage = self.btrees.pop(table_name, None)
+        if storage is not None:
+            storage.close()
+
+    def get_index(self, index):
+        """Returns the open SecondaryIndex for an index entry of the catalog."""
+        path = index['storage_path']
+        if path not in self.index_handles:
+            self.index_handles[path] = SecondaryIndex(path, index['column'])
+        return self.index_handles[path]
+
+    def _update_indexes(self, table, key, old_row, new_row):
+        for index in table.get('indexes', {}).values():
+            handle = self.get_index(index)
+            if old_row is not None:
+                handle.remove(old_row, key)
+            if new_row is not None:
+                handle.add(new_row, new_row[table['columns'][0]])
+
+    def close(self):
+        for btree in self.btrees.values():
+            btree.close()
+        self.btrees = {}
+        self.views = {}
+        for handle in self.index_handles.values():
+            handle.close()
+        self.index_handles = {}
+        if self.parallel is not None:
+            self.parallel.close()
+        if self.change_log is not None:
+            self.change_log.close()
+
+    def io_counters(self):
+        """Sums the cumulative storage operation and I/O counters of every open table."""
+        totals = Counter()
+        for storage in list(self.btrees.values()) + list(self.index_handles.values()):
+            totals.update(storage.stats)
+            totals.update(storage.io_stats)
+        return totals
+
+    def _describe_metrics(self):
+        describe = self.metrics.describe
+        describe('simpldb_queries_total', 'counter', 'Statements executed, by statement type.')
+        describe('simpldb_query_errors_total', 'counter', 'Statements that raised an error, by statement type.')
+        describe('simpldb_query_duration_seconds', 'histogram', 'End-to-end statement latency.')
+        describe('simpldb_parse_duration_seconds', 'histogram', 'Time spent parsing statements.')
+        describe('simpldb_pages_read_total', 'counter', 'B-tree nodes loaded from storage.')
+        describe('simpldb_pages_written_total', 'counter', 'B-tree nodes written to storage.')
+        describe('simpldb_bytes_read_total', 'counter', 'Bytes read from node storage.')
+        describe('simpldb_bytes_written_total', 'counter', 'Bytes written to node storage.')
+        describe('simpldb_cache_hits_total', 'counter', 'Cache hits, by cache.')
+        describe('simpldb_cache_misses_total', 'counter', 'Cache misses, by cache.')
+        describe('simpldb_cache_hit_ratio', 'gauge', 'Fraction of cache lookups that hit, by cache.')
+        describe('simpldb_result_cache_bytes', 'gauge', 'Approximate size of the cached SELECT results.')
+        describe('simpldb_result_cache_evictions', 'gauge', 'SELECT results evicted from the result cache.')
+
+    def _record_metrics(self, profile):
+        metrics = self.metrics
+        metrics.inc('simpldb_queries_total', statement=profile.statement)
+        metrics.observe('simpldb_query_duration_seconds', profile.timings['total'], statement=profile.statement)
+        metrics.observe('simpldb_parse_duration_seconds', profile.timings['parse'])
+        metrics.inc('simpldb_pages_read_total', profile.counters['node_loads'])
+        metrics.inc('simpldb_pages_written_total', profile.counters['node_writes'])
+        metrics.inc('simpldb_bytes_read_total', profile.counters['bytes_read'])
+        metrics.inc('simpldb_bytes_written_total', profile.counters['bytes_written'])
+        if self.result_cache is not None:
+            metrics.set_gauge('simpldb_result_cache_bytes', self.result_cache.size)
+            metrics.set_gauge('simpldb_result_cache_evictions', self.result_cache.stats['evictions'])
+        for cache in ('table_handle', 'result'):
+            hits = metrics.value('simpldb_cache_hits_total', cache=cache) or 0
+            misses = metrics.value('simpldb_cache_misses_total', cache=cache) or 0
+            if hits + misses:
+                metrics.set_gauge('simpldb_cache_hit_ratio', hits / (hits + misses), cache=cache)
+
     def insert_into(self, stmt):
         table_name = stmt.table_name
         values = stmt.values
         table = self.tables.get(table_name)
         if not table:
             raise ValueError(f"Table {table_name} does not exist.")
+        self._check_writable(table_name, table)
         if len(values) != len(table['columns']):
             raise ValueError("Column count doesn't match value count")
 
@@ -82,7 +705,14 @@ class Database:
         key = parsed_values[0]
         row = dict(zip(table['columns'], parsed_values))
         btree = self.get_btree(table_name)
+        old_row = btree.search(key) if table.get('indexes') or table.get('views') else None
         btree.insert(key, row)
+        self.table_versions[table_name] += 1
+        if table.get('indexes'):
+            self._update_indexes(table, key, old_row, row)
+        if table.get('views'):
+            self._update_views(table, old_row, row)
+            self._refresh_views(table)
         return f"1 row inserted into {table_name}."
 
     def select_from(self, stmt):
@@ -91,17 +721,278 @@ class Database:
         table = self.tables.get(table_name)
         if not table:
             raise ValueError(f"Table {table_name} does not exist.")
+        if 'view' in table:
+            return self.view_rows(table, stmt)
+        if self._is_aggregate(stmt):
+            return self.aggregate_rows(table, stmt)
+        self._check_columns(table, [] if columns == ['*'] else columns)
         btree = self.get_btree(table_name)
-        all_records = btree.traverse()
+        where_value = self._where_value(table, stmt.where_clause)
+        with self._phase('plan'):
+            path = Planner(table).plan(stmt.where_clause, where_value)
+        needed = None
+        if columns != ['*']:
+            needed = columns + ([stmt.order_by.column] if stmt.order_by else [])
+        scan = partial(
+            self.scan_records, btree, path, stmt.where_clause, where_value, columns=needed,
+            parallel=not self._stops_early(table, stmt),
+        )
+        return self._selected(stmt, self.ordered_records(table, stmt.order_by, stmt.limit, scan))
+
+    def _selected(self, stmt, records):
+        """Applies the LIMIT and the column list of a SELECT to its ordered records."""
+        columns = stmt.columns
+        if stmt.limit is not None:
+            records = islice(records, stmt.limit)
         if columns == ['*']:
-            return [record for _, record in all_records]
+            return list(records)
         else:
             selected = []
-            for _, record in all_records:
+            for record in records:
                 selected_record = {col: record[col] for col in columns}
                 selected.append(selected_record)
             return selected
 
+    async def select_async(self, stmt, batch_size=ASYNC_BATCH_SIZE):
+        """Evaluates a SELECT like `select_from`, but from the rows of `scan_batches`.
+
+        The caller must be registered as a reader of the statement lock for the whole call.
+        """
+        with self.lock:
+            table = self.tables.get(stmt.table_name)
+            if not table:
+                raise ValueError(f"Table {stmt.table_name} does not exist.")
+            if 'view' in table:
+                return self.view_rows(table, stmt)
+            aggregate = self._is_aggregate(stmt)
+            if aggregate:
+                self._check_aggregate(table, stmt)
+                aggregator = Aggregator(stmt.columns, stmt.group_by)
+                needed = aggregator.group_by + [item.column for item in aggregator.aggregates if item.column != '*']
+            else:
+                self._check_columns(table, [] if stmt.columns == ['*'] else stmt.columns)
+                strategy = self.sort_strategy(table, stmt.order_by, stmt.limit)
+                needed = None
+                if stmt.columns != ['*']:
+                    needed = stmt.columns + ([stmt.order_by.column] if stmt.order_by else [])
+            btree = self.get_btree(stmt.table_name)
+            where_value = self._where_value(table, stmt.where_clause)
+            path = Planner(table).plan(stmt.where_clause, where_value)
+        scan = partial(
+            self.scan_batches, btree, path, stmt.where_clause, where_value, columns=needed,
+            parallel=aggregate or not self._stops_early(table, stmt), batch_size=batch_size,
+        )
+        if aggregate:
+            async with aclosing(scan()) as batches:
+                async for rows in batches:
+                    aggregator.extend(rows)
+            return self._aggregate_results(stmt, aggregator)
+        if strategy in (TOP_K, EXTERNAL_SORT):
+            sorter = self._sorter(strategy, stmt.order_by, stmt.limit)
+            async with aclosing(scan()) as batches:
+                async for rows in batches:
+                    sorter.extend(rows)
+            return self._selected(stmt, iter(sorter))
+        records = []
+        async with aclosing(scan(reverse=strategy == INDEX_ORDER and stmt.order_by.descending)) as batches:
+            async for rows in batches:
+                records.extend(rows)
+                if stmt.limit is not None and len(records) >= stmt.limit:
+                    break
+        return self._selected(stmt, records)
+
+    def aggregate_rows(self, table, stmt):
+        """Evaluates a SELECT with aggregates or GROUP BY, returning one row per group."""
+        self._check_aggregate(table, stmt)
+        return self._aggregate_results(stmt, self._aggregate(table, stmt, Aggregator(stmt.columns, stmt.group_by)))
+
+    def _aggregate_results(self, stmt, aggregator):
+        order_by = stmt.order_by
+        rows = aggregator.results()
+        if order_by is not None:
+            rows.sort(key=itemgetter(order_by.column), reverse=order_by.descending)
+        return rows if stmt.limit is None else rows[:stmt.limit]
+
+    def _check_aggregate(self, table, stmt):
+        group_by = stmt.group_by or []
+        self._check_columns(table, group_by)
+        for item in stmt.columns:
+            if item == '*':
+                raise ValueError("SELECT * cannot be combined with aggregates or GROUP BY.")
+            if not isinstance(item, Aggregate):
+                if item not in group_by:
+                    raise ValueError(f"Column {item} must appear in GROUP BY or be aggregated.")
+                continue
+            if item.function not in AGGREGATE_FUNCTIONS:
+                raise ValueError(f"Unknown aggregate function {item.function}.")
+            if item.column == '*' and item.function != 'count':
+                raise ValueError(f"{item.function}(*) is not supported.")
+            if item.column != '*':
+                self._check_columns(table, [item.column])
+        order_by = stmt.order_by
+        if order_by is not None and order_by.column not in map(output_name, stmt.columns):
+            raise ValueError(f"Unknown column {order_by.column} in ORDER BY.")
+
+    def _aggregate(self, table, stmt, aggregator):
+        """Adds the rows selected by `stmt` to the aggregator, in worker processes when configured."""
+        btree = self.get_btree(stmt.table_name)
+        where_value = self._where_value(table, stmt.where_clause)
+        with self._phase('plan'):
+            path = Planner(table).plan(stmt.where_clause, where_value)
+        if self._parallel_scan(btree, path):
+            trees = btree.prune(stmt.where_clause, where_value) if isinstance(btree, PartitionedTable) else [btree]
+            self.parallel.aggregate(
+                trees, aggregator, path.low, path.high, path.low_inclusive, path.high_inclusive,
+                stmt.where_clause, where_value,
+            )
+        else:
+            needed = aggregator.group_by + [item.column for item in aggregator.aggregates if item.column != '*']
+            aggregator.extend(self.scan_records(btree, path, stmt.where_clause, where_value, columns=needed))
+        return aggregator
+
+    def view_rows(self, table, stmt):
+        """Evaluates a SELECT on a materialized view from the view's stored groups."""
+        if self._is_aggregate(stmt):
+            raise ValueError("Aggregates and GROUP BY are not supported on materialized views.")
+        columns = stmt.columns
+        self._check_columns(table, [] if columns == ['*'] else columns)
+        where_value = self._where_value(table, stmt.where_clause)
+        rows = [row for row in self.get_view(stmt.table_name).rows() if matches(row, stmt.where_clause, where_value)]
+        if stmt.order_by is not None:
+            self._check_columns(table, [stmt.order_by.column])
+            rows.sort(key=itemgetter(stmt.order_by.column), reverse=stmt.order_by.descending)
+        if stmt.limit is not None:
+            rows = rows[:stmt.limit]
+        if columns == ['*']:
+            return rows
+        return [{col: row[col] for col in columns} for row in rows]
+
+    def _is_aggregate(self, select):
+        return select.group_by is not None or any(isinstance(item, Aggregate) for item in select.columns)
+
+    def _stops_early(self, table, stmt):
+        """Whether a SELECT can stop reading rows once it has LIMIT of them."""
+        return stmt.limit is not None and self.sort_strategy(table, stmt.order_by, stmt.limit) in (NO_SORT, INDEX_ORDER)
+
+    def _parallel_scan(self, btree, path, parallel=True):
+        # Workers only pay for their start-up and for sending the rows back on large scans read to the end
+        return (
+            parallel and self.parallel is not None and isinstance(btree, (BTree, PartitionedTable))
+            and path.method in (FULL_SCAN, KEY_RANGE_SCAN) and path.estimated_cost >= PARALLEL_MIN_COST
+        )
+
+    def scan_records(self, btree, path, where_clause, where_value, reverse=False, columns=None, parallel=True):
+        """Yields the rows matching the WHERE clause using the access path chosen by the planner.
+
+        Columnar tables evaluate the predicate themselves and may return only `columns`, as do
+        B-tree scans split across worker processes. Without `parallel`, as for scans that may
+        stop early, the rows are read in this process.
+        """
+        if isinstance(btree, ColumnarTable) and path.method not in (KEY_LOOKUP, INDEX_LOOKUP):
+            predicates = [] if where_clause is None else [(where_clause.column, where_clause.operator, where_value)]
+            return iter(btree.scan(columns, predicates, reverse))
+        if isinstance(btree, PartitionedTable) and path.method in (FULL_SCAN, KEY_RANGE_SCAN):
+            # Every surviving partition is scanned (in parallel when workers are configured) and merged
+            # on the key, which the partition scans must return even when `columns` leaves it out
+            if columns is not None and btree.key_column not in columns:
+                columns = columns + [btree.key_column]
+            scans = [
+                self.scan_records(tree, path, where_clause, where_value, reverse, columns, parallel)
+                for tree in btree.prune(where_clause, where_value)
+            ]
+            return btree.merge(scans, itemgetter(btree.key_column), reverse)
+        if self._parallel_scan(btree, path, parallel):
+            return self.parallel.scan(
+                btree, path.low, path.high, path.low_inclusive, path.high_inclusive, reverse,
+                where_clause, where_value, columns,
+            )
+        if path.method == KEY_LOOKUP:
+            value = btree.search(path.low)
+            items = [] if value is None else [(path.low, value)]
+        elif path.method == INDEX_LOOKUP:
+            keys = sorted(self.get_index(path.index).lookup(path.low), reverse=reverse)
+            items = ((key, btree.search(key)) for key in keys)
+        elif path.method == KEY_RANGE_SCAN:
+            items = btree.iter_range(path.low, path.high, path.low_inclusive, path.high_inclusive, reverse)
+        else:
+            items = btree.iter_items(reverse)
+        # Rows fetched through an index are re-checked in case the entry is stale
+        return (record for _, record in items if record is not None and matches(record, where_clause, where_value))
+
+    async def scan_batches(self, btree, path, where_clause, where_value, reverse=False, columns=None,
+                           parallel=True, batch_size=ASYNC_BATCH_SIZE):
+        """Async generator of the rows `scan_records` yields, in lists of up to `batch_size`.
+
+        B-tree key lookups and range scans await their node reads and let other tasks run after
+        every `batch_size` rows read, matching or not. Other engines and access paths, as well
+        as scans split across worker processes, are read with `scan_records` in a worker thread,
+        one batch of matching rows at a time; a cancelled scan stops once its current batch is read.
+        """
+        if isinstance(btree, BTree) and path.method == KEY_LOOKUP:
+            record = await btree.search_async(path.low)
+            if record is not None and matches(record, where_clause, where_value):
+                yield [record]
+            return
+        if isinstance(btree, BTree) and path.method in (FULL_SCAN, KEY_RANGE_SCAN):
+            batch = []
+            scanned = 0
+            items = btree.iter_range_async(path.low, path.high, path.low_inclusive, path.high_inclusive, reverse)
+            async with aclosing(items):
+                async for _, record in items:
+                    if matches(record, where_clause, where_value):
+                        batch.append(record)
+                    scanned += 1
+                    if scanned % batch_size == 0:
+                        if batch:
+                            yield batch
+                            batch = []
+                        await asyncio.sleep(0)
+            if batch:
+                yield batch
+            return
+        records = self.scan_records(btree, path, where_clause, where_value, reverse, columns, parallel)
+        try:
+            while True:
+                reading = asyncio.ensure_future(asyncio.to_thread(list, islice(records, batch_size)))
+                try:
+                    batch = await asyncio.shield(reading)
+                except asyncio.CancelledError:
+                    # The thread cannot be interrupted; the scan must not outlive the read registration
+                    await asyncio.wait([reading])
+                    raise
+                if not batch:
+                    return
+                yield batch
+        finally:
+            records.close()
+
+    def sort_strategy(self, table, order_by, limit):
+        if order_by is None:
+            return NO_SORT
+        if order_by.column not in table['columns']:
+            raise ValueError(f"Unknown column {order_by.column} in ORDER BY.")
+        if order_by.column == table['columns'][0]:
+            # Rows are keyed on the first column, so tree order already is the requested order
+            return INDEX_ORDER
+        return TOP_K if limit is not None else EXTERNAL_SORT
+
+    def ordered_records(self, table, order_by, limit, scan):
+        strategy = self.sort_strategy(table, order_by, limit)
+        if strategy == NO_SORT:
+            return scan()
+        if strategy == INDEX_ORDER:
+            return scan(reverse=order_by.descending)
+        sorter = self._sorter(strategy, order_by, limit)
+        sorter.extend(scan())
+        return iter(sorter)
+
+    def _sorter(self, strategy, order_by, limit):
+        def sort_key(record):
+            return record[order_by.column]
+        if strategy == TOP_K:
+            return TopK(limit, key=sort_key, reverse=order_by.descending)
+        return ExternalSorter(sort_key, reverse=order_by.descending, buffer_size=self.sort_buffer_size)
+
     def update_table(self, stmt):
         table_name = stmt.table_name
         set_clause = stmt.set_clause
@@ -109,47 +1000,180 @@ class Database:
         table = self.tables.get(table_name)
         if not table:
             raise ValueError(f"Table {table_name} does not exist.")
+        self._check_writable(table_name, table)
+        self._check_columns(table, [set_clause.column])
         btree = self.get_btree(table_name)
-        updated_rows = 0
-        where_value = self.parse_value(where_clause.value)
+        where_value = self._where_value(table, where_clause)
         set_value = self.parse_value(set_clause.value)
-        def update_node(node):
-            nonlocal updated_rows
-            for idx, (key, row) in enumerate(node.keys):
-                if row.get(where_clause.column) == where_value:
-                    row[set_clause.column] = set_value
-                    node.keys[idx] = (key, row)
-                    updated_rows += 1
-            btree.node_manager.update_node(node)
-            if not node.leaf:
-                for child_id in node.children:
-                    child = btree.node_manager.load_node(child_id)
-                    update_node(child)
-        root = btree.node_manager.load_node(btree.root_id)
-        update_node(root)
+        path = Planner(table).plan(where_clause, where_value)
+        key_column = table['columns'][0]
+        matched = list(self.scan_records(btree, path, where_clause, where_value))
+        if set_clause.column == key_column:
+            self._check_key_update(btree, table_name, matched, key_column, set_value)
+        if matched:
+            self.table_versions[table_name] += 1
+        for row in matched:
+            key = row[key_column]
+            old_row = dict(row)
+            row[set_clause.column] = set_value
+            if row[key_column] != key:
+                btree.delete(key)
+            btree.insert(row[key_column], row)
+            self._update_indexes(table, key, old_row, row)
+            self._update_views(table, old_row, row)
+        self._refresh_views(table)
+        updated_rows = len(matched)
         return f"{updated_rows} row{(updated_rows > 1) * 's'} updated in {table_name}."
 
+    def _check_key_update(self, btree, table_name, matched, key_column, set_value):
+        # Moving rows to a key held by another row would silently overwrite it
+        if len(matched) > 1:
+            raise ValueError(f"Cannot set {key_column} of {len(matched)} rows in {table_name} to the same key {set_value!r}.")
+        if matched and matched[0][key_column] != set_value and btree.search(set_value) is not None:
+            raise ValueError(f"Key {set_value!r} already exists in {table_name}.")
+
     def delete_from(self, stmt):
         table_name = stmt.table_name
         where_clause = stmt.where_clause
         table = self.tables.get(table_name)
         if not table:
             raise ValueError(f"Table {table_name} does not exist.")
+        self._check_writable(table_name, table)
         btree = self.get_btree(table_name)
         deleted_rows = 0
-        keys_to_delete = []
-        all_records = btree.traverse()
-        where_value = self.parse_value(where_clause.value)
-
-        for key, row in all_records:
-            row_value = row[where_clause.column]
-            if row_value == where_value:
-                keys_to_delete.append(key)
-        for key in keys_to_delete:
-            btree.delete(key)
+        where_value = self._where_value(table, where_clause)
+        path = Planner(table).plan(where_clause, where_value)
+        key_column = table['columns'][0]
+        rows_to_delete = list(self.scan_records(btree, path, where_clause, where_value))
+        if rows_to_delete:
+            self.table_versions[table_name] += 1
+        for row in rows_to_delete:
+            btree.delete(row[key_column])
+            self._update_indexes(table, row[key_column], row, None)
+            self._update_views(table, row, None)
             deleted_rows += 1
+        self._refresh_views(table)
         return f"{deleted_rows} row{(deleted_rows > 1) * 's'} deleted from {table_name}."
 
+    def analyze_table(self, stmt):
+        table_name = stmt.table_name
+        table = self.tables.get(table_name)
+        if not table:
+            raise ValueError(f"Table {table_name} does not exist.")
+        if 'view' in table:
+            raise ValueError(f"{table_name} is a materialized view; its rows are read without planning.")
+        btree = self.get_btree(table_name)
+        if not isinstance(btree, BTree):
+            table['statistics'] = collect_scan_statistics(
+                btree.iter_items(), table['columns'], btree.block_count(), btree.lookup_cost()
+            )
+        else:
+            table['statistics'] = collect_statistics(btree, table['columns'])
+        self._save_tables_meta()
+        return f"Table {table_name} analyzed."
+
+    def vacuum_table(self, stmt):
+        table_name = stmt.table_name
+        table = self.tables.get(table_name)
+        if not table:
+            raise ValueError(f"Table {table_name} does not exist.")
+        btree = self.get_btree(table_name)
+        engine = table.get('engine', BTREE_ENGINE)
+        if engine == LSM_ENGINE:
+            # Merging every run into one drops overwritten rows and tombstones
+            blocks_before = btree.block_count()
+            btree.flush()
+            btree.compact(full=True)
+            return f"Table {table_name} vacuumed: {blocks_before} blocks -> {btree.block_count()} blocks."
+        if engine != BTREE_ENGINE:
+            raise ValueError(f"VACUUM is not supported for {engine} tables.")
+        summary = btree.vacuum()
+        if isinstance(btree, PartitionedTable):
+            # Drops the entries left behind by rows of dropped partitions
+            for index in table.get('indexes', {}).values():
+                self._prune_index(btree, index)
+        statistics = table.get('statistics')
+        if statistics:
+            statistics.update(row_count=summary['rows'], node_count=summary['nodes_after'], height=summary['height'])
+            self._save_tables_meta()
+        return f"Table {table_name} vacuumed: {summary['nodes_before']} nodes -> {summary['nodes_after']} nodes."
+
+    def _prune_index(self, btree, index):
+        """Removes the index entries whose key no longer holds a row with the indexed value."""
+        def live(value, key):
+            row = btree.search(key)
+            return row is not None and row[index['column']] == value
+        self.get_index(index).prune(live)
+
+    def explain(self, stmt):
+        select = stmt.statement
+        table = self.tables.get(select.table_name)
+        if not table:
+            raise ValueError(f"Table {select.table_name} does not exist.")
+        where_clause = select.where_clause
+        where_value = self._where_value(table, where_clause)
+        if 'view' in table:
+            lines = [f"VIEW SCAN on {select.table_name}"]
+            lines.append(f"  materialized view of {table['view']['source']}, maintained incrementally")
+            return self._explain_actual(stmt, lines)
+        planner = Planner(table)
+        candidates = planner.candidates(where_clause, where_value)
+        chosen = min(candidates, key=lambda path: path.estimated_cost)
+        target = select.table_name
+        if where_clause is not None:
+            target += f" where {where_clause.column} {where_clause.operator} {where_value!r}"
+        lines = [f"{chosen.label} on {target}"]
+        lines.append(f"  estimated rows: {chosen.estimated_rows}, estimated cost: {chosen.estimated_cost:.2f}")
+        lines.append(f"  statistics: {'analyzed' if planner.stats else 'default estimates'}")
+        if self._is_aggregate(select):
+            aggregates = ', '.join(output_name(item) for item in select.columns if isinstance(item, Aggregate))
+            lines.append(f"  aggregate: {aggregates or 'none'}; group by: {', '.join(select.group_by or []) or 'none'}")
+        else:
+            lines.append(f"  sort: {self.sort_strategy(table, select.order_by, select.limit)}")
+        btree = self.get_btree(select.table_name)
+        if isinstance(btree, PartitionedTable) and chosen.method in (FULL_SCAN, KEY_RANGE_SCAN):
+            scanned = btree.prune(where_clause, where_value)
+            names = [partition['name'] for partition, tree in zip(btree.partitions, btree.trees) if tree in scanned]
+            lines.append(f"  partitions: {', '.join(names) or 'none'} ({len(names)} of {len(btree.trees)} scanned)")
+        if self._parallel_scan(btree, chosen, self._is_aggregate(select) or not self._stops_early(table, select)):
+            lines.append(f"  parallel: {self.parallel.workers} workers")
+        if select.limit is not None:
+            lines.append(f"  limit: {select.limit}")
+        lines.append("candidates:")
+        for path in candidates:
+            lines.append(f"  {path}{' *' if path is chosen else ''}")
+        return self._explain_actual(stmt, lines)
+
+    def _explain_actual(self, stmt, lines):
+        """Runs the query of an EXPLAIN ANALYZE and appends its actual rows, time and I/O."""
+        if stmt.analyze:
+            io_before = self.io_counters()
+            start = time.perf_counter()
+            rows = self.select_from(stmt.statement)
+            elapsed = time.perf_counter() - start
+            io = self.io_counters() - io_before
+            lines.append("actual:")
+            lines.append(f"  rows: {len(rows)}, time: {elapsed * 1000:.3f} ms")
+            lines.append(
+                f"  node loads: {io['node_loads']}, node writes: {io['node_writes']}, "
+                f"bytes read: {io['bytes_read']}, bytes written: {io['bytes_written']}"
+            )
+        return "\n".join(lines)
+
+    def _phase(self, name):
+        return self.last_profile.phase(name) if self.last_profile else nullcontext()
+
+    def _where_value(self, table, where_clause):
+        if where_clause is None:
+            return None
+        self._check_columns(table, [where_clause.column])
+        return self.parse_value(where_clause.value)
+
+    def _check_columns(self, table, columns):
+        for column in columns:
+            if column not in table['columns']:
+                raise ValueError(f"Unknown column {column}.")
+
     def parse_value(self, value):
         if isinstance(value, (int, float)):
             return value
@@ -0,0 +1,187 @@
+import os
+import pickle
+from collections import Counter
+from operator import itemgetter
+from bloom import KeyFilter, key_digest
+from node_manager import NodeManager, FILE_MODE
+
+DIRECTORY_FILE = 'directory.pkl'
+DEFAULT_BUCKET_CAPACITY = 64
+# Keys are hashed to 128 bits; past this depth a full bucket just overflows instead of splitting
+MAX_DEPTH = 128
+
+
+class Bucket:
+    def __init__(self, local_depth, node_id=None):
+        self.local_depth = local_depth  # Number of low hash bits shared by every key in the bucket
+        self.entries = {}
+        self.node_id = node_id
+
+
+class HashIndex:
+    """Extendible hash table whose buckets are stored as nodes by NodeManager.
+
+    The directory maps the low `global_depth` bits of a key's hash to a bucket id and is kept
+    in memory, so an equality lookup reads a single bucket. A full bucket splits into two on
+    one more hash bit; the directory only doubles when that bucket already uses every
+    directory bit, and no other bucket is rewritten.
+    """
+
+    def __init__(self, storage_path='data/hash', bucket_capacity=DEFAULT_BUCKET_CAPACITY, read_mode=FILE_MODE):
+        self.storage_path = storage_path
+        self.node_manager = NodeManager(storage_path, read_mode=read_mode)
+        self.directory_file = os.path.join(storage_path, DIRECTORY_FILE)
+        # Cumulative operation counters: inserts, deletes, searches, scans, splits, bloom_negatives
+        self.stats = Counter()
+        self.io_stats = self.node_manager.stats
+
+        if os.path.exists(self.directory_file):
+            with open(self.directory_file, 'rb') as f:
+                metadata = pickle.load(f)
+            self.bucket_capacity = metadata['bucket_capacity']
+            self.global_depth = metadata['global_depth']
+            self.directory = metadata['directory']
+        else:
+            self.bucket_capacity = bucket_capacity
+            self.global_depth = 0
+            self.directory = [self.node_manager.save_node(Bucket(0))]
+            self._save_directory()
+        # Answers lookups of absent keys without loading a bucket
+        self.key_filter = KeyFilter(storage_path, self._keys)
+
+    def insert(self, key, value):
+        self.stats['inserts'] += 1
+        self.key_filter.add(key)
+        while True:
+            bucket = self._bucket_for(key)
+            if key in bucket.entries or len(bucket.entries) < self.bucket_capacity or bucket.local_depth >= MAX_DEPTH:
+                bucket.entries[key] = value
+                self.node_manager.update_node(bucket)
+                return
+            self._split(bucket)
+
+    def delete(self, key):
+        self.stats['deletes'] += 1
+        bucket = self._bucket_for(key)
+        if key in bucket.entries:
+            del bucket.entries[key]
+            self.node_manager.update_node(bucket)
+
+    def search(self, key):
+        self.stats['searches'] += 1
+        if key not in self.key_filter:
+            self.stats['bloom_negatives'] += 1
+            return None
+        return self._bucket_for(key).entries.get(key)
+
+    def iter_items(self, reverse=False):
+        return self.iter_range(reverse=reverse)
+
+    def iter_range(self, low=None, high=None, low_inclusive=True, high_inclusive=True, reverse=False):
+        """Yields the (key, value) pairs between `low` and `high` in key order.
+
+        Hashing keeps no key order, so every bucket is read and the matching entries sorted.
+        """
+        self.stats['scans'] += 1
+        items = []
+        for node_id in dict.fromkeys(self.directory):
+            for key, value in self.node_manager.load_node(node_id).entries.items():
+                if low is not None and (key < low or (key == low and not low_inclusive)):
+                    continue
+                if high is not None and (key > high or (key == high and not high_inclusive)):
+                    continue
+                items.append((key, value))
+        items.sort(key=itemgetter(0), reverse=reverse)
+        yield from items
+
+    def block_count(self):
+        return len(set(self.directory))
+
+    def lookup_cost(self):
+        return 1
+
+    def rebuild_key_filter(self):
+        """Rebuilds the key filter from the buckets, dropping the keys deleted since it was built."""
+        self.key_filter.rebuild(self._keys())
+
+    def close(self):
+        self.key_filter.close()
+        self.node_manager.close()
+
+    def _keys(self):
+        for node_id in dict.fromkeys(self.directory):
+            yield from self.node_manager.load_node(node_id).entries
+
+    def _bucket_for(self, key):
+        slot = key_digest(key) & ((1 << self.global_depth) - 1)
+        return self.node_manager.load_node(self.directory[slot])
+
+    def _split(self, bucket):
+        self.stats['splits'] += 1
+        if bucket.local_depth == self.global_depth:
+            # Slots i and i + 2^depth share their low bits, so both start out on the same bucket
+            self.directory = self.directory + self.directory
+            self.global_depth += 1
+        bit = 1 << bucket.local_depth
+        bucket.local_depth += 1
+        sibling = Bucket(bucket.local_depth)
+        for key in list(bucket.entries):
+            if key_digest(key) & bit:
+                sibling.entries[key] = bucket.entries.pop(key)
+        sibling_id = self.node_manager.save_node(sibling)
+        for slot, node_id in enumerate(self.directory):
+            if node_id == bucket.node_id and slot & bit:
+                self.directory[slot] = sibling_id
+        # Publish the directory before shrinking the old bucket, so a crash in between
+        # leaves unreachable duplicates rather than lost keys
+        self._save_directory()
+        self.node_manager.update_node(bucket)
+
+    def _save_directory(self):
+        temp_path = self.directory_file + '.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump({
+                'bucket_capacity': self.bucket_capacity,
+                'global_depth': self.global_depth,
+                'directory': self.directory,
+            }, f)
+        os.replace(temp_path, self.directory_file)
+
+
+class SecondaryIndex:
+    """Maps the values of one column to the keys of the rows holding them, in a HashIndex."""
+
+    def __init__(self, storage_path, column, bucket_capacity=DEFAULT_BUCKET_CAPACITY):
+        self.column = column
+        self.hash_index = HashIndex(storage_path, bucket_capacity)
+        self.stats = self.hash_index.stats
+        self.io_stats = self.hash_index.io_stats
+
+    def lookup(self, value):
+        return self.hash_index.search(value) or []
+
+    def add(self, row, key):
+        keys = self.lookup(row[self.column])
+        if key not in keys:
+            self.hash_index.insert(row[self.column], keys + [key])
+
+    def remove(self, row, key):
+        keys = self.lookup(row[self.column])
+        if key in keys:
+            keys.remove(key)
+            if keys:
+                self.hash_index.insert(row[self.column], keys)
+            else:
+                self.hash_index.delete(row[self.column])
+
+    def prune(self, live):
+        """Removes the keys for which `live(value, key)` is false, e.g. of rows no longer stored."""
+        for value, keys in list(self.hash_index.iter_items()):
+            kept = [key for key in keys if live(value, key)]
+            if not kept:
+                self.hash_index.delete(value)
+            elif len(kept) < len(keys):
+                self.hash_index.insert(value, kept)
+
+    def close(self):
+        self.hash_index.close()
@@ -13,6 +13,30 @@ reserved = {
     'set': 'SET',
     'where': 'WHERE',
     'delete': 'DELETE',
+    'order': 'ORDER',
+    'by': 'BY',
+    'asc': 'ASC',
+    'desc': 'DESC',
+    'limit': 'LIMIT',
+    'analyze': 'ANALYZE',
+    'explain': 'EXPLAIN',
+    'with': 'WITH',
+    'engine': 'ENGINE',
+    'index': 'INDEX',
+    'on': 'ON',
+    'using': 'USING',
+    'vacuum': 'VACUUM',
+    'group': 'GROUP',
+    'partition': 'PARTITION',
+    'partitions': 'PARTITIONS',
+    'less': 'LESS',
+    'than': 'THAN',
+    'alter': 'ALTER',
+    'add': 'ADD',
+    'drop': 'DROP',
+    'materialized': 'MATERIALIZED',
+    'view': 'VIEW',
+    'as': 'AS',
 }
 
 # List of token names
@@ -24,6 +48,11 @@ tokens = [
     'LPAREN',
     'RPAREN',
     'EQ',
+    'NE',
+    'LE',
+    'GE',
+    'LT',
+    'GT',
     'TIMES',
 ] + list(reserved.values())
 
@@ -32,6 +61,11 @@ t_COMMA    = r','
 t_LPAREN   = r'\('
 t_RPAREN   = r'\)'
 t_EQ       = r'='
+t_NE       = r'!=|<>'
+t_LE       = r'<='
+t_GE       = r'>='
+t_LT       = r'<'
+t_GT       = r'>'
 t_TIMES    = r'\*'
 
 # Ignore spaces and tabs
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+
+class StatementLock:
+    """Serializes statements while letting async reads pause between batches.
+
+    Statements run through `Database.execute` hold the lock (a re-entrant lock used with
+    `with`) from start to end, as before. An async read instead registers as a reader and
+    holds the lock only for short synchronous steps, so it can give way to other work while
+    it scans. A write waits until no reader is registered, and no new reader registers while a
+    write is waiting, so a stream of reads cannot starve writes.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self.readers = 0
+        self.writers_waiting = 0
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+    def wait_for_readers(self):
+        """Blocks, with the lock held, until no async read is in progress."""
+        self.writers_waiting += 1
+        try:
+            while self.readers:
+                self._changed.wait()
+        finally:
+            self.writers_waiting -= 1
+            self._changed.notify_all()
+
+    def add_reader(self):
+        with self._lock:
+            while self.writers_waiting:
+                self._changed.wait()
+            self.readers += 1
+
+    async def add_reader_async(self):
+        """Registers a reader, waiting in a worker thread if the lock is busy."""
+        if self._lock.acquire(blocking=False):
+            try:
+                if not self.writers_waiting:
+                    self.readers += 1
+                    return
+            finally:
+                self._lock.release()
+        adding = asyncio.ensure_future(asyncio.to_thread(self.add_reader))
+        try:
+            await asyncio.shield(adding)
+        except asyncio.CancelledError:
+            # The thread registers the reader regardless, so unregister it once it has
+            adding.add_done_callback(lambda _: self.remove_reader())
+            raise
+
+    def remove_reader(self):
+        with self._lock:
+            self.readers -= 1
+            self._changed.notify_all()
@@ -0,0 +1,413 @@
+import heapq
+import os
+import pickle
+import struct
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+from bloom import BloomFilter, DEFAULT_ERROR_RATE
+
+MANIFEST_FILE = 'manifest.pkl'
+WAL_FILE = 'wal.log'
+RUN_SUFFIX = '.sst'
+# Entries buffered in the memtable before it is flushed to a sorted run
+DEFAULT_MEMTABLE_SIZE = 4096
+# Entries per data block of a run; the sparse index holds the first key of every block
+BLOCK_ENTRIES = 128
+# Number of runs of similar size that are merged into one
+COMPACTION_FANOUT = 4
+
+LENGTH = struct.Struct('<I')
+FOOTER = struct.Struct('<Q')
+
+
+class _Tombstone:
+    def __reduce__(self):
+        # Unpickles to the module-level singleton, so tombstones can be compared by identity
+        return 'TOMBSTONE'
+
+    def __repr__(self):
+        return 'TOMBSTONE'
+
+
+TOMBSTONE = _Tombstone()
+MISSING = object()
+
+
+class SortedRun:
+    """An immutable file of (key, value) entries sorted by key.
+
+    The file holds pickled blocks of BLOCK_ENTRIES entries, then a pickled footer with the
+    sparse index (first key, offset and length of every block), the run's Bloom filter and
+    its entry count, and finally the offset of that footer.
+    """
+
+    def __init__(self, path, io_stats):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.io_stats = io_stats
+        self._fd = os.open(path, os.O_RDONLY)
+        size = os.fstat(self._fd).st_size
+        footer_offset, = FOOTER.unpack(os.pread(self._fd, FOOTER.size, size - FOOTER.size))
+        footer = pickle.loads(os.pread(self._fd, size - FOOTER.size - footer_offset, footer_offset))
+        self.index = footer['index']
+        self.first_keys = [first_key for first_key, _, _ in self.index]
+        self.bloom = footer['bloom']
+        self.count = footer['count']
+        self.readers = 0  # Open scans reading the run
+        self.retired = False  # Replaced by compaction; closed once no scan reads it
+
+    @classmethod
+    def write(cls, path, entries, capacity, io_stats, error_rate=DEFAULT_ERROR_RATE):
+        """Writes sorted `entries` to a new run file; returns None if there were no entries."""
+        bloom = BloomFilter(capacity, error_rate)
+        index = []
+        offset = 0
+        count = 0
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            block = []
+            for entry in entries:
+                block.append(entry)
+                bloom.add(entry[0])
+                count += 1
+                if len(block) == BLOCK_ENTRIES:
+                    offset = cls._write_block(f, block, offset, index, io_stats)
+                    block = []
+            if block:
+                offset = cls._write_block(f, block, offset, index, io_stats)
+            f.write(pickle.dumps({'index': index, 'bloom': bloom, 'count': count}, protocol=pickle.HIGHEST_PROTOCOL))
+            f.write(FOOTER.pack(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        if not count:
+            os.remove(temp_path)
+            return None
+        os.replace(temp_path, path)
+        return cls(path, io_stats)
+
+    @staticmethod
+    def _write_block(f, block, offset, index, io_stats):
+        data = pickle.dumps(block, protocol=pickle.HIGHEST_PROTOCOL)
+        f.write(data)
+        index.append((block[0][0], offset, len(data)))
+        io_stats['node_writes'] += 1
+        io_stats['bytes_written'] += len(data)
+        return offset + len(data)
+
+    def _read_block(self, i):
+        _, offset, length = self.index[i]
+        data = os.pread(self._fd, length, offset)
+        self.io_stats['node_loads'] += 1
+        self.io_stats['bytes_read'] += length
+        return pickle.loads(data)
+
+    def get(self, key):
+        i = bisect_right(self.first_keys, key) - 1
+        if i < 0:
+            return MISSING
+        block = self._read_block(i)
+        j = bisect_left(block, key, key=itemgetter(0))
+        if j < len(block) and block[j][0] == key:
+            return block[j][1]
+        return MISSING
+
+    def scan(self, low=None, high=None, reverse=False):
+        """Yields the entries with low <= key <= high, reading only the blocks that overlap."""
+        if reverse:
+            start = len(self.index) - 1 if high is None else bisect_right(self.first_keys, high) - 1
+            for i in range(start, -1, -1):
+                for key, value in reversed(self._read_block(i)):
+                    if high is not None and key > high:
+                        continue
+                    if low is not None and key < low:
+                        return
+                    yield key, value
+            return
+        start = 0 if low is None else max(0, bisect_right(self.first_keys, low) - 1)
+        for i in range(start, len(self.index)):
+            for key, value in self._read_block(i):
+                if low is not None and key < low:
+                    continue
+                if high is not None and key > high:
+                    return
+                yield key, value
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class LSMTree:
+    """Log-structured table storage with the same point, range and scan interface as BTree.
+
+    Writes are appended to a write-ahead log and applied to an in-memory memtable; a full
+    memtable is flushed to an immutable sorted run. Reads check the memtable and then the runs
+    from newest to oldest, skipping runs whose Bloom filter rules the key out. Runs of similar
+    size are merged by compaction, on a background thread unless `background_compaction` is off.
+    """
+
+    def __init__(self, storage_path='data/lsm', memtable_size=DEFAULT_MEMTABLE_SIZE,
+                 compaction_fanout=COMPACTION_FANOUT, background_compaction=True, bloom_error_rate=DEFAULT_ERROR_RATE):
+        self.storage_path = storage_path
+        self.memtable_size = memtable_size
+        self.compaction_fanout = compaction_fanout
+        self.background_compaction = background_compaction
+        self.bloom_error_rate = bloom_error_rate
+        self.manifest_file = os.path.join(storage_path, MANIFEST_FILE)
+        self.wal_path = os.path.join(storage_path, WAL_FILE)
+        # Cumulative operation counters: inserts, deletes, searches, scans, flushes, compactions, bloom_skips
+        self.stats = Counter()
+        # Cumulative I/O counters, named like NodeManager's with blocks counted as nodes
+        self.io_stats = Counter()
+        self._lock = threading.RLock()
+        self._compaction_lock = threading.Lock()
+        self._compactor = None
+
+        os.makedirs(self.storage_path, exist_ok=True)
+        manifest = {'runs': [], 'next_run_id': 0}
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, 'rb') as f:
+                manifest = pickle.load(f)
+        self._next_run_id = manifest['next_run_id']
+        self.runs = [SortedRun(os.path.join(storage_path, name), self.io_stats) for name in manifest['runs']]
+        self._remove_orphans(set(manifest['runs']))
+        self.memtable = {}
+        self._replay_wal()
+        self._wal = open(self.wal_path, 'ab')
+
+    def insert(self, key, value):
+        self.stats['inserts'] += 1
+        self._apply(key, value)
+
+    def delete(self, key):
+        self.stats['deletes'] += 1
+        self._apply(key, TOMBSTONE)
+
+    def _apply(self, key, value):
+        data = pickle.dumps((key, value), protocol=pickle.HIGHEST_PROTOCOL)
+        self._wal.write(LENGTH.pack(len(data)) + data)
+        self._wal.flush()
+        with self._lock:
+            self.memtable[key] = value
+            full = len(self.memtable) >= self.memtable_size
+        if full:
+            self.flush()
+
+    def search(self, key):
+        self.stats['searches'] += 1
+        with self._lock:
+            value = self.memtable.get(key, MISSING)
+            if value is not MISSING:
+                return None if value is TOMBSTONE else value
+            runs = self._acquire_runs()
+        try:
+            for run in runs:
+                if key not in run.bloom:
+                    self.stats['bloom_skips'] += 1
+                    continue
+                value = run.get(key)
+                if value is not MISSING:
+                    break
+        finally:
+            self._release_runs(runs)
+        return None if value is MISSING or value is TOMBSTONE else value
+
+    def iter_items(self, reverse=False):
+        return self.iter_range(reverse=reverse)
+
+    def iter_range(self, low=None, high=None, low_inclusive=True, high_inclusive=True, reverse=False):
+        """Lazily yields the live (key, value) pairs between `low` and `high` in key order."""
+        self.stats['scans'] += 1
+        with self._lock:
+            memtable = sorted(
+                ((key, value) for key, value in self.memtable.items()
+                 if (low is None or key >= low) and (high is None or key <= high)),
+                key=itemgetter(0), reverse=reverse,
+            )
+            runs = self._acquire_runs()
+        try:
+            sources = [memtable] + [run.scan(low, high, reverse) for run in runs]
+            for key, value in _merge_newest(sources, reverse):
+                if value is TOMBSTONE:
+                    continue
+                if low is not None and key == low and not low_inclusive:
+                    continue
+                if high is not None and key == high and not high_inclusive:
+                    continue
+                yield key, value
+        finally:
+            self._release_runs(runs)
+
+    def _acquire_runs(self):
+        """Returns the current runs, registered as read so compaction does not close them.
+
+        Must be called holding the lock.
+        """
+        runs = list(self.runs)
+        for run in runs:
+            run.readers += 1
+        return runs
+
+    def _release_runs(self, runs):
+        with self._lock:
+            for run in runs:
+                run.readers -= 1
+                if run.retired and not run.readers:
+                    run.close()
+
+    def flush(self):
+        """Writes the memtable to a new sorted run and starts a fresh write-ahead log."""
+        with self._lock:
+            if not self.memtable:
+                return
+            entries = sorted(self.memtable.items(), key=itemgetter(0))
+            run = self._write_run(entries, len(entries))
+            self.runs.insert(0, run)
+            self._save_manifest()
+            self.memtable = {}
+            self._wal.close()
+            self._wal = open(self.wal_path, 'wb')
+            self.stats['flushes'] += 1
+        self._schedule_compaction()
+
+    def compact(self, full=False):
+        """Merges groups of similarly sized runs until no tier holds `compaction_fanout` runs.
+
+        With `full`, every run is merged into one instead, dropping all overwritten rows and tombstones.
+        """
+        with self._compaction_lock:
+            if full:
+                with self._lock:
+                    runs = list(self.runs)
+                if runs:
+                    self._merge_runs(runs)
+                return
+            while True:
+                with self._lock:
+                    runs = self._pick_compaction()
+                if not runs:
+                    return
+                self._merge_runs(runs)
+
+    def wait_for_compaction(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+
+    def block_count(self):
+        return sum(len(run.index) for run in self.runs) + (1 if self.memtable else 0)
+
+    def lookup_cost(self):
+        # At most one block per run, fewer when Bloom filters rule runs out
+        return len(self.runs) + 1
+
+    def close(self):
+        self.wait_for_compaction()
+        self._wal.close()
+        for run in self.runs:
+            run.close()
+
+    def _schedule_compaction(self):
+        if not self.background_compaction:
+            self.compact()
+            return
+        with self._lock:
+            if self._compactor is None or not self._compactor.is_alive():
+                self._compactor = threading.Thread(target=self.compact, name='lsm-compaction', daemon=True)
+                self._compactor.start()
+
+    def _pick_compaction(self):
+        # Runs are ordered newest first and grow with age, so each size tier is a contiguous slice
+        tiers = [self._tier(run) for run in self.runs]
+        start = 0
+        while start < len(self.runs):
+            end = start
+            while end < len(self.runs) and tiers[end] == tiers[start]:
+                end += 1
+            if end - start >= self.compaction_fanout:
+                return self.runs[start:end]
+            start = end
+        return None
+
+    def _tier(self, run):
+        tier = 0
+        size = self.memtable_size * self.compaction_fanout
+        while run.count >= size:
+            tier += 1
+            size *= self.compaction_fanout
+        return tier
+
+    def _merge_runs(self, runs):
+        # Tombstones only need to survive while an older run may still hold the deleted key
+        drop_tombstones = runs[-1] is self.runs[-1]
+        entries = _merge_newest([run.scan() for run in runs], reverse=False)
+        if drop_tombstones:
+            entries = (entry for entry in entries if entry[1] is not TOMBSTONE)
+        merged = self._write_run(entries, sum(run.count for run in runs))
+        with self._lock:
+            start = self.runs.index(runs[0])
+            self.runs[start:start + len(runs)] = [merged] if merged else []
+            self._save_manifest()
+            self.stats['compactions'] += 1
+            for run in runs:
+                # Scans that started before the swap keep reading through the still-open descriptor
+                os.remove(run.path)
+                run.retired = True
+                if not run.readers:
+                    run.close()
+
+    def _write_run(self, entries, capacity):
+        with self._lock:
+            name = f"run-{self._next_run_id:08d}{RUN_SUFFIX}"
+            self._next_run_id += 1
+        path = os.path.join(self.storage_path, name)
+        return SortedRun.write(path, entries, capacity, self.io_stats, self.bloom_error_rate)
+
+    def _save_manifest(self):
+        temp_path = self.manifest_file + '.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump({'runs': [run.name for run in self.runs], 'next_run_id': self._next_run_id}, f)
+        os.replace(temp_path, self.manifest_file)
+
+    def _replay_wal(self):
+        if not os.path.exists(self.wal_path):
+            return
+        with open(self.wal_path, 'rb') as f:
+            data = f.read()
+        offset = 0
+        while offset + LENGTH.size <= len(data):
+            length, = LENGTH.unpack_from(data, offset)
+            end = offset + LENGTH.size + length
+            if end > len(data):
+                break
+            key, value = pickle.loads(data[offset + LENGTH.size:end])
+            self.memtable[key] = value
+            offset = end
+        if offset < len(data):
+            # Drop a record torn by a crash mid-write
+            with open(self.wal_path, 'r+b') as f:
+                f.truncate(offset)
+
+    def _remove_orphans(self, live):
+        # Runs written by a flush or compaction that crashed before updating the manifest
+        for name in os.listdir(self.storage_path):
+            if name.endswith(RUN_SUFFIX + '.tmp') or (name.endswith(RUN_SUFFIX) and name not in live):
+                os.remove(os.path.join(self.storage_path, name))
+
+
+def _tag(source, rank):
+    for key, value in source:
+        yield key, rank, value
+
+
+def _merge_newest(sources, reverse):
+    """Merges sorted sources, ordered newest first, keeping only the newest entry for each key."""
+    tagged = [_tag(source, rank) for rank, source in enumerate(sources)]
+    merged = heapq.merge(*tagged, key=itemgetter(0), reverse=reverse)
+    for key, group in groupby(merged, key=itemgetter(0)):
+        _, _, value = min(group, key=itemgetter(1))
+        yield key, value
@@ -0,0 +1,118 @@
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class QueryProfile:
+    """Timings and storage counters collected while executing one statement."""
+
+    def __init__(self):
+        self.statement = None
+        self.timings = defaultdict(float)
+        self.counters = Counter()
+        self.rows = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def to_dict(self):
+        result = {'statement': self.statement, 'rows': self.rows}
+        for name, seconds in self.timings.items():
+            result[f"{name}_ms"] = round(seconds * 1000, 3)
+        result.update(self.counters)
+        return result
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Cumulative counters, gauges and histograms rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.descriptions = {}
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.histograms = {}
+
+    def describe(self, name, metric_type, help_text):
+        self.descriptions[name] = (metric_type, help_text)
+
+    def inc(self, name, amount=1, /, **labels):
+        self.counters[(name, _label_key(labels))] += amount
+
+    def set_gauge(self, name, value, /, **labels):
+        self.gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, /, **labels):
+        key = (name, _label_key(labels))
+        if key not in self.histograms:
+            self.histograms[key] = Histogram()
+        self.histograms[key].observe(value)
+
+    def value(self, name, /, **labels):
+        key = (name, _label_key(labels))
+        if key in self.counters:
+            return self.counters[key]
+        return self.gauges.get(key)
+
+    def render(self):
+        series = defaultdict(list)
+        for (name, labels), value in self.counters.items():
+            series[name].append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), value in self.gauges.items():
+            series[name].append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), histogram in self.histograms.items():
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                bucket_labels = labels + (('le', _format_value(bound)),)
+                series[name].append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+            series[name].append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+            series[name].append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+            series[name].append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        lines = []
+        for name in sorted(series):
+            if name in self.descriptions:
+                metric_type, help_text = self.descriptions[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(series[name])
+        return "\n".join(lines) + "\n"
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
@@ -1,45 +1,281 @@
+import asyncio
+import heapq
+import mmap
 import os
 import pickle
+import struct
+from collections import Counter
+from page_codecs import pack_record, unpack_record
+
+FILE_MODE = 'file'
+MMAP_MODE = 'mmap'
+READ_MODES = (FILE_MODE, MMAP_MODE)
+
+SEGMENT_FILE = 'nodes.dat'
+# Segment record header: node id and payload length; a zero length marks a deleted node
+RECORD_HEADER = struct.Struct('<QI')
+# Rewrite the segment once superseded records make up most of it
+COMPACT_MIN_BYTES = 1 << 20
+COMPACT_GARBAGE_RATIO = 0.5
 
 class NodeManager:
-    def __init__(self, storage_path):
+    """Stores B-tree nodes on disk.
+
+    In 'file' mode every node is its own `<id>.node` file. In 'mmap' mode all nodes live in
+    one append-only segment file that is memory-mapped for reading, so loading a node is a
+    dictionary lookup plus unpickling straight out of the mapping.
+
+    When a `node_factory(record, node_id)` is given, nodes are stored as compact
+    (leaf, keys, children) records, which scans can read without building node objects.
+    With a `codec` (see page_codecs), records are additionally prefix-compressed and the
+    serialized bytes of every node are run through the codec.
+
+    `load_record_async` is the read path for code running on an asyncio event loop: in 'file'
+    mode the file is read in the loop's default executor, so the loop serves other tasks while
+    the read is pending. Mapped nodes are read in place, as that never waits on a system call.
+
+    With `read_only`, e.g. in the worker processes of a parallel scan, the storage is only
+    read: the segment is neither created nor truncated, and writes raise ValueError.
+    """
+
+    def __init__(self, storage_path, read_mode=FILE_MODE, node_factory=None, codec=None, read_only=False):
+        if read_mode not in READ_MODES:
+            raise ValueError(f"Unknown read mode {read_mode}.")
         self.storage_path = storage_path
-        os.makedirs(self.storage_path, exist_ok=True)
-        self.node_id_counter = self._get_initial_node_id()
+        self.read_mode = read_mode
+        self.node_factory = node_factory
+        self.codec = codec
+        self.read_only = read_only
+        if not read_only:
+            os.makedirs(self.storage_path, exist_ok=True)
+        # Cumulative I/O counters: node_loads, node_writes, node_deletes, bytes_read, bytes_written
+        self.stats = Counter()
+        if read_mode == MMAP_MODE:
+            self._open_segment()
+        existing_ids = self.node_ids()
+        self.node_id_counter = max(existing_ids) + 1 if existing_ids else 0
+        # Ids below the counter that no node uses, handed out again before new ones
+        self.free_ids = sorted(set(range(self.node_id_counter)) - existing_ids)
 
-    def _get_initial_node_id(self):
-        if not os.listdir(self.storage_path):
-            return 0
-        else:
-            existing_ids = [int(fname.split('.')[0]) for fname in os.listdir(self.storage_path) if fname.endswith('.node')]
-            return max(existing_ids) + 1 if existing_ids else 0
+    def node_ids(self):
+        """Returns the ids of all stored nodes, whether or not a tree still references them."""
+        if self.read_mode == MMAP_MODE:
+            return set(self._index)
+        names = (fname[:-len('.node')] for fname in os.listdir(self.storage_path) if fname.endswith('.node'))
+        return {int(name) for name in names if name.isdigit()}
 
     def save_node(self, node):
-        node_id = self.node_id_counter
+        if self.free_ids:
+            node_id = heapq.heappop(self.free_ids)
+        else:
+            node_id = self.node_id_counter
+            self.node_id_counter += 1
         node.node_id = node_id
-        filepath = os.path.join(self.storage_path, f"{node_id}.node")
-        with open(filepath, 'wb') as f:
-            pickle.dump(node, f)
-        self.node_id_counter += 1
+        self._write(node_id, node)
         return node_id
 
     def load_node(self, node_id):
-        filepath = os.path.join(self.storage_path, f"{node_id}.node")
-        if not os.path.exists(filepath):
-            raise FileNotFoundError(f"Node file {filepath} does not exist.")
-        with open(filepath, 'rb') as f:
-            node = pickle.load(f)
-        return node
+        obj = self._read(node_id)
+        if isinstance(obj, tuple):
+            return self.node_factory(obj, node_id)
+        return obj
+
+    def load_record(self, node_id):
+        """Returns the (leaf, keys, children) of a node without building a node object."""
+        obj = self._read(node_id)
+        if isinstance(obj, tuple):
+            return obj
+        return obj.leaf, obj.keys, obj.children
+
+    async def load_record_async(self, node_id):
+        """Awaitable form of `load_record` that does not block the event loop on file reads."""
+        if self.read_mode == MMAP_MODE:
+            return self.load_record(node_id)
+        data = await asyncio.get_running_loop().run_in_executor(None, self._read_file, node_id)
+        # Counters and decoding stay on the loop thread, like every other access to this manager
+        self.stats['node_loads'] += 1
+        self.stats['bytes_read'] += len(data)
+        obj = self._decode(data)
+        if isinstance(obj, tuple):
+            return obj
+        return obj.leaf, obj.keys, obj.children
 
     def update_node(self, node):
-        filepath = os.path.join(self.storage_path, f"{node.node_id}.node")
-        with open(filepath, 'wb') as f:
-            pickle.dump(node, f)
+        self._write(node.node_id, node)
 
     def delete_node(self, node_id):
-        """Deletes the node file from disk."""
-        filepath = os.path.join(self.storage_path, f"{node_id}.node")
+        """Deletes the node from disk and makes its id available for reuse."""
+        self._check_writable()
+        if self.read_mode == MMAP_MODE:
+            if node_id not in self._index:
+                raise FileNotFoundError(f"Node {node_id} does not exist in {self._segment_path}.")
+            self._append_record(node_id, b'')
+            self.stats['node_deletes'] += 1
+            heapq.heappush(self.free_ids, node_id)
+            return
+        filepath = self._node_path(node_id)
         if os.path.exists(filepath):
             os.remove(filepath)
+            self.stats['node_deletes'] += 1
+            heapq.heappush(self.free_ids, node_id)
+        else:
+            raise FileNotFoundError(f"Node file {filepath} does not exist.")
+
+    def sync(self):
+        """Flushes the segment's appended records to disk, e.g. before a root id that refers to them is saved.
+
+        In 'file' mode every node is written to its own file, which is not synced.
+        """
+        if self.read_mode == MMAP_MODE and not self.read_only and self._fd is not None:
+            os.fsync(self._fd)
+
+    def close(self):
+        if self.read_mode == MMAP_MODE and self._fd is not None:
+            self.sync()
+            self._unmap()
+            os.close(self._fd)
+            self._fd = None
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ValueError(f"Storage {self.storage_path} is open read-only.")
+
+    def _node_path(self, node_id):
+        return os.path.join(self.storage_path, f"{node_id}.node")
+
+    def _encode(self, node):
+        if self.node_factory is None:
+            data = pickle.dumps(node)
+        elif self.codec is None:
+            data = pickle.dumps((node.leaf, node.keys, node.children), protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            data = pickle.dumps(pack_record((node.leaf, node.keys, node.children)), protocol=pickle.HIGHEST_PROTOCOL)
+        return data if self.codec is None else self.codec.encode(data)
+
+    def _decode(self, data):
+        if self.codec is None:
+            return pickle.loads(data)
+        obj = pickle.loads(self.codec.decode(data))
+        return unpack_record(obj) if self.node_factory is not None else obj
+
+    def _write(self, node_id, node):
+        self._check_writable()
+        data = self._encode(node)
+        if self.read_mode == MMAP_MODE:
+            self._append_record(node_id, data)
         else:
+            with open(self._node_path(node_id), 'wb') as f:
+                f.write(data)
+        self.stats['node_writes'] += 1
+        self.stats['bytes_written'] += len(data)
+
+    def _read(self, node_id):
+        if self.read_mode == MMAP_MODE:
+            location = self._index.get(node_id)
+            if location is None:
+                raise FileNotFoundError(f"Node {node_id} does not exist in {self._segment_path}.")
+            offset, length = location
+            if self._map is None or offset + length > len(self._map):
+                self._remap()
+            self.stats['node_loads'] += 1
+            self.stats['bytes_read'] += length
+            with memoryview(self._map)[offset:offset + length] as view:
+                return self._decode(view)
+        data = self._read_file(node_id)
+        self.stats['node_loads'] += 1
+        self.stats['bytes_read'] += len(data)
+        return self._decode(data)
+
+    def _read_file(self, node_id):
+        filepath = self._node_path(node_id)
+        if not os.path.exists(filepath):
             raise FileNotFoundError(f"Node file {filepath} does not exist.")
+        with open(filepath, 'rb') as f:
+            return f.read()
+
+    # Segment file handling for mmap mode
+
+    def _open_segment(self):
+        self._segment_path = os.path.join(self.storage_path, SEGMENT_FILE)
+        if self.read_only:
+            self._fd = os.open(self._segment_path, os.O_RDONLY)
+        else:
+            self._fd = os.open(self._segment_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._map = None
+        self._index = {}
+        self._live_bytes = 0
+        self._end = 0
+        self._remap()
+        self._load_index()
+
+    def _load_index(self):
+        size = len(self._map) if self._map is not None else 0
+        offset = 0
+        while offset + RECORD_HEADER.size <= size:
+            node_id, length = RECORD_HEADER.unpack_from(self._map, offset)
+            payload = offset + RECORD_HEADER.size
+            if payload + length > size:
+                break
+            self._set_location(node_id, payload, length)
+            offset = payload + length
+        if offset < size and not self.read_only:
+            # Drop a record torn by a crash mid-write
+            self._unmap()
+            os.ftruncate(self._fd, offset)
+            self._remap()
+        self._end = offset
+
+    def _set_location(self, node_id, offset, length):
+        previous = self._index.pop(node_id, None)
+        if previous is not None:
+            self._live_bytes -= previous[1] + RECORD_HEADER.size
+        if length:
+            self._index[node_id] = (offset, length)
+            self._live_bytes += length + RECORD_HEADER.size
+
+    def _append_record(self, node_id, data):
+        record = memoryview(RECORD_HEADER.pack(node_id, len(data)) + data)
+        written = 0
+        while written < len(record):
+            # A write may store only part of the record; the rest goes after it
+            written += os.pwrite(self._fd, record[written:], self._end + written)
+        self._set_location(node_id, self._end + RECORD_HEADER.size, len(data))
+        self._end += RECORD_HEADER.size + len(data)
+        if self._end > COMPACT_MIN_BYTES and self._live_bytes < self._end * (1 - COMPACT_GARBAGE_RATIO):
+            self.compact()
+
+    def compact(self):
+        """Rewrites the segment with only the latest version of each live node."""
+        self._check_writable()
+        if self._map is None or self._end > len(self._map):
+            self._remap()
+        temp_path = self._segment_path + '.compact'
+        index = {}
+        offset = 0
+        with open(temp_path, 'wb') as f:
+            for node_id, (start, length) in sorted(self._index.items(), key=lambda item: item[1][0]):
+                f.write(RECORD_HEADER.pack(node_id, length))
+                f.write(self._map[start:start + length])
+                index[node_id] = (offset + RECORD_HEADER.size, length)
+                offset += RECORD_HEADER.size + length
+            f.flush()
+            os.fsync(f.fileno())
+        self._unmap()
+        os.close(self._fd)
+        os.replace(temp_path, self._segment_path)
+        self._fd = os.open(self._segment_path, os.O_RDWR)
+        self._index = index
+        self._live_bytes = offset
+        self._end = offset
+        self._remap()
+
+    def _remap(self):
+        self._unmap()
+        size = os.fstat(self._fd).st_size
+        if size:
+            self._map = mmap.mmap(self._fd, size, access=mmap.ACCESS_READ)
+
+    def _unmap(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
@@ -0,0 +1,87 @@
+import os
+import zlib
+from abc import ABC, abstractmethod
+
+NO_COMPRESSION = 'none'
+
+
+class Codec(ABC):
+    """Compresses the serialized bytes of one node. Subclasses set `name` and register themselves."""
+    name = None
+
+    @abstractmethod
+    def encode(self, data):
+        pass
+
+    @abstractmethod
+    def decode(self, data):
+        pass
+
+
+class ZlibCodec(Codec):
+    name = 'zlib'
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def encode(self, data):
+        return zlib.compress(data, self.level)
+
+    def decode(self, data):
+        return zlib.decompress(data)
+
+
+CODECS = {}
+
+
+def register_codec(codec_class):
+    CODECS[codec_class.name] = codec_class
+    return codec_class
+
+
+register_codec(ZlibCodec)
+
+
+def get_codec(name):
+    """Returns a codec instance for a table's `compression` option, or None for uncompressed pages."""
+    if name is None or name == NO_COMPRESSION:
+        return None
+    if name not in CODECS:
+        raise ValueError(f"Unknown compression {name}.")
+    return CODECS[name]()
+
+
+def codec_names():
+    return (NO_COMPRESSION,) + tuple(CODECS)
+
+
+def pack_record(record):
+    """Rewrites a (leaf, keys, children) node record into a denser form before compression.
+
+    String keys share their longest common prefix, which is stored once per node, and when
+    every row is a dict with the same columns the column names are stored once as well.
+    """
+    leaf, keys, children = record
+    key_values = [key for key, _ in keys]
+    rows = [row for _, row in keys]
+    prefix = None
+    if len(key_values) > 1 and all(isinstance(key, str) for key in key_values):
+        prefix = os.path.commonprefix(key_values)
+        key_values = [key[len(prefix):] for key in key_values]
+    columns = None
+    if rows and all(isinstance(row, dict) for row in rows):
+        columns = tuple(rows[0])
+        if all(tuple(row) == columns for row in rows):
+            rows = [tuple(row.values()) for row in rows]
+        else:
+            columns = None
+    return (leaf, children, prefix, key_values, columns, rows)
+
+
+def unpack_record(packed):
+    leaf, children, prefix, key_values, columns, rows = packed
+    if prefix is not None:
+        key_values = [prefix + key for key in key_values]
+    if columns is not None:
+        rows = [dict(zip(columns, values)) for values in rows]
+    return leaf, list(zip(key_values, rows)), children
@@ -0,0 +1,163 @@
+import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from btree import BTreeNode, scan_subtree
+from node_manager import NodeManager, MMAP_MODE, SEGMENT_FILE
+from page_codecs import get_codec
+from planner import matches
+
+# Subtrees handed out per worker, so that uneven subtrees still keep every worker busy
+PIECES_PER_WORKER = 4
+
+
+class ParallelScanner:
+    """Runs B-tree range scans and aggregates across a pool of worker processes.
+
+    The scan range is split into subtrees of the root (see `BTree.split_range`); each worker
+    opens the tree's storage read-only, filters the rows of its subtree and returns them, or
+    just its partial aggregates. Results are merged in key order. Scans keep only one subtree
+    per worker submitted ahead of the rows being read, so a scan that stops early leaves the
+    rest of the tree unread. The pool is started on first use.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = None
+
+    def scan(self, btree, low=None, high=None, low_inclusive=True, high_inclusive=True, reverse=False,
+             where_clause=None, where_value=None, columns=None):
+        """Returns an iterator over the matching rows of the range in key order, holding only
+        `columns` if given. Subtrees are submitted as the rows are read.
+        """
+        # The root stays pinned until the rows are read, so a vacuum keeps the nodes the workers read
+        root_id = btree.pin()
+        try:
+            parts = btree.split_range(self.workers * PIECES_PER_WORKER, low, high, low_inclusive, high_inclusive)
+            if reverse:
+                parts.reverse()
+            bounds = (low, high, low_inclusive, high_inclusive, reverse)
+            results = self._submit(btree, parts, bounds, where_clause, where_value, columns, None, self.workers)
+        except BaseException:
+            btree.unpin(root_id)
+            raise
+        return self._rows(btree, root_id, parts, results, where_clause, where_value, columns)
+
+    def aggregate(self, btrees, aggregator, low=None, high=None, low_inclusive=True, high_inclusive=True,
+                  where_clause=None, where_value=None):
+        """Adds the matching rows of the range in each of `btrees` to `aggregator`, aggregating
+        every subtree in a worker.
+        """
+        bounds = (low, high, low_inclusive, high_inclusive, False)
+        pending = []
+        pins = [(btree, btree.pin()) for btree in btrees]
+        try:
+            for btree in btrees:
+                parts = btree.split_range(self.workers * PIECES_PER_WORKER, low, high, low_inclusive, high_inclusive)
+                pending.append((parts, self._submit(btree, parts, bounds, where_clause, where_value, None, aggregator)))
+            for parts, results in pending:
+                for partial in results:
+                    aggregator.merge(partial)
+                for kind, value in parts:
+                    if kind == 'item' and matches(value[1], where_clause, where_value):
+                        aggregator.add(value[1])
+        finally:
+            for btree, root_id in pins:
+                btree.unpin(root_id)
+        return aggregator
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _rows(self, btree, root_id, parts, results, where_clause, where_value, columns):
+        try:
+            for kind, value in parts:
+                if kind == 'subtree':
+                    yield from next(results)
+                elif matches(value[1], where_clause, where_value):
+                    yield _project(value[1], columns)
+        finally:
+            btree.unpin(root_id)
+
+    def _submit(self, btree, parts, bounds, where_clause, where_value, columns, aggregator, ahead=None):
+        """Returns an iterator over the results of the subtrees in `parts`, in order.
+
+        With `ahead`, at most that many subtrees are submitted before their results are read;
+        otherwise all of them are submitted right away.
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        source = _source(btree)
+        futures = (
+            self._executor.submit(
+                _scan_part, source, value, bounds, where_clause, where_value, columns,
+                None if aggregator is None else aggregator.empty(),
+            )
+            for kind, value in parts if kind == 'subtree'
+        )
+        if ahead is None:
+            futures = list(futures)
+            ahead = len(futures)
+        return self._results(btree, iter(futures), ahead)
+
+    def _results(self, btree, futures, ahead):
+        pending = deque(islice(futures, ahead))
+        try:
+            while pending:
+                result, io_stats = pending.popleft().result()
+                pending.extend(islice(futures, 1))
+                # Worker reads count towards the table's own I/O counters
+                btree.io_stats.update(io_stats)
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _source(btree):
+    """Describes a tree's storage for the workers; the segment size changes with every write."""
+    manager = btree.node_manager
+    version = None
+    if manager.read_mode == MMAP_MODE:
+        version = os.path.getsize(os.path.join(manager.storage_path, SEGMENT_FILE))
+    return manager.storage_path, manager.read_mode, manager.codec.name if manager.codec else None, version
+
+
+# Storage opened by this worker process, reused while the tree is unchanged
+_open_storage = {}
+
+
+def _node_manager(source):
+    storage_path, read_mode, codec_name, version = source
+    cached = _open_storage.get(storage_path)
+    if cached is not None and cached[0] == source:
+        return cached[1]
+    if cached is not None:
+        cached[1].close()
+    manager = NodeManager(
+        storage_path, read_mode=read_mode, node_factory=lambda record, node_id: BTreeNode.from_record(0, record, node_id),
+        codec=get_codec(codec_name), read_only=True,
+    )
+    _open_storage[storage_path] = (source, manager)
+    return manager
+
+
+def _scan_part(source, node_id, bounds, where_clause, where_value, columns, aggregator):
+    manager = _node_manager(source)
+    io_before = Counter(manager.stats)
+    low, high, low_inclusive, high_inclusive, reverse = bounds
+    items = scan_subtree(
+        manager.load_record, manager.load_record(node_id), low, high, low_inclusive, high_inclusive, reverse
+    )
+    rows = (row for _, row in items if matches(row, where_clause, where_value))
+    if aggregator is not None:
+        result = aggregator.extend(rows)
+    else:
+        result = [_project(row, columns) for row in rows]
+    return result, Counter(manager.stats) - io_before
+
+
+def _project(row, columns):
+    return row if columns is None else {column: row[column] for column in columns}
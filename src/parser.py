@@ -1,13 +1,24 @@
+import threading
 import ply.yacc as yacc
 from lexer import tokens  # Import tokens from lexer
 from ast_nodes import (
     CreateTableStatement,
+    CreateViewStatement,
+    CreateIndexStatement,
+    AlterTableStatement,
     InsertStatement,
     SelectStatement,
     UpdateStatement,
     DeleteStatement,
+    AnalyzeStatement,
+    VacuumStatement,
+    ExplainStatement,
     WhereClause,
     SetClause,
+    OrderByClause,
+    Aggregate,
+    PartitionClause,
+    PartitionDefinition,
 )
 
 # TODO: Precedence rules
@@ -15,15 +26,88 @@ precedence = ()
 
 def p_statement(p):
     '''statement : create_table_statement
+                 | create_view_statement
+                 | create_index_statement
+                 | alter_table_statement
                  | insert_statement
                  | select_statement
                  | update_statement
-                 | delete_statement'''
+                 | delete_statement
+                 | analyze_statement
+                 | vacuum_statement
+                 | explain_statement'''
     p[0] = p[1]
 
 def p_create_table_statement(p):
-    'create_table_statement : CREATE TABLE IDENTIFIER LPAREN column_list RPAREN'
-    p[0] = CreateTableStatement(table_name=p[3], columns=p[5])
+    'create_table_statement : CREATE TABLE IDENTIFIER LPAREN column_list RPAREN engine_clause partition_clause table_options'
+    p[0] = CreateTableStatement(table_name=p[3], columns=p[5], options={**p[7], **p[9]}, partition_by=p[8])
+
+def p_create_view_statement(p):
+    'create_view_statement : CREATE MATERIALIZED VIEW IDENTIFIER AS select_statement'
+    select_sql = p.lexer.lexdata[p.lexpos(5) + len(p[5]):].strip()
+    p[0] = CreateViewStatement(view_name=p[4], select=p[6], select_sql=select_sql)
+
+def p_partition_clause(p):
+    '''partition_clause : PARTITION BY IDENTIFIER LPAREN IDENTIFIER RPAREN LPAREN partition_list RPAREN
+                        | PARTITION BY IDENTIFIER LPAREN IDENTIFIER RPAREN PARTITIONS NUMBER
+                        | empty'''
+    if len(p) == 10:
+        p[0] = PartitionClause(method=p[3].lower(), column=p[5], partitions=p[8])
+    elif len(p) == 9:
+        p[0] = PartitionClause(method=p[3].lower(), column=p[5], count=p[8])
+    else:
+        p[0] = None
+
+def p_partition_list(p):
+    '''partition_list : partition_list COMMA partition_definition
+                      | partition_definition'''
+    if len(p) == 4:
+        p[0] = p[1] + [p[3]]
+    else:
+        p[0] = [p[1]]
+
+def p_partition_definition(p):
+    'partition_definition : PARTITION IDENTIFIER VALUES LESS THAN LPAREN value RPAREN'
+    p[0] = PartitionDefinition(name=p[2], bound=p[7])
+
+def p_alter_table_statement(p):
+    '''alter_table_statement : ALTER TABLE IDENTIFIER ADD partition_definition
+                             | ALTER TABLE IDENTIFIER DROP PARTITION IDENTIFIER'''
+    if len(p) == 6:
+        p[0] = AlterTableStatement(table_name=p[3], add_partition=p[5])
+    else:
+        p[0] = AlterTableStatement(table_name=p[3], drop_partition=p[6])
+
+def p_engine_clause(p):
+    '''engine_clause : ENGINE EQ IDENTIFIER
+                     | empty'''
+    p[0] = {'engine': p[3].lower()} if len(p) == 4 else {}
+
+def p_create_index_statement(p):
+    'create_index_statement : CREATE INDEX IDENTIFIER ON IDENTIFIER LPAREN IDENTIFIER RPAREN index_type'
+    p[0] = CreateIndexStatement(index_name=p[3], table_name=p[5], column=p[7], index_type=p[9])
+
+def p_index_type(p):
+    '''index_type : USING IDENTIFIER
+                  | empty'''
+    p[0] = p[2].lower() if len(p) == 3 else 'hash'
+
+def p_table_options(p):
+    '''table_options : WITH LPAREN option_list RPAREN
+                     | empty'''
+    p[0] = p[3] if len(p) == 5 else {}
+
+def p_option_list(p):
+    '''option_list : option_list COMMA option
+                   | option'''
+    if len(p) == 4:
+        p[0] = {**p[1], **p[3]}
+    else:
+        p[0] = p[1]
+
+def p_option(p):
+    'option : IDENTIFIER EQ value'
+    p[0] = {p[1].lower(): p[3]}
 
 def p_column_list(p):
     '''column_list : column_list COMMA IDENTIFIER
@@ -51,12 +135,19 @@ def p_value(p):
     p[0] = p[1]
 
 def p_select_statement(p):
-    'select_statement : SELECT select_list FROM IDENTIFIER'
-    p[0] = SelectStatement(columns=p[2], table_name=p[4])
+    'select_statement : SELECT select_list FROM IDENTIFIER optional_where_clause group_by_clause order_by_clause limit_clause'
+    p[0] = SelectStatement(
+        columns=p[2], table_name=p[4], where_clause=p[5], group_by=p[6], order_by=p[7], limit=p[8]
+    )
+
+def p_optional_where_clause(p):
+    '''optional_where_clause : where_clause
+                             | empty'''
+    p[0] = p[1]
 
 def p_select_list(p):
-    '''select_list : select_list COMMA IDENTIFIER
-                   | IDENTIFIER
+    '''select_list : select_list COMMA select_item
+                   | select_item
                    | TIMES'''
     if len(p) == 4:
         p[0] = p[1] + [p[3]]
@@ -65,6 +156,43 @@ def p_select_list(p):
     else:
         p[0] = [p[1]]
 
+def p_select_item(p):
+    '''select_item : IDENTIFIER
+                   | IDENTIFIER LPAREN IDENTIFIER RPAREN
+                   | IDENTIFIER LPAREN TIMES RPAREN'''
+    if len(p) == 5:
+        # Function names are checked against the supported aggregates when the query runs
+        p[0] = Aggregate(function=p[1].lower(), column=p[3])
+    else:
+        p[0] = p[1]
+
+def p_group_by_clause(p):
+    '''group_by_clause : GROUP BY column_list
+                       | empty'''
+    p[0] = p[3] if len(p) == 4 else None
+
+def p_order_by_clause(p):
+    '''order_by_clause : ORDER BY IDENTIFIER sort_direction
+                       | empty'''
+    if len(p) == 5:
+        p[0] = OrderByClause(column=p[3], descending=p[4])
+    else:
+        p[0] = None
+
+def p_sort_direction(p):
+    '''sort_direction : ASC
+                      | DESC
+                      | empty'''
+    p[0] = p[1] is not None and p[1].lower() == 'desc'
+
+def p_limit_clause(p):
+    '''limit_clause : LIMIT NUMBER
+                    | empty'''
+    if len(p) == 3:
+        p[0] = p[2]
+    else:
+        p[0] = None
+
 def p_update_statement(p):
     'update_statement : UPDATE IDENTIFIER SET set_clause where_clause'
     p[0] = UpdateStatement(table_name=p[2], set_clause=p[4], where_clause=p[5])
@@ -78,8 +206,37 @@ def p_delete_statement(p):
     p[0] = DeleteStatement(table_name=p[3], where_clause=p[4])
 
 def p_where_clause(p):
-    'where_clause : WHERE IDENTIFIER EQ value'
-    p[0] = WhereClause(column=p[2], value=p[4])
+    'where_clause : WHERE IDENTIFIER comparison value'
+    p[0] = WhereClause(column=p[2], value=p[4], operator=p[3])
+
+def p_comparison(p):
+    '''comparison : EQ
+                  | NE
+                  | LT
+                  | LE
+                  | GT
+                  | GE'''
+    p[0] = '!=' if p[1] == '<>' else p[1]
+
+def p_analyze_statement(p):
+    'analyze_statement : ANALYZE IDENTIFIER'
+    p[0] = AnalyzeStatement(table_name=p[2])
+
+def p_vacuum_statement(p):
+    'vacuum_statement : VACUUM IDENTIFIER'
+    p[0] = VacuumStatement(table_name=p[2])
+
+def p_explain_statement(p):
+    '''explain_statement : EXPLAIN select_statement
+                         | EXPLAIN ANALYZE select_statement'''
+    if len(p) == 4:
+        p[0] = ExplainStatement(statement=p[3], analyze=True)
+    else:
+        p[0] = ExplainStatement(statement=p[2])
+
+def p_empty(p):
+    'empty :'
+    p[0] = None
 
 def p_error(p):
     if p:
@@ -88,3 +245,10 @@ def p_error(p):
         raise SyntaxError("Syntax error at EOF")
 
 parser = yacc.yacc()
+# The parser and lexer keep their state on the module-level objects
+_parse_lock = threading.Lock()
+
+def parse(query):
+    """Parses one statement; safe to call from several threads at once."""
+    with _parse_lock:
+        return parser.parse(query)
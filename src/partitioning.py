@@ -0,0 +1,191 @@
+import heapq
+from collections import Counter
+from itertools import chain
+from operator import itemgetter
+from bloom import key_digest
+
+RANGE_PARTITIONING = 'range'
+HASH_PARTITIONING = 'hash'
+PARTITION_METHODS = (RANGE_PARTITIONING, HASH_PARTITIONING)
+
+
+def hash_partition(value, count):
+    """Returns the number of the hash partition holding `value`; stable across processes."""
+    return key_digest(value) % count
+
+
+class PartitionedTable:
+    """A table split by the value of one column into partitions, each stored in its own BTree.
+
+    `partitioning` is the catalog entry: the method, the column and the partitions, each with
+    a name, an id never reused within the table, a storage path and, for range partitioning,
+    the exclusive upper bound of its values (partitions are kept in bound order). Lookups and
+    scans touch only the partitions that can hold matching rows; range scans of several
+    partitions are merged in key order.
+
+    When the partition column is not the key, the entry also has a `key_map` storage entry: a
+    BTree mapping each key to the id of the partition holding its row, so key lookups and
+    writes touch one partition instead of all of them. Entries of a dropped partition's rows
+    are left in place and read as missing; `vacuum` removes them.
+    """
+
+    def __init__(self, partitioning, key_column, open_partition):
+        self.method = partitioning['method']
+        self.column = partitioning['column']
+        self.partitions = partitioning['partitions']
+        self.key_column = key_column
+        self.trees = [open_partition(partition) for partition in self.partitions]
+        self.key_map = None
+        if self.column != key_column:
+            self.key_map = open_partition(partitioning['key_map'])
+
+    @property
+    def stats(self):
+        return sum((tree.stats for tree in self._storages()), Counter())
+
+    @property
+    def io_stats(self):
+        return sum((tree.io_stats for tree in self._storages()), Counter())
+
+    def tree_for(self, value):
+        """Returns the tree of the partition that holds rows whose partition column is `value`."""
+        if self.method == HASH_PARTITIONING:
+            return self.trees[hash_partition(value, len(self.trees))]
+        for partition, tree in zip(self.partitions, self.trees):
+            try:
+                if value < partition['bound']:
+                    return tree
+            except TypeError:
+                break
+        raise ValueError(f"No partition holds {self.column} = {value!r}.")
+
+    def insert(self, key, value):
+        tree = self.tree_for(value[self.column])
+        if self.key_map is not None:
+            # The row may have moved out of another partition, e.g. when its partition column is updated
+            partition_id = self.partitions[self.trees.index(tree)]['id']
+            if self.key_map.search(key) != partition_id:
+                for other in self._trees_for_key(key):
+                    other.delete(key)
+                self.key_map.insert(key, partition_id)
+        tree.insert(key, value)
+
+    def delete(self, key):
+        for tree in self._trees_for_key(key):
+            if tree.search(key) is not None:
+                tree.delete(key)
+        if self.key_map is not None:
+            self.key_map.delete(key)
+
+    def search(self, key):
+        for tree in self._trees_for_key(key):
+            value = tree.search(key)
+            if value is not None:
+                return value
+        return None
+
+    def iter_items(self, reverse=False):
+        return self.iter_range(reverse=reverse)
+
+    def iter_range(self, low=None, high=None, low_inclusive=True, high_inclusive=True, reverse=False):
+        trees = self.trees
+        if self.column == self.key_column:
+            trees = self._prune_range(low, high, low_inclusive, high_inclusive)
+        scans = [tree.iter_range(low, high, low_inclusive, high_inclusive, reverse) for tree in trees]
+        return self.merge(scans, itemgetter(0), reverse)
+
+    def merge(self, scans, key, reverse=False):
+        """Generator combining per-partition scans, each already in key order, into one scan in
+        key order. Closing it closes the partition scans.
+        """
+        try:
+            if self.method == RANGE_PARTITIONING and self.column == self.key_column:
+                # Range partitions on the key hold disjoint, ordered key ranges
+                yield from chain.from_iterable(reversed(scans) if reverse else scans)
+            else:
+                yield from heapq.merge(*scans, key=key, reverse=reverse)
+        finally:
+            for scan in scans:
+                scan.close()
+
+    def prune(self, where_clause, where_value):
+        """Returns the trees of the partitions that may hold rows matching the WHERE predicate."""
+        if where_clause is None or where_clause.column != self.column:
+            return list(self.trees)
+        operator = where_clause.operator
+        if self.method == HASH_PARTITIONING:
+            return [self.tree_for(where_value)] if operator == '=' else list(self.trees)
+        low = high = None
+        low_inclusive = high_inclusive = True
+        if operator in ('=', '>', '>='):
+            low, low_inclusive = where_value, operator != '>'
+        if operator in ('=', '<', '<='):
+            high, high_inclusive = where_value, operator != '<'
+        return self._prune_range(low, high, low_inclusive, high_inclusive)
+
+    def block_count(self):
+        return sum(len(tree.node_manager.node_ids()) for tree in self.trees)
+
+    def lookup_cost(self):
+        return max((_height(tree) for tree in self.trees), default=1)
+
+    def vacuum(self):
+        """Vacuums every partition and the key map, first dropping the key map entries of rows
+        whose partition was dropped.
+        """
+        summaries = [tree.vacuum() for tree in self.trees]
+        if self.key_map is not None:
+            live = {partition['id'] for partition in self.partitions}
+            dropped = [key for key, partition_id in self.key_map.iter_items() if partition_id not in live]
+            for key in dropped:
+                self.key_map.delete(key)
+            self.key_map.vacuum()
+        total = {name: sum(summary[name] for summary in summaries) for name in
+                 ('rows', 'nodes_before', 'nodes_after', 'orphans_removed')}
+        total['height'] = max((summary['height'] for summary in summaries), default=1)
+        return total
+
+    def close(self):
+        for tree in self._storages():
+            tree.close()
+
+    def _storages(self):
+        return self.trees if self.key_map is None else self.trees + [self.key_map]
+
+    def _trees_for_key(self, key):
+        if self.key_map is None:
+            try:
+                return [self.tree_for(key)]
+            except ValueError:
+                return []
+        partition_id = self.key_map.search(key)
+        return [tree for partition, tree in zip(self.partitions, self.trees) if partition['id'] == partition_id]
+
+    def _prune_range(self, low, high, low_inclusive, high_inclusive):
+        if self.method != RANGE_PARTITIONING:
+            return list(self.trees)
+        trees = []
+        lower_bound = None
+        for partition, tree in zip(self.partitions, self.trees):
+            # The partition holds the values from the previous bound up to (excluding) its own
+            upper_bound = partition['bound']
+            try:
+                below = low is not None and upper_bound <= low
+                above = high is not None and lower_bound is not None and (
+                    lower_bound > high or (lower_bound == high and not high_inclusive)
+                )
+            except TypeError:
+                below = above = False
+            if not below and not above:
+                trees.append(tree)
+            lower_bound = upper_bound
+        return trees
+
+
+def _height(tree):
+    height = 1
+    leaf, _, children = tree.node_manager.load_record(tree.root_id)
+    while not leaf:
+        height += 1
+        leaf, _, children = tree.node_manager.load_record(children[0])
+    return height
@@ -0,0 +1,122 @@
+import math
+import operator as op
+from table_stats import range_selectivity
+
+FULL_SCAN = 'full scan'
+KEY_LOOKUP = 'key lookup'
+KEY_RANGE_SCAN = 'key range scan'
+INDEX_LOOKUP = 'index lookup'
+
+# Assumptions used for tables that have not been analyzed yet
+DEFAULT_ROW_COUNT = 1000
+DEFAULT_EQ_SELECTIVITY = 0.01
+DEFAULT_RANGE_SELECTIVITY = 1 / 3
+# Cost of evaluating the predicate on one row, relative to loading one node
+ROW_CPU_COST = 0.01
+
+COMPARISONS = {
+    '=': op.eq,
+    '!=': op.ne,
+    '<': op.lt,
+    '<=': op.le,
+    '>': op.gt,
+    '>=': op.ge,
+}
+
+
+def matches(record, where_clause, value):
+    """Evaluates a parsed WHERE predicate against a row, with `value` already parsed."""
+    if where_clause is None:
+        return True
+    return COMPARISONS[where_clause.operator](record[where_clause.column], value)
+
+
+class AccessPath:
+    def __init__(self, method, estimated_rows, estimated_cost, low=None, high=None,
+                 low_inclusive=True, high_inclusive=True, index=None):
+        self.method = method
+        self.estimated_rows = estimated_rows
+        self.estimated_cost = estimated_cost
+        self.low = low
+        self.high = high
+        self.low_inclusive = low_inclusive
+        self.high_inclusive = high_inclusive
+        self.index = index  # Catalog entry of the secondary index used by an index lookup
+
+    @property
+    def label(self):
+        return self.method if self.index is None else f"{self.method} using {self.index['name']}"
+
+    def __str__(self):
+        return f"{self.label} (rows={self.estimated_rows}, cost={self.estimated_cost:.2f})"
+
+
+class Planner:
+    """Picks the cheapest access path for a single-table predicate.
+
+    Costs are measured in node loads: a full scan reads every node, a key lookup reads one
+    node per level and a key range scan descends once and then reads the qualifying leaves.
+    A hash index lookup reads one bucket and then looks up each matching row by key.
+    """
+
+    def __init__(self, table, default_degree=3):
+        self.columns = table['columns']
+        self.indexes = table.get('indexes', {})
+        # Hash tables answer key lookups from one bucket but keep no key order to range-scan
+        self.hashed = table.get('engine') == 'hash'
+        degree = table.get('t', default_degree)
+        self.stats = table.get('statistics')
+        if self.stats:
+            self.row_count = self.stats['row_count']
+            self.node_count = max(1, self.stats['node_count'])
+            self.height = self.stats['height']
+        else:
+            self.row_count = DEFAULT_ROW_COUNT
+            keys_per_node = max(1, int((2 * degree - 1) * 0.75))
+            self.node_count = max(1, math.ceil(self.row_count / keys_per_node))
+            self.height = max(1, math.ceil(math.log(self.node_count, keys_per_node + 1)) + 1)
+        if self.hashed:
+            self.height = 1
+
+    def candidates(self, where_clause, value):
+        selectivity = self.selectivity(where_clause, value)
+        rows = max(0, round(self.row_count * selectivity))
+        paths = [AccessPath(FULL_SCAN, rows, self.node_count + ROW_CPU_COST * self.row_count)]
+        if where_clause is None:
+            return paths
+        operator = where_clause.operator
+        if where_clause.column != self.columns[0]:
+            for index in self.indexes.values():
+                if operator == '=' and index['column'] == where_clause.column:
+                    cost = 1 + rows * self.height + ROW_CPU_COST * rows
+                    paths.append(AccessPath(INDEX_LOOKUP, rows, cost, low=value, high=value, index=index))
+            return paths
+        if operator == '=':
+            paths.append(AccessPath(KEY_LOOKUP, min(rows, 1), float(self.height), low=value, high=value))
+        elif operator in ('<', '<=') and not self.hashed:
+            paths.append(self._range_path(rows, selectivity, high=value, high_inclusive=(operator == '<=')))
+        elif operator in ('>', '>=') and not self.hashed:
+            paths.append(self._range_path(rows, selectivity, low=value, low_inclusive=(operator == '>=')))
+        return paths
+
+    def plan(self, where_clause, value):
+        return min(self.candidates(where_clause, value), key=lambda path: path.estimated_cost)
+
+    def _range_path(self, rows, selectivity, **bounds):
+        cost = self.height + selectivity * self.node_count + ROW_CPU_COST * rows
+        return AccessPath(KEY_RANGE_SCAN, rows, cost, **bounds)
+
+    def selectivity(self, where_clause, value):
+        if where_clause is None:
+            return 1.0
+        column_stats = (self.stats or {}).get('columns', {}).get(where_clause.column, {})
+        distinct = column_stats.get('distinct')
+        eq = 1 / distinct if distinct else DEFAULT_EQ_SELECTIVITY
+        if where_clause.column == self.columns[0] and not self.stats:
+            eq = 1 / self.row_count
+        if where_clause.operator == '=':
+            return eq
+        if where_clause.operator == '!=':
+            return 1 - eq
+        estimate = range_selectivity(column_stats, where_clause.operator, value) if column_stats else None
+        return DEFAULT_RANGE_SELECTIVITY if estimate is None else estimate
@@ -0,0 +1,250 @@
+import os
+import pickle
+import struct
+import threading
+import time
+import requests
+
+CHANGE_LOG_FILE = 'changes.log'
+COMMIT_FILE = 'changes.commit'
+REPLICA_STATE_FILE = 'replica.pkl'
+LENGTH = struct.Struct('<I')
+COMMITTED_LSN = struct.Struct('<Q')
+DEFAULT_POLL_INTERVAL = 0.2
+DEFAULT_BATCH_SIZE = 500
+REQUEST_TIMEOUT = 10
+
+
+class ChangeLog:
+    """Append-only log of the write statements a primary has executed, in execution order.
+
+    Every change is stored as (lsn, commit time, statement), where the log sequence number
+    (LSN) counts changes from 1. Replicas ask for the changes after the last LSN they applied.
+    A primary `write`s each statement durably before running it and then either `commit`s it,
+    which makes it visible to replicas, or `discard`s it if the statement failed. The last
+    committed LSN is kept in its own file, so after a crash `uncommitted` returns the change
+    that was written but neither committed nor discarded.
+    """
+
+    def __init__(self, data_dir):
+        self.path = os.path.join(data_dir, CHANGE_LOG_FILE)
+        self.commit_path = os.path.join(data_dir, COMMIT_FILE)
+        self.offsets = []  # File offset of each change; LSN n is at offsets[n - 1]
+        self._lock = threading.Lock()
+        self._end = self._load()
+        self.committed = min(self._load_committed(), len(self.offsets))  # Changes visible to `read`
+        self._file = open(self.path, 'ab')
+        self._commit_fd = os.open(self.commit_path, os.O_RDWR | os.O_CREAT)
+        self._save_committed()
+
+    @property
+    def last_lsn(self):
+        return self.committed
+
+    def append(self, statement):
+        """Writes and commits a change; returns its LSN."""
+        lsn = self.write(statement)
+        self.commit(lsn)
+        return lsn
+
+    def write(self, statement):
+        """Writes a change and syncs it to disk, without making it visible; returns its LSN."""
+        with self._lock:
+            lsn = len(self.offsets) + 1
+            data = pickle.dumps((lsn, time.time(), statement), protocol=pickle.HIGHEST_PROTOCOL)
+            self._file.write(LENGTH.pack(len(data)) + data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.offsets.append(self._end)
+            self._end += LENGTH.size + len(data)
+            return lsn
+
+    def commit(self, lsn):
+        with self._lock:
+            self.committed = max(self.committed, lsn)
+            self._save_committed()
+
+    def discard(self, lsn):
+        """Removes the last change, written by `write` but not committed."""
+        with self._lock:
+            if lsn != len(self.offsets) or lsn <= self.committed:
+                raise ValueError(f"Only the last uncommitted change can be discarded, not LSN {lsn}.")
+            self._end = self.offsets.pop()
+            self._file.truncate(self._end)
+            os.fsync(self._file.fileno())
+
+    def read(self, after=0, limit=DEFAULT_BATCH_SIZE):
+        """Returns up to `limit` committed changes with an LSN greater than `after`."""
+        with self._lock:
+            span = self._span(after, min(self.committed, max(0, after) + limit))
+        return self._read(*span)
+
+    def uncommitted(self):
+        """Returns the changes written but neither committed nor discarded."""
+        with self._lock:
+            span = self._span(self.committed, len(self.offsets))
+        return self._read(*span)
+
+    def _span(self, after, last):
+        """Returns the file offsets of the changes with an LSN greater than `after` and up to `last`."""
+        if after >= last:
+            return 0, 0
+        start = self.offsets[max(0, after)]
+        return start, self.offsets[last] if last < len(self.offsets) else self._end
+
+    def _read(self, start, end):
+        if start == end:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        changes = []
+        offset = 0
+        while offset < len(data):
+            length, = LENGTH.unpack_from(data, offset)
+            changes.append(pickle.loads(data[offset + LENGTH.size:offset + LENGTH.size + length]))
+            offset += LENGTH.size + length
+        return changes
+
+    def close(self):
+        self._file.close()
+        os.close(self._commit_fd)
+
+    def _save_committed(self):
+        os.pwrite(self._commit_fd, COMMITTED_LSN.pack(self.committed), 0)
+        os.fsync(self._commit_fd)
+
+    def _load_committed(self):
+        if not os.path.exists(self.commit_path):
+            # A log written before commits were recorded holds only committed changes
+            return len(self.offsets)
+        with open(self.commit_path, 'rb') as f:
+            data = f.read(COMMITTED_LSN.size)
+        return COMMITTED_LSN.unpack(data)[0] if len(data) == COMMITTED_LSN.size else 0
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        offset = 0
+        while offset + LENGTH.size <= len(data):
+            length, = LENGTH.unpack_from(data, offset)
+            if offset + LENGTH.size + length > len(data):
+                break
+            self.offsets.append(offset)
+            offset += LENGTH.size + length
+        if offset < len(data):
+            # Drop a change torn by a crash mid-write
+            with open(self.path, 'r+b') as f:
+                f.truncate(offset)
+        return offset
+
+
+class Replica:
+    """Keeps a read-only Database in step with a primary by tailing the primary's change log.
+
+    The changes are fetched from the primary's `/changes` endpoint and applied in LSN order;
+    the last applied LSN is saved after every change, so a restarted replica resumes where it
+    stopped. A replica starts from an empty data directory (or a copy of the primary's data
+    directory together with its replica state), as it can only replay what the log holds.
+
+    The primary only logs statements that succeeded, so a change that fails here means the
+    replica no longer matches the primary: replication stops and `status` reports the error.
+    The one exception is the first change after a restart, which may have been applied just
+    before a crash without its LSN being saved; it is skipped if it fails as already applied.
+    """
+
+    def __init__(self, db, primary_url, poll_interval=DEFAULT_POLL_INTERVAL, batch_size=DEFAULT_BATCH_SIZE):
+        self.db = db
+        self.primary_url = primary_url.rstrip('/')
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.state_file = os.path.join(db.data_dir, REPLICA_STATE_FILE)
+        self.applied_lsn = 0
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'rb') as f:
+                self.applied_lsn = pickle.load(f)['applied_lsn']
+        self.primary_lsn = self.applied_lsn
+        # The only change that can have been applied without being recorded as applied
+        self._replayed_lsn = self.applied_lsn + 1
+        self.diverged = None  # Error of the change that failed to apply; nothing is applied after it
+        self.applied_commit_time = None  # Primary commit time of the last applied change
+        self.last_contact = None
+        self.last_error = None
+        self._session = requests.Session()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='simpldb-replica', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._session.close()
+
+    def poll(self):
+        """Fetches and applies one batch of changes; returns the number applied."""
+        if self.diverged is not None:
+            return 0
+        response = self._session.get(
+            f"{self.primary_url}/changes",
+            params={'after': self.applied_lsn, 'limit': self.batch_size},
+            timeout=REQUEST_TIMEOUT,
+        )
+        response.raise_for_status()
+        body = response.json()
+        self.last_contact = time.time()
+        self.primary_lsn = body['last_lsn']
+        applied = 0
+        for lsn, committed_at, statement in body['changes']:
+            try:
+                self.db.apply_change(statement)
+            except ValueError as e:
+                self.last_error = f"LSN {lsn}: {e}"
+                if lsn != self._replayed_lsn:
+                    self.diverged = self.last_error
+                    break
+            self.applied_lsn = lsn
+            self.applied_commit_time = committed_at
+            self._save_state()
+            applied += 1
+        return applied
+
+    def status(self):
+        """Returns the replication position and lag of this replica."""
+        lag_changes = max(0, self.primary_lsn - self.applied_lsn)
+        lag_seconds = 0.0
+        if lag_changes and self.applied_commit_time is not None:
+            lag_seconds = max(0.0, time.time() - self.applied_commit_time)
+        elif lag_changes and self.last_contact is not None:
+            lag_seconds = time.time() - self.last_contact
+        return {
+            'primary_url': self.primary_url,
+            'primary_lsn': self.primary_lsn,
+            'applied_lsn': self.applied_lsn,
+            'lag_changes': lag_changes,
+            'lag_seconds': lag_seconds,
+            'last_error': self.last_error,
+            'diverged': self.diverged,
+        }
+
+    def _run(self):
+        while not self._stop.is_set() and self.diverged is None:
+            try:
+                applied = self.poll()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                self.last_error = str(e)
+                applied = 0
+            if applied < self.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def _save_state(self):
+        temp_path = self.state_file + '.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump({'applied_lsn': self.applied_lsn}, f)
+        os.replace(temp_path, self.state_file)
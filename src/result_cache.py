@@ -0,0 +1,64 @@
+import pickle
+from collections import Counter, OrderedDict
+from lexer import lexer
+
+
+class ResultCache:
+    """LRU cache of SELECT results, bounded by the approximate pickled size of the results.
+
+    Entries are keyed by the statement's token stream, so whitespace and keyword case do not
+    matter, and remember the version of the table they were read from; an entry whose table
+    has been written since is treated as a miss and dropped.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (table name, table version, rows, size)
+        self.size = 0
+        # Cumulative counters: hits, misses, evictions, invalidations
+        self.stats = Counter()
+
+    def normalize(self, query):
+        """Returns the cache key of a SELECT statement, or None for any other statement."""
+        scanner = lexer.clone()
+        try:
+            scanner.input(query)
+            tokens = tuple((token.type, token.value) for token in iter(scanner.token, None))
+        except SyntaxError:
+            return None
+        if not tokens or tokens[0][0] != 'SELECT':
+            return None
+        # Keywords are matched case-insensitively; identifiers and literals are kept as written
+        return tuple(token if token[0] in ('IDENTIFIER', 'STRING', 'NUMBER') else token[0] for token in tokens)
+
+    def get(self, key, versions):
+        entry = self.entries.get(key)
+        if entry is not None:
+            table_name, version, rows, _ = entry
+            if versions[table_name] == version:
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return [dict(row) for row in rows]
+            self.stats['invalidations'] += 1
+            self._remove(key)
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, key, table_name, version, rows):
+        size = len(pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (table_name, version, [dict(row) for row in rows], size)
+        self.size += size
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def _remove(self, key):
+        self.size -= self.entries.pop(key)[3]
@@ -1,18 +1,84 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from dbms import Database
+from replication import Replica, DEFAULT_BATCH_SIZE
 
-app = FastAPI()
-db = Database(data_dir='data')
+# 'standalone', 'primary' (logs its writes for replicas) or 'replica' (of SIMPLDB_PRIMARY_URL)
+ROLE = os.environ.get('SIMPLDB_ROLE', 'standalone')
+# Seconds between checks of whether the client of a running statement has gone away
+DISCONNECT_POLL_INTERVAL = 0.1
+
+db = Database(
+    data_dir=os.environ.get('SIMPLDB_DATA_DIR', 'data'),
+    parallel_workers=int(os.environ.get('SIMPLDB_PARALLEL_WORKERS', 1)),
+    change_log=ROLE == 'primary',
+    read_only=ROLE == 'replica',
+)
+replica = Replica(db, os.environ['SIMPLDB_PRIMARY_URL']) if ROLE == 'replica' else None
+
+@asynccontextmanager
+async def lifespan(app):
+    if replica is not None:
+        replica.start()
+    yield
+    if replica is not None:
+        replica.stop()
+    db.close()
+
+app = FastAPI(lifespan=lifespan)
 
 class SQLCommand(BaseModel):
     command: str
+    profile: bool = False
+
+async def run_statement(command):
+    result = await db.execute_async(command)
+    return result, db.last_profile
 
 @app.post("/execute")
-async def execute_command(sql_command: SQLCommand):
+async def execute_command(sql_command: SQLCommand, request: Request):
     command = sql_command.command.strip()
+    statement = asyncio.ensure_future(run_statement(command))
     try:
-        result = db.execute(command)
-        return {"result": result}
+        while not statement.done():
+            await asyncio.wait({statement}, timeout=DISCONNECT_POLL_INTERVAL)
+            if not statement.done() and await request.is_disconnected():
+                # Nobody is left to read the result, so stop the scan at its next batch
+                statement.cancel()
+                raise HTTPException(status_code=499, detail="Client closed the request.")
+    finally:
+        # Does nothing once the statement is done, and stops it if this handler is cancelled
+        statement.cancel()
+    try:
+        result, profile = statement.result()
+        response = {"result": result}
+        if sql_command.profile:
+            response["profile"] = profile.to_dict()
+        if replica is not None:
+            response["replication"] = replica.status()
+        return response
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/changes")
+async def changes(after: int = 0, limit: int = DEFAULT_BATCH_SIZE):
+    if db.change_log is None:
+        raise HTTPException(status_code=404, detail="This server does not keep a change log.")
+    return {"changes": db.change_log.read(after, limit), "last_lsn": db.change_log.last_lsn}
+
+@app.get("/replication")
+async def replication():
+    status = {"role": ROLE}
+    if db.change_log is not None:
+        status["last_lsn"] = db.change_log.last_lsn
+    if replica is not None:
+        status.update(replica.status())
+    return status
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(db.metrics.render(), media_type="text/plain; version=0.0.4")
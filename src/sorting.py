@@ -0,0 +1,96 @@
+import heapq
+import pickle
+import tempfile
+
+DEFAULT_SORT_BUFFER_SIZE = 100000
+SPILL_CHUNK_SIZE = 1000
+
+
+class ExternalSorter:
+    """Sorts an unbounded stream of items while holding at most `buffer_size` of them in memory.
+
+    Items are buffered until the budget is reached, then the buffer is sorted and
+    spilled to a temporary file as a run. Iterating merges all runs lazily.
+    """
+
+    def __init__(self, key, reverse=False, buffer_size=DEFAULT_SORT_BUFFER_SIZE, temp_dir=None):
+        if buffer_size < 1:
+            raise ValueError("Sort buffer size must be at least 1.")
+        self.key = key
+        self.reverse = reverse
+        self.buffer_size = buffer_size
+        self.temp_dir = temp_dir
+        self.buffer = []
+        self.runs = []
+
+    def add(self, item):
+        self.buffer.append(item)
+        if len(self.buffer) >= self.buffer_size:
+            self._spill()
+
+    def extend(self, items):
+        for item in items:
+            self.add(item)
+
+    def _spill(self):
+        self.buffer.sort(key=self.key, reverse=self.reverse)
+        run = tempfile.TemporaryFile(dir=self.temp_dir)
+        for start in range(0, len(self.buffer), SPILL_CHUNK_SIZE):
+            pickle.dump(self.buffer[start:start + SPILL_CHUNK_SIZE], run)
+        run.seek(0)
+        self.runs.append(run)
+        self.buffer = []
+
+    def _read_run(self, run):
+        while True:
+            try:
+                chunk = pickle.load(run)
+            except EOFError:
+                return
+            yield from chunk
+
+    def __iter__(self):
+        if not self.runs:
+            self.buffer.sort(key=self.key, reverse=self.reverse)
+            yield from self.buffer
+            return
+        if self.buffer:
+            self._spill()
+        try:
+            runs = [self._read_run(run) for run in self.runs]
+            yield from heapq.merge(*runs, key=self.key, reverse=self.reverse)
+        finally:
+            self.close()
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.runs = []
+        self.buffer = []
+
+
+class TopK:
+    """Keeps the first `k` items of a stream in sort order using a bounded buffer."""
+
+    def __init__(self, k, key, reverse=False):
+        self.k = k
+        self.key = key
+        self.reverse = reverse
+        self.buffer = []
+
+    def add(self, item):
+        self.buffer.append(item)
+        if len(self.buffer) >= 2 * self.k + 1:
+            self._prune()
+
+    def extend(self, items):
+        for item in items:
+            self.add(item)
+
+    def _prune(self):
+        select = heapq.nlargest if self.reverse else heapq.nsmallest
+        self.buffer = select(self.k, self.buffer, key=self.key)
+
+    def __iter__(self):
+        self._prune()
+        return iter(self.buffer)
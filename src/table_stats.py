@@ -0,0 +1,164 @@
+import math
+import random
+from collections import Counter
+
+DEFAULT_SAMPLE_PAGES = 64
+DEFAULT_SAMPLE_ROWS = 10000
+HISTOGRAM_BUCKETS = 16
+
+
+def collect_statistics(btree, columns, sample_pages=DEFAULT_SAMPLE_PAGES, rng=None):
+    """Samples the leaves of `btree` and returns the statistics dict stored in the catalog.
+
+    Internal nodes are always walked (they are a small fraction of the tree) to find the
+    leaves and the tree shape; only `sample_pages` randomly chosen leaves are loaded.
+    """
+    rng = rng or random.Random()
+    node_manager = btree.node_manager
+    leaf_ids = []
+    internal_rows = []
+    internal_nodes = 0
+    height = 0
+    level = [btree.root_id]
+    while level:
+        height += 1
+        next_level = []
+        for node_id in level:
+            leaf, keys, children = node_manager.load_record(node_id)
+            if leaf:
+                leaf_ids.append(node_id)
+            else:
+                internal_nodes += 1
+                internal_rows.extend(row for _, row in keys)
+                next_level.extend(children)
+        level = next_level
+
+    sampled_ids = rng.sample(leaf_ids, min(sample_pages, len(leaf_ids)))
+    fraction = len(sampled_ids) / len(leaf_ids)
+    sample = []
+    sampled_leaf_rows = 0
+    for node_id in sampled_ids:
+        _, keys, _ = node_manager.load_record(node_id)
+        sampled_leaf_rows += len(keys)
+        sample.extend(row for _, row in keys)
+    # Internal rows are kept with the same probability as leaf rows so the sample stays uniform
+    if fraction == 1:
+        sample.extend(internal_rows)
+    else:
+        sample.extend(row for row in internal_rows if rng.random() < fraction)
+
+    row_count = len(internal_rows) + round(sampled_leaf_rows / fraction) if sampled_ids else len(internal_rows)
+    node_count = internal_nodes + len(leaf_ids)
+    return {
+        'row_count': row_count,
+        'node_count': node_count,
+        'height': height,
+        'sampled_rows': len(sample),
+        'columns': {
+            column: _column_statistics([row[column] for row in sample], row_count, unique=(i == 0))
+            for i, column in enumerate(columns)
+        },
+    }
+
+
+def collect_scan_statistics(items, columns, node_count, height, sample_rows=DEFAULT_SAMPLE_ROWS, rng=None):
+    """Builds the same statistics from a full scan of (key, row) pairs, using a reservoir sample.
+
+    Used for storage without a page tree to sample from; `node_count` and `height` describe the
+    cost of a full scan and of a point lookup in that storage.
+    """
+    rng = rng or random.Random()
+    sample = []
+    row_count = 0
+    for _, row in items:
+        row_count += 1
+        if len(sample) < sample_rows:
+            sample.append(row)
+        else:
+            i = rng.randrange(row_count)
+            if i < sample_rows:
+                sample[i] = row
+    return {
+        'row_count': row_count,
+        'node_count': node_count,
+        'height': height,
+        'sampled_rows': len(sample),
+        'columns': {
+            column: _column_statistics([row[column] for row in sample], row_count, unique=(i == 0))
+            for i, column in enumerate(columns)
+        },
+    }
+
+
+def _column_statistics(values, row_count, unique=False):
+    stats = {
+        'distinct': row_count if unique else estimate_distinct(values, row_count),
+        'min': None,
+        'max': None,
+        'histogram': None,
+    }
+    try:
+        ordered = sorted(values)
+    except TypeError:
+        # Mixed types have no total order, so only the distinct count is usable
+        return stats
+    if ordered:
+        stats['min'] = ordered[0]
+        stats['max'] = ordered[-1]
+        stats['histogram'] = equi_depth_histogram(ordered)
+    return stats
+
+
+def estimate_distinct(values, row_count):
+    """Guaranteed-error estimator: scales up values seen once in the sample by sqrt(n / r)."""
+    if not values:
+        return 0
+    frequencies = Counter(Counter(values).values())
+    if len(values) >= row_count:
+        return sum(frequencies.values())
+    singletons = frequencies.get(1, 0)
+    repeated = sum(count for freq, count in frequencies.items() if freq > 1)
+    return max(1, round(math.sqrt(row_count / len(values)) * singletons + repeated))
+
+
+def equi_depth_histogram(ordered, buckets=HISTOGRAM_BUCKETS):
+    """Returns bucket boundaries such that each bucket holds roughly the same number of values."""
+    buckets = min(buckets, len(ordered))
+    return [ordered[min(len(ordered) - 1, (len(ordered) * i) // buckets)] for i in range(buckets)] + [ordered[-1]]
+
+
+def range_selectivity(stats, operator, value):
+    """Estimates the fraction of rows for which `column <operator> value` holds."""
+    histogram = stats.get('histogram')
+    if not histogram:
+        return None
+    try:
+        below = _fraction_below(histogram, value)
+    except TypeError:
+        return None
+    equal = 1 / stats['distinct'] if stats.get('distinct') else 0
+    if operator == '<':
+        return below
+    if operator == '<=':
+        return min(1.0, below + equal)
+    if operator == '>':
+        return max(0.0, 1 - below - equal)
+    if operator == '>=':
+        return 1 - below
+    return None
+
+
+def _fraction_below(histogram, value):
+    buckets = len(histogram) - 1
+    if value <= histogram[0]:
+        return 0.0
+    if value > histogram[-1]:
+        return 1.0
+    for i in range(buckets):
+        lo, hi = histogram[i], histogram[i + 1]
+        if value <= hi:
+            within = 0.5
+            if isinstance(value, (int, float)) and isinstance(lo, (int, float)) and hi != lo:
+                within = (value - lo) / (hi - lo)
+            return (i + within) / buckets
+    return 1.0
@@ -0,0 +1,78 @@
+from aggregation import Aggregator, add_row, initial_states, remove_row
+from ast_nodes import Aggregate
+from planner import matches
+
+# Every view also counts the rows of each group, to drop groups whose last row goes away
+ROW_COUNT = Aggregate('count', '*')
+
+
+def view_aggregator(select):
+    """Returns an empty Aggregator whose groups hold the partial states a view stores for `select`."""
+    return Aggregator(select.columns + [ROW_COUNT], select.group_by)
+
+
+class MaterializedView:
+    """The result of a SELECT ... GROUP BY over one table, kept up to date as the table changes.
+
+    The view's B-tree maps each group to the partial aggregate states of its rows, so reading
+    the view only walks the groups. Row changes of the source table are applied to the states
+    of their groups: COUNT, SUM and AVG follow inserts and deletes exactly, while a MIN or MAX
+    whose current value is deleted marks the group stale until `refresh` recomputes it from the
+    source rows.
+    """
+
+    def __init__(self, select, where_value, btree):
+        self.select = select
+        self.where_value = where_value
+        self.btree = btree
+        self.aggregator = Aggregator(select.columns, select.group_by)
+        self.aggregates = self.aggregator.aggregates + [ROW_COUNT]
+        self.stale = set()  # Groups to recompute from the source table
+
+    def load(self, aggregator):
+        """Replaces the contents of the view with the groups of an aggregator from `view_aggregator`."""
+        for group, _ in list(self.btree.iter_items()):
+            self.btree.delete(group)
+        for group, states in aggregator.groups.items():
+            self.btree.insert(group, states)
+        self.stale = set()
+
+    def apply(self, old_row, new_row):
+        """Applies a row change of the source table; either row is None for an insert or delete."""
+        if old_row is not None and self._selects(old_row):
+            group = self.aggregator.group_of(old_row)
+            if group not in self.stale:
+                states = remove_row(self.aggregates, self.btree.search(group), old_row)
+                if states is None:
+                    self.stale.add(group)
+                elif states[-1] == 0:
+                    self.btree.delete(group)
+                else:
+                    self.btree.insert(group, states)
+        if new_row is not None and self._selects(new_row):
+            group = self.aggregator.group_of(new_row)
+            if group not in self.stale:
+                states = self.btree.search(group) or initial_states(self.aggregates)
+                self.btree.insert(group, add_row(self.aggregates, states, new_row))
+
+    def refresh(self, rows):
+        """Recomputes the stale groups from `rows`, source rows including every row of those groups."""
+        aggregator = view_aggregator(self.select)
+        aggregator.extend(row for row in rows if aggregator.group_of(row) in self.stale and self._selects(row))
+        for group in self.stale:
+            states = aggregator.groups.get(group)
+            if states is None:
+                self.btree.delete(group)
+            else:
+                self.btree.insert(group, states)
+        self.stale = set()
+
+    def rows(self):
+        """Returns the rows of the view, ordered by group."""
+        rows = [self.aggregator.output_row(group, states[:-1]) for group, states in self.btree.iter_items()]
+        if not rows and not self.aggregator.group_by:
+            rows = self.aggregator.results()
+        return rows
+
+    def _selects(self, row):
+        return matches(row, self.select.where_clause, self.where_value)
@@ -4,3 +4,7 @@ import os
 src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
 if src_path not in sys.path:
     sys.path.insert(0, src_path)
+
+benchmarks_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+if benchmarks_path not in sys.path:
+    sys.path.insert(0, benchmarks_path)
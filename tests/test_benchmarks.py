@@ -0,0 +1,27 @@
+import unittest
+import bench
+
+class TestBenchmarks(unittest.TestCase):
+    def test_collect_produces_results(self):
+        results = bench.collect([50], [3], ['btree'], repeat=1, name_filter='search', log=lambda line: None)
+        self.assertEqual(len(results['results']), 1)
+        result = results['results'][0]
+        self.assertEqual(result['name'], 'btree.search')
+        self.assertEqual(result['params'], {'size': 50, 't': 3})
+        self.assertGreater(result['ops_per_sec'], 0)
+        self.assertEqual(results['meta']['seed'], bench.SEED)
+
+    def test_compare_flags_regressions(self):
+        def results(median):
+            return {'results': [{'name': 'btree.search', 'params': {'size': 10, 't': 3},
+                                 'seconds': {'median': median}}]}
+        comparison = bench.compare(results(1.0), results(1.05), threshold=0.10)
+        self.assertFalse(comparison[0]['regression'])
+        comparison = bench.compare(results(1.0), results(1.5), threshold=0.10)
+        self.assertTrue(comparison[0]['regression'])
+        self.assertAlmostEqual(comparison[0]['change'], 0.5)
+
+    def test_compare_ignores_unmatched_results(self):
+        baseline = {'results': [{'name': 'btree.search', 'params': {'size': 10, 't': 3}, 'seconds': {'median': 1.0}}]}
+        current = {'results': [{'name': 'btree.search', 'params': {'size': 10, 't': 16}, 'seconds': {'median': 9.0}}]}
+        self.assertEqual(bench.compare(baseline, current), [])
@@ -0,0 +1,112 @@
+import os
+import shutil
+import unittest
+from bloom import BloomFilter, ScalableBloomFilter, KeyFilter, key_digest, LOG_FILE, LOG_MIN_KEYS
+
+class TestBloomFilter(unittest.TestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        for i in range(1000):
+            bloom.add(i)
+        self.assertTrue(all(i in bloom for i in range(1000)))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"key{i}")
+        false_positives = sum(f"other{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_equal_keys_hash_alike(self):
+        self.assertEqual(key_digest(1), key_digest(1.0))
+        self.assertNotEqual(key_digest(1), key_digest('1'))
+
+class TestScalableBloomFilter(unittest.TestCase):
+    def test_grows_without_false_negatives(self):
+        bloom = ScalableBloomFilter(initial_capacity=100)
+        for i in range(5000):
+            bloom.add(i)
+        self.assertGreater(len(bloom.filters), 1)
+        self.assertEqual(bloom.count, 5000)
+        self.assertTrue(all(i in bloom for i in range(5000)))
+        false_positives = sum(i in bloom for i in range(10000, 20000))
+        self.assertLess(false_positives, 200)
+
+class TestKeyFilter(unittest.TestCase):
+    def setUp(self):
+        self.storage_path = 'data_bloom'
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+        os.makedirs(self.storage_path)
+
+    def _fail(self):
+        raise AssertionError("a saved filter should not be rebuilt")
+
+    def test_saved_filter_is_reused(self):
+        key_filter = KeyFilter(self.storage_path, lambda: [1, 2])
+        key_filter.add(3)
+        key_filter.close()
+        reopened = KeyFilter(self.storage_path, self._fail)
+        self.assertTrue(all(key in reopened for key in (1, 2, 3)))
+        reopened.close()
+
+    def test_unsaved_keys_are_replayed(self):
+        key_filter = KeyFilter(self.storage_path, lambda: [])
+        key_filter.add(1)
+        key_filter.add(2)
+        # A crash mid-write leaves a torn key at the end of the log
+        with open(os.path.join(self.storage_path, LOG_FILE), 'ab') as f:
+            f.write(b'\x50\x00\x00\x00partial')
+        reopened = KeyFilter(self.storage_path, self._fail)
+        self.assertTrue(1 in reopened and 2 in reopened)
+        reopened.add(3)
+        self.assertIn(3, KeyFilter(self.storage_path, self._fail))
+
+    def test_log_is_rolled_into_the_snapshot(self):
+        key_filter = KeyFilter(self.storage_path, lambda: [])
+        for key in range(LOG_MIN_KEYS * 3):
+            key_filter.add(key)
+        # Rolled after LOG_MIN_KEYS and again once the log held as many keys as the snapshot
+        self.assertLessEqual(key_filter._logged, LOG_MIN_KEYS)
+        log_path = os.path.join(self.storage_path, LOG_FILE)
+        key_filter.close()
+        self.assertEqual(os.path.getsize(log_path), 0)
+        reopened = KeyFilter(self.storage_path, self._fail)
+        self.assertTrue(all(key in reopened for key in range(LOG_MIN_KEYS * 3)))
+        reopened.close()
+
+    def test_misses_do_not_touch_the_log(self):
+        key_filter = KeyFilter(self.storage_path, lambda: range(100))
+        KeyFilter(self.storage_path, self._fail).close()
+        key_filter.add('new')
+        stat = os.stat
+        os.stat = None
+        try:
+            self.assertNotIn(1000, key_filter)
+        finally:
+            os.stat = stat
+        key_filter.close()
+
+    def test_handles_see_each_others_keys(self):
+        first = KeyFilter(self.storage_path, lambda: [])
+        second = KeyFilter(self.storage_path, self._fail)
+        for key in range(100):
+            first.add(key)
+        self.assertTrue(all(key in second for key in range(100)))
+        second.add('other')
+        self.assertIn('other', first)
+
+        # A rebuild starts a new log, which the other handle reloads from
+        first.rebuild(range(50))
+        second.add('after rebuild')
+        self.assertIn('after rebuild', first)
+        self.assertIn(10, second)
+        first.close()
+        second.close()
+        reopened = KeyFilter(self.storage_path, self._fail)
+        self.assertTrue('after rebuild' in reopened and 10 in reopened)
+
+    def tearDown(self):
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
+import random
 import unittest
 import shutil
 import os
 from btree import BTree, BTreeNode
+import node_manager
 from node_manager import NodeManager
 
 class TestBTree(unittest.TestCase):
@@ -202,6 +204,8 @@ class TestBTree(unittest.TestCase):
 
     def test_split_child_updates_children(self):
         """Test that splitting a child node correctly updates the parent's children list."""
+        # Sequential keys trigger append splits; use even splits to exercise the classic layout
+        self.btree = BTree(t=3, storage_path=self.storage_path, append_split_ratio=0.5)
         for key in range(1, 8):
             self.btree.insert(key, f"value{key}")
 
@@ -226,5 +230,430 @@ class TestBTree(unittest.TestCase):
         second_child = self.btree.node_manager.load_node(second_child_id)
         self.assertGreater(len(second_child.keys), 0, "Second child should have keys after split.")
 
+    def test_delete_many_keys(self):
+        """Test that interleaved deletions of leaf and internal keys keep the tree consistent."""
+        keys = list(range(200))
+        random.Random(11).shuffle(keys)
+        for key in keys:
+            self.btree.insert(key, f"value{key}")
+
+        remaining = set(keys)
+        for key in keys[:150]:
+            self.btree.delete(key)
+            remaining.discard(key)
+
+        expected = [(k, f"value{k}") for k in sorted(remaining)]
+        self.assertEqual(self.btree.traverse(), expected)
+        for key in remaining:
+            self.assertEqual(self.btree.search(key), f"value{key}")
+        for key in keys[150:]:
+            self.btree.delete(key)
+        self.assertEqual(self.btree.traverse(), [])
+
+    def _node_sizes(self):
+        """Returns the key count of every non-root node and the depth of every leaf."""
+        sizes, depths = [], set()
+        level, depth = [self.btree.root_id], 0
+        while level:
+            nodes = [self.btree.node_manager.load_node(node_id) for node_id in level]
+            sizes.extend(len(node.keys) for node in nodes if node.node_id != self.btree.root_id)
+            depths.update(depth for node in nodes if node.leaf)
+            level = [child for node in nodes for child in node.children]
+            depth += 1
+        return sizes, depths
+
+    def test_delete_keeps_node_size_bounds(self):
+        """Test that deletes keep every node within t - 1 and 2t - 1 keys and all leaves at one depth."""
+        t = self.btree.t
+        # Descending inserts never take the append path, whose splits leave the right node short
+        for key in range(300, 0, -1):
+            self.btree.insert(key, key)
+        keys = list(range(1, 301))
+        random.Random(5).shuffle(keys)
+        for count, key in enumerate(keys[:280], 1):
+            self.btree.delete(key)
+            if count % 20 == 0:
+                sizes, depths = self._node_sizes()
+                self.assertTrue(all(t - 1 <= size <= 2 * t - 1 for size in sizes), sizes)
+                self.assertEqual(len(depths), 1)
+        self.assertEqual([key for key, _ in self.btree.traverse()], sorted(keys[280:]))
+
+    def test_mixed_workload_keeps_nodes_below_capacity(self):
+        """Test that no node exceeds 2t - 1 keys or empties under interleaved inserts and deletes."""
+        rng = random.Random(8)
+        live = set()
+        for _ in range(2000):
+            key = rng.randrange(400)
+            if key in live and rng.random() < 0.6:
+                self.btree.delete(key)
+                live.discard(key)
+            else:
+                self.btree.insert(key, key)
+                live.add(key)
+        sizes, depths = self._node_sizes()
+        self.assertTrue(all(1 <= size <= 2 * self.btree.t - 1 for size in sizes), sizes)
+        self.assertEqual(len(depths), 1)
+        self.assertEqual([key for key, _ in self.btree.traverse()], sorted(live))
+
+    def test_insert_duplicate_of_internal_key(self):
+        """Test that re-inserting a key held by an internal node updates it in place."""
+        for key in range(20):
+            self.btree.insert(key, f"value{key}")
+        root = self.btree.node_manager.load_node(self.btree.root_id)
+        internal_key = root.keys[0][0]
+
+        self.btree.insert(internal_key, 'updated')
+        records = self.btree.traverse()
+        self.assertEqual(len(records), 20)
+        self.assertEqual(self.btree.search(internal_key), 'updated')
+
+    def test_sequential_inserts_use_append_path(self):
+        """Test that increasing keys append to the rightmost leaf and fill split nodes."""
+        btree = BTree(t=16, storage_path=self.storage_path)
+        for key in range(1000):
+            btree.insert(key, f"value{key}")
+
+        self.assertGreater(btree.stats['appends'], 900)
+        self.assertEqual([k for k, _ in btree.iter_items()], list(range(1000)))
+        root = btree.node_manager.load_node(btree.root_id)
+        leaves = [btree.node_manager.load_node(child_id) for child_id in root.children[:-1]]
+        for leaf in leaves:
+            self.assertGreaterEqual(len(leaf.keys), int(0.8 * (2 * btree.t - 1)))
+
+    def test_append_after_reopen_and_mixed_inserts(self):
+        """Test that the cached rightmost leaf stays correct across splits, deletes and reopening."""
+        keys = list(range(0, 400, 2))
+        for key in keys:
+            self.btree.insert(key, f"value{key}")
+        for key in range(1, 400, 4):
+            self.btree.insert(key, f"value{key}")
+        self.btree.delete(398)
+        self.btree.insert(399, 'value399')
+
+        reopened = BTree(t=3, storage_path=self.storage_path)
+        for key in range(400, 450):
+            reopened.insert(key, f"value{key}")
+        expected = sorted(set(keys) - {398} | set(range(1, 400, 4)) | {399} | set(range(400, 450)))
+        self.assertEqual([k for k, _ in reopened.iter_items()], expected)
+
+    def test_rightmost_leaf_cache_survives_splits_and_deletes(self):
+        """Test that splits and deletes away from the end keep the cached rightmost leaf."""
+        for key in range(0, 200, 2):
+            self.btree.insert(key, f"value{key}")
+        for key in range(1, 150, 2):
+            # Fills and splits leaves in the middle of the tree, and merges them again
+            self.btree.insert(key, f"value{key}")
+            self.btree.delete(key - 1)
+            self.assertIsNotNone(self.btree._rightmost_leaf_id)
+        self.btree.delete(198)
+        for key in range(200, 240):
+            self.btree.insert(key, f"value{key}")
+        expected = list(range(1, 150, 2)) + list(range(150, 198, 2)) + list(range(200, 240))
+        self.assertEqual([k for k, _ in self.btree.iter_items()], expected)
+
+    def test_rightmost_leaf_cache_checked_against_other_handles(self):
+        """Test that a handle does not append to a rightmost leaf another handle has split."""
+        for key in range(10):
+            self.btree.insert(key, f"value{key}")
+        other = BTree(t=3, storage_path=self.storage_path)
+        for key in range(20, 26):
+            other.insert(key, f"value{key}")
+        self.assertEqual(other.root_id, self.btree.root_id)
+        self.btree.insert(15, 'value15')
+        self.assertEqual([k for k, _ in other.iter_items()], list(range(10)) + [15] + list(range(20, 26)))
+        other.close()
+
+    def test_iter_range(self):
+        """Test that range iteration yields only keys within the bounds, in either direction."""
+        for key in range(100):
+            self.btree.insert(key, f"value{key}")
+
+        keys = [k for k, _ in self.btree.iter_range(20, 40)]
+        self.assertEqual(keys, list(range(20, 41)))
+        keys = [k for k, _ in self.btree.iter_range(20, 40, low_inclusive=False, high_inclusive=False)]
+        self.assertEqual(keys, list(range(21, 40)))
+        keys = [k for k, _ in self.btree.iter_range(low=95, reverse=True)]
+        self.assertEqual(keys, [99, 98, 97, 96, 95])
+        keys = [k for k, _ in self.btree.iter_range(high=3)]
+        self.assertEqual(keys, [0, 1, 2, 3])
+        self.assertEqual([k for k, _ in self.btree.iter_items(reverse=True)], list(range(99, -1, -1)))
+
+    def test_absent_key_lookup_skips_nodes(self):
+        """Test that the key filter answers lookups of missing keys without loading nodes."""
+        for key in range(200):
+            self.btree.insert(key, f"value{key}")
+        loads = self.btree.node_manager.stats['node_loads']
+        for key in range(1000, 1100):
+            self.assertIsNone(self.btree.search(key))
+        self.assertGreater(self.btree.stats['bloom_negatives'], 90)
+        self.assertLess(self.btree.node_manager.stats['node_loads'] - loads, 20)
+        self.assertEqual(self.btree.search(150), 'value150')
+
+    def test_key_filter_survives_reopen(self):
+        """Test that the key filter is saved on close and keeps the keys of an unclean shutdown."""
+        for key in range(50):
+            self.btree.insert(key, f"value{key}")
+        self.btree.close()
+        self.btree = BTree(t=3, storage_path=self.storage_path)
+        self.assertEqual(self.btree.search(49), 'value49')
+        self.btree.insert(50, 'value50')
+
+        # Not closed: the next open replays the key from the filter's log
+        unclean = BTree(t=3, storage_path=self.storage_path)
+        self.assertEqual(unclean.search(50), 'value50')
+        self.assertIsNone(unclean.search(51))
+        unclean.close()
+
+    def test_key_filter_shared_between_handles(self):
+        """Test that a key inserted through one handle is found through another on the same storage."""
+        other = BTree(t=3, storage_path=self.storage_path)
+        self.assertIsNone(other.search(7))
+        # Few enough keys for the root to stay a leaf, which both handles read from storage
+        for key in range(4, 8):
+            self.btree.insert(key, f"value{key}")
+        self.assertEqual(other.search(7), 'value7')
+        self.assertEqual(other.stats['bloom_negatives'], 1)
+        other.close()
+
+    def test_vacuum_packs_tree(self):
+        """Test that vacuum rebuilds a churned tree into fewer nodes and reuses freed ids."""
+        keys = list(range(500))
+        random.Random(7).shuffle(keys)
+        for key in keys:
+            self.btree.insert(key, f"value{key}")
+        for key in keys[:400]:
+            self.btree.delete(key)
+        # Left behind as if by an interrupted write; vacuum removes it
+        self.btree.node_manager.save_node(BTreeNode(t=3))
+        ids_before = self.btree.node_manager.node_ids()
+
+        summary = self.btree.vacuum()
+        self.assertEqual(summary['rows'], 100)
+        self.assertEqual(summary['orphans_removed'], 1)
+        self.assertLess(summary['nodes_after'], len(ids_before))
+        remaining = sorted(keys[400:])
+        self.assertEqual([k for k, _ in self.btree.iter_items()], remaining)
+        self.assertEqual(self.btree.search(remaining[-1]), f"value{remaining[-1]}")
+        self.assertIsNone(self.btree.search(keys[0]))
+        # The new nodes take freed ids instead of growing the id space
+        self.assertLessEqual(max(self.btree.node_manager.node_ids()), max(ids_before))
+
+        self.btree.close()
+        self.btree = BTree(t=3, storage_path=self.storage_path)
+        self.assertEqual([k for k, _ in self.btree.iter_items()], remaining)
+        for key in range(1000, 1100):
+            self.btree.insert(key, f"value{key}")
+        self.assertEqual(len(list(self.btree.iter_items())), 200)
+
+    def test_vacuum_keeps_nodes_of_running_scans(self):
+        """Test that a scan started before a vacuum finishes on the old nodes, which are freed after it."""
+        for key in range(300):
+            self.btree.insert(key, f"value{key}")
+        for key in range(0, 300, 2):
+            self.btree.delete(key)
+        scan = self.btree.iter_items()
+        first = [next(scan) for _ in range(10)]
+        old_ids = self.btree.node_manager.node_ids()
+
+        summary = self.btree.vacuum()
+        self.assertEqual(summary['rows'], 150)
+        new_ids = self.btree.node_manager.node_ids() - old_ids
+        self.assertTrue(old_ids <= self.btree.node_manager.node_ids())
+        self.assertEqual([k for k, _ in first + list(scan)], list(range(1, 300, 2)))
+        # Once the scan is done the old nodes are deleted
+        self.assertEqual(self.btree.node_manager.node_ids(), new_ids)
+        self.assertEqual([k for k, _ in self.btree.iter_items()], list(range(1, 300, 2)))
+
+    def test_vacuum_empty_tree(self):
+        for key in range(50):
+            self.btree.insert(key, key)
+        for key in range(50):
+            self.btree.delete(key)
+        self.assertEqual(self.btree.vacuum()['nodes_after'], 1)
+        self.assertEqual(list(self.btree.iter_items()), [])
+        self.btree.insert(1, 'one')
+        self.assertEqual(self.btree.search(1), 'one')
+
+    def tearDown(self):
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+
+
+class TestMmapStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_path = 'data_mmap'
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+        self.btree = BTree(t=3, storage_path=self.storage_path, read_mode='mmap')
+
+    def test_insert_search_delete(self):
+        """Test the B-tree operations against segment-file storage."""
+        keys = list(range(300))
+        random.Random(5).shuffle(keys)
+        for key in keys:
+            self.btree.insert(key, f"value{key}")
+        for key in keys[:100]:
+            self.btree.delete(key)
+
+        remaining = sorted(keys[100:])
+        self.assertEqual([k for k, _ in self.btree.iter_items()], remaining)
+        self.assertEqual(self.btree.search(remaining[0]), f"value{remaining[0]}")
+        self.assertIsNone(self.btree.search(keys[0]))
+        self.assertFalse([f for f in os.listdir(self.storage_path) if f.endswith('.node')])
+
+    def test_reopen(self):
+        """Test that the segment index is rebuilt when the tree is reopened."""
+        for key in range(100):
+            self.btree.insert(key, f"value{key}")
+        self.btree.delete(50)
+        self.btree.close()
+
+        reopened = BTree(t=3, storage_path=self.storage_path, read_mode='mmap')
+        self.assertEqual(reopened.search(99), 'value99')
+        self.assertIsNone(reopened.search(50))
+        self.assertEqual(len(list(reopened.iter_items())), 99)
+        reopened.close()
+
+    def test_torn_record_is_discarded(self):
+        """Test that a partially written trailing record is ignored on reopen."""
+        for key in range(20):
+            self.btree.insert(key, f"value{key}")
+        self.btree.close()
+        with open(os.path.join(self.storage_path, node_manager.SEGMENT_FILE), 'ab') as f:
+            f.write(node_manager.RECORD_HEADER.pack(999, 100) + b'partial')
+
+        reopened = BTree(t=3, storage_path=self.storage_path, read_mode='mmap')
+        self.assertEqual([k for k, _ in reopened.iter_items()], list(range(20)))
+        reopened.insert(20, 'value20')
+        self.assertEqual(reopened.search(20), 'value20')
+        reopened.close()
+
+    def test_short_writes_are_completed(self):
+        """Test that a record written in several partial writes is stored whole."""
+        pwrite = os.pwrite
+        os.pwrite = lambda fd, data, offset: pwrite(fd, bytes(data[:7]), offset)
+        try:
+            for key in range(20):
+                self.btree.insert(key, f"value{key}")
+        finally:
+            os.pwrite = pwrite
+        self.btree.close()
+        reopened = BTree(t=3, storage_path=self.storage_path, read_mode='mmap')
+        self.assertEqual([k for k, _ in reopened.iter_items()], list(range(20)))
+        reopened.close()
+
+    def test_read_only_storage(self):
+        """Test that read-only storage never creates, truncates or writes the segment."""
+        for key in range(20):
+            self.btree.insert(key, f"value{key}")
+        self.btree.close()
+        segment = os.path.join(self.storage_path, node_manager.SEGMENT_FILE)
+        with open(segment, 'ab') as f:
+            f.write(node_manager.RECORD_HEADER.pack(999, 100) + b'partial')
+        size = os.path.getsize(segment)
+
+        reader = NodeManager(self.storage_path, read_mode='mmap', read_only=True)
+        self.assertEqual(os.path.getsize(segment), size)
+        self.assertNotIn(999, reader.node_ids())
+        with self.assertRaises(ValueError):
+            reader.save_node(BTreeNode(3))
+        reader.close()
+        with self.assertRaises(FileNotFoundError):
+            NodeManager('data_mmap_missing', read_mode='mmap', read_only=True)
+        self.assertFalse(os.path.exists('data_mmap_missing'))
+
+    def test_compaction_discards_superseded_records(self):
+        """Test that rewriting the segment keeps only the live version of each node."""
+        for key in range(200):
+            self.btree.insert(key, f"value{key}")
+        manager = self.btree.node_manager
+        segment = os.path.join(self.storage_path, node_manager.SEGMENT_FILE)
+        size_before = os.path.getsize(segment)
+
+        manager.compact()
+        self.assertLess(os.path.getsize(segment), size_before)
+        self.assertEqual([k for k, _ in self.btree.iter_items()], list(range(200)))
+        self.btree.insert(200, 'value200')
+        self.assertEqual(self.btree.search(200), 'value200')
+
+    def test_vacuum(self):
+        """Test that vacuum rebuilds the tree and compacts the segment file."""
+        for key in range(300):
+            self.btree.insert(key, f"value{key}")
+        for key in range(0, 300, 3):
+            self.btree.delete(key)
+        segment = os.path.join(self.storage_path, node_manager.SEGMENT_FILE)
+        size_before = os.path.getsize(segment)
+
+        self.btree.vacuum()
+        self.assertLess(os.path.getsize(segment), size_before)
+        self.assertEqual([k for k, _ in self.btree.iter_items()], [k for k in range(300) if k % 3])
+
+    def tearDown(self):
+        self.btree.close()
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+
+
+class TestCompressedStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_path = 'data_compressed'
+        self.plain_path = 'data_plain'
+        for path in (self.storage_path, self.plain_path):
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _fill(self, btree):
+        for i in range(300):
+            key = f"customer-{i:06d}"
+            btree.insert(key, {'id': key, 'name': f"Customer number {i}", 'city': 'Springfield'})
+
+    def test_compressed_tree_round_trip(self):
+        """Test that zlib-compressed, prefix-compressed nodes read back unchanged after reopening."""
+        btree = BTree(t=8, storage_path=self.storage_path, compression='zlib')
+        self._fill(btree)
+        btree.delete('customer-000010')
+        btree.close()
+
+        reopened = BTree(t=8, storage_path=self.storage_path, compression='zlib')
+        self.assertEqual(reopened.search('customer-000299')['name'], 'Customer number 299')
+        self.assertIsNone(reopened.search('customer-000010'))
+        self.assertEqual(len(list(reopened.iter_items())), 299)
+        reopened.close()
+
+    def test_compression_shrinks_storage(self):
+        """Test that compressed tables take less space than uncompressed ones."""
+        compressed = BTree(t=8, storage_path=self.storage_path, compression='zlib')
+        plain = BTree(t=8, storage_path=self.plain_path)
+        self._fill(compressed)
+        self._fill(plain)
+
+        def size(path):
+            return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path) if f.endswith('.node'))
+        self.assertLess(size(self.storage_path) * 2, size(self.plain_path))
+
+    def tearDown(self):
+        for path in (self.storage_path, self.plain_path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class TestAsyncReads(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.storage_path = 'data_async'
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+
+    async def test_async_reads_match_sync_reads(self):
+        """Test that awaitable searches and range scans return what the blocking ones do."""
+        for read_mode in ('file', 'mmap'):
+            btree = BTree(t=3, storage_path=os.path.join(self.storage_path, read_mode), read_mode=read_mode)
+            for key in range(200):
+                btree.insert(key, f"value{key}")
+            self.assertEqual(await btree.search_async(150), 'value150')
+            self.assertIsNone(await btree.search_async(500))
+            loads = btree.io_stats['node_loads']
+            items = [item async for item in btree.iter_range_async(40, 120, low_inclusive=False, reverse=True)]
+            self.assertEqual(items, list(btree.iter_range(40, 120, low_inclusive=False, reverse=True)))
+            self.assertGreater(btree.io_stats['node_loads'], loads)
+            btree.close()
+
     def tearDown(self):
         shutil.rmtree(self.storage_path, ignore_errors=True)
@@ -0,0 +1,108 @@
+import os
+import random
+import shutil
+import unittest
+from columnar import ColumnarTable, LOG_FILE
+
+class TestColumnarTable(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_path = 'data_columnar'
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+        self.table = self._open()
+
+    def _open(self):
+        return ColumnarTable(self.storage_path, ['id', 'name', 'score'], chunk_rows=100)
+
+    def _fill(self, count=1000):
+        ids = list(range(count))
+        random.Random(4).shuffle(ids)
+        for i in ids:
+            self.table.insert(i, {'id': i, 'name': f"user{i}", 'score': i % 50})
+
+    def test_insert_and_search(self):
+        """Test point lookups in sealed chunks and in the unsealed tail."""
+        self._fill(250)
+        self.assertEqual(len(self.table.chunks), 2)
+        self.assertEqual(self.table.search(7), {'id': 7, 'name': 'user7', 'score': 7})
+        self.assertIsNone(self.table.search(1000))
+
+    def test_scan_reads_only_referenced_columns(self):
+        """Test that a projection loads the key and projected columns but not the others."""
+        self._fill()
+        loads = self.table.io_stats['node_loads']
+        rows = list(self.table.scan(['score'], [('score', '=', 3)]))
+        self.assertEqual([row['id'] for row in rows], list(range(3, 1000, 50)))
+        self.assertEqual(set(rows[0]), {'id', 'score'})
+        self.assertLessEqual(self.table.io_stats['node_loads'] - loads, 2 * len(self.table.chunks))
+
+    def test_zone_maps_skip_chunks(self):
+        """Test that chunks whose min/max exclude the predicate are never read."""
+        for i in range(1000):
+            self.table.insert(i, {'id': i, 'name': f"user{i}", 'score': i})
+        rows = list(self.table.scan(None, [('score', '>=', 950)]))
+        self.assertEqual([row['id'] for row in rows], list(range(950, 1000)))
+        self.assertEqual(self.table.stats['chunks_skipped'], 9)
+        self.assertEqual([k for k, _ in self.table.iter_range(10, 13, low_inclusive=False, reverse=True)], [13, 12, 11])
+
+    def test_scan_reads_chunks_as_the_merge_reaches_them(self):
+        """Test that rows stream in key order and a scan stopped early leaves later chunks unread."""
+        self._fill()
+        self.assertEqual([row['id'] for row in self.table.scan(None, [])], list(range(1000)))
+        self.assertEqual([row['id'] for row in self.table.scan(None, [], reverse=True)], list(range(999, -1, -1)))
+
+        self.table = self._reopen_with_ordered_rows()
+        scanned = self.table.stats['chunks_scanned']
+        rows = self.table.scan(None, [], reverse=True)
+        # The unsealed tail holds the largest keys, so no chunk is read for them
+        self.assertEqual([next(rows)['id'] for _ in range(10)], list(range(1009, 999, -1)))
+        self.assertEqual(self.table.stats['chunks_scanned'], scanned)
+        self.assertEqual([next(rows)['id'] for _ in range(2)], [999, 998])
+        self.assertEqual(self.table.stats['chunks_scanned'] - scanned, 1)
+
+    def _reopen_with_ordered_rows(self):
+        self.table.close()
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+        table = self._open()
+        for i in range(1010):
+            table.insert(i, {'id': i, 'name': f"user{i}", 'score': i % 50})
+        return table
+
+    def test_update_and_delete(self):
+        """Test that overwritten and deleted rows are masked out of scans."""
+        self._fill(300)
+        self.table.insert(5, {'id': 5, 'name': 'changed', 'score': 0})
+        self.table.delete(6)
+        self.table.delete(6)
+        self.assertEqual(self.table.search(5)['name'], 'changed')
+        self.assertIsNone(self.table.search(6))
+        keys = [k for k, _ in self.table.iter_items()]
+        self.assertEqual(keys, [k for k in range(300) if k != 6])
+
+    def test_mixed_types(self):
+        """Test that columns whose values differ in type are still stored and filtered."""
+        for i in range(150):
+            self.table.insert(i, {'id': i, 'name': i if i % 2 else f"user{i}", 'score': 1.5 if i % 3 else 2})
+        self.assertEqual(self.table.search(3)['name'], 3)
+        rows = list(self.table.scan(None, [('name', '=', 'user4')]))
+        self.assertEqual([row['id'] for row in rows], [4])
+
+    def test_reopen(self):
+        """Test that sealed chunks, deletes and the logged tail survive a reopen."""
+        self._fill(250)
+        self.table.delete(10)
+        self.table.close()
+        with open(os.path.join(self.storage_path, LOG_FILE), 'ab') as f:
+            f.write(b'\x40\x00\x00\x00partial')
+
+        self.table = self._open()
+        self.assertIsNone(self.table.search(10))
+        self.assertEqual(self.table.search(249)['name'], 'user249')
+        self.assertEqual(len(list(self.table.iter_items())), 249)
+
+    def tearDown(self):
+        self.table.close()
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+
+if __name__ == '__main__':
+    unittest.main()
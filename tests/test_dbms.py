@@ -1,3 +1,4 @@
+import asyncio
 import os
 import unittest
 import shutil
@@ -14,6 +15,313 @@ class TestDatabase(unittest.TestCase):
         result = self.db.execute("CREATE TABLE users (id, name)")
         self.assertEqual(result, "Table users created.")
 
+    def test_create_table_with_fanout(self):
+        self.db.execute("CREATE TABLE users (id, name) WITH (fanout=64)")
+        self.assertEqual(self.db.tables['users']['t'], 32)
+        self.assertEqual(self.db.get_btree('users').t, 32)
+        db_new = Database(data_dir=self.data_dir)
+        self.assertEqual(db_new.get_btree('users').t, 32)
+
+    def test_create_table_derives_fanout_from_page_size(self):
+        self.db.execute("CREATE TABLE small (id, name) WITH (page_size=1024)")
+        self.db.execute("CREATE TABLE large (id, name) WITH (page_size=16384)")
+        small = self.db.tables['small']['t']
+        large = self.db.tables['large']['t']
+        self.assertGreater(small, 3)
+        self.assertGreater(large, small)
+        self.assertEqual(self.db.tables['large']['page_size'], 16384)
+
+        for i in range(500):
+            self.db.execute(f"INSERT INTO large VALUES ({i}, 'user{i}')")
+        self.db.execute("ANALYZE large")
+        self.assertLessEqual(self.db.tables['large']['statistics']['height'], 2)
+
+    def test_mmap_read_mode(self):
+        self.db.execute("CREATE TABLE users (id, name) WITH (read_mode='mmap', fanout=4)")
+        for i in range(30):
+            self.db.execute(f"INSERT INTO users VALUES ({i}, 'user{i}')")
+        self.db.execute("UPDATE users SET name='changed' WHERE id=3")
+        self.db.execute("DELETE FROM users WHERE id=4")
+        self.db.close()
+
+        db_new = Database(data_dir=self.data_dir)
+        result = db_new.execute("SELECT * FROM users WHERE id < 6")
+        self.assertEqual(result, [
+            {'id': 0, 'name': 'user0'}, {'id': 1, 'name': 'user1'}, {'id': 2, 'name': 'user2'},
+            {'id': 3, 'name': 'changed'}, {'id': 5, 'name': 'user5'},
+        ])
+        db_new.close()
+
+    def test_compressed_table(self):
+        self.db.execute("CREATE TABLE users (id, name) WITH (compression='zlib', fanout=8)")
+        self.assertEqual(self.db.tables['users']['compression'], 'zlib')
+        for i in range(50):
+            self.db.execute(f"INSERT INTO users VALUES ({i}, 'user{i}')")
+        self.db.execute("DELETE FROM users WHERE id=7")
+        self.db.close()
+
+        db_new = Database(data_dir=self.data_dir)
+        result = db_new.execute("SELECT name FROM users WHERE id >= 47")
+        self.assertEqual(result, [{'name': 'user47'}, {'name': 'user48'}, {'name': 'user49'}])
+        self.assertEqual(db_new.execute("SELECT * FROM users WHERE id = 7"), [])
+        db_new.close()
+
+    def test_lsm_engine(self):
+        self.db.execute("CREATE TABLE events (id, kind) ENGINE=lsm WITH (memtable_size=16)")
+        self.assertEqual(self.db.tables['events']['engine'], 'lsm')
+        for i in range(100):
+            self.db.execute(f"INSERT INTO events VALUES ({i}, 'kind{i % 3}')")
+        self.db.execute("UPDATE events SET kind='changed' WHERE id=10")
+        self.db.execute("DELETE FROM events WHERE id >= 95")
+        self.assertEqual(self.db.execute("SELECT kind FROM events WHERE id = 10"), [{'kind': 'changed'}])
+        self.db.execute("ANALYZE events")
+        self.assertEqual(self.db.tables['events']['statistics']['row_count'], 95)
+        self.db.close()
+
+        db_new = Database(data_dir=self.data_dir)
+        result = db_new.execute("SELECT id FROM events WHERE id > 90 ORDER BY id DESC")
+        self.assertEqual(result, [{'id': 94}, {'id': 93}, {'id': 92}, {'id': 91}])
+        db_new.close()
+
+    def test_columnar_engine(self):
+        self.db.execute("CREATE TABLE sales (id, region, amount, note) ENGINE=columnar WITH (chunk_rows=20)")
+        for i in range(100):
+            self.db.execute(f"INSERT INTO sales VALUES ({i}, 'region{i % 4}', {i * 10}, 'note{i}')")
+        self.db.execute("UPDATE sales SET amount=0 WHERE id=3")
+        self.db.execute("DELETE FROM sales WHERE amount > 950")
+        result = self.db.execute("SELECT id, amount FROM sales WHERE region = 'region3' ORDER BY amount DESC LIMIT 2")
+        self.assertEqual(result, [{'id': 95, 'amount': 950}, {'id': 91, 'amount': 910}])
+        self.assertEqual(self.db.execute("SELECT * FROM sales WHERE id = 3"),
+                         [{'id': 3, 'region': 'region3', 'amount': 0, 'note': 'note3'}])
+        self.db.close()
+
+        db_new = Database(data_dir=self.data_dir)
+        self.assertEqual(len(db_new.execute("SELECT id FROM sales")), 96)
+        db_new.execute("ANALYZE sales")
+        self.assertEqual(db_new.tables['sales']['statistics']['row_count'], 96)
+        db_new.close()
+
+    def test_hash_engine(self):
+        self.db.execute("CREATE TABLE sessions (token, user) ENGINE=hash WITH (bucket_capacity=4)")
+        for i in range(50):
+            self.db.execute(f"INSERT INTO sessions VALUES ('t{i}', 'user{i}')")
+        self.db.execute("DELETE FROM sessions WHERE token = 't3'")
+        plan = self.db.execute("EXPLAIN SELECT * FROM sessions WHERE token = 't7'")
+        self.assertTrue(plan.startswith("key lookup"))
+        self.assertEqual(self.db.execute("SELECT user FROM sessions WHERE token = 't7'"), [{'user': 'user7'}])
+        self.assertEqual(self.db.execute("SELECT * FROM sessions WHERE token = 't3'"), [])
+        self.assertEqual(len(self.db.execute("SELECT * FROM sessions")), 49)
+
+    def test_secondary_hash_index(self):
+        self.db.execute("CREATE TABLE users (id, name, city)")
+        for i in range(60):
+            self.db.execute(f"INSERT INTO users VALUES ({i}, 'user{i}', 'city{i % 6}')")
+        result = self.db.execute("CREATE INDEX by_city ON users (city) USING HASH")
+        self.assertEqual(result, "Index by_city created on users.")
+        plan = self.db.execute("EXPLAIN SELECT * FROM users WHERE city = 'city2'")
+        self.assertTrue(plan.startswith("index lookup using by_city"))
+
+        self.db.execute("INSERT INTO users VALUES (60, 'user60', 'city2')")
+        self.db.execute("UPDATE users SET city='city9' WHERE id=2")
+        self.db.execute("DELETE FROM users WHERE id=8")
+        self.db.close()
+
+        db_new = Database(data_dir=self.data_dir)
+        result = db_new.execute("SELECT id FROM users WHERE city = 'city2'")
+        self.assertEqual([row['id'] for row in result], [14, 20, 26, 32, 38, 44, 50, 56, 60])
+        self.assertEqual(db_new.execute("SELECT id FROM users WHERE city = 'city9'"), [{'id': 2}])
+        with self.assertRaises(ValueError):
+            db_new.execute("CREATE INDEX by_city ON users (city)")
+        with self.assertRaises(ValueError):
+            db_new.execute("CREATE INDEX by_id ON users (id)")
+        db_new.close()
+
+    def test_result_cache(self):
+        db = Database(data_dir=self.data_dir, result_cache_bytes=1 << 20)
+        db.execute("CREATE TABLE users (id, name)")
+        for i in range(20):
+            db.execute(f"INSERT INTO users VALUES ({i}, 'user{i}')")
+        first = db.execute("SELECT name FROM users WHERE id < 3")
+        loads = db.io_counters()['node_loads']
+        second = db.execute("select name  FROM users where id < 3")
+        self.assertEqual(first, second)
+        self.assertEqual(db.io_counters()['node_loads'], loads)
+        self.assertEqual(db.result_cache.stats['hits'], 1)
+
+        db.execute("UPDATE users SET name='changed' WHERE id=1")
+        third = db.execute("SELECT name FROM users WHERE id < 3")
+        self.assertEqual(third[1], {'name': 'changed'})
+        self.assertEqual(db.result_cache.stats['invalidations'], 1)
+        self.assertIn('simpldb_cache_hits_total{cache="result"} 1', db.metrics.render())
+        db.close()
+
+    def test_aggregates(self):
+        self.db.execute("CREATE TABLE orders (id, region, amount)")
+        for i in range(30):
+            self.db.execute(f"INSERT INTO orders VALUES ({i}, 'r{i % 3}', {i})")
+        result = self.db.execute(
+            "SELECT region, COUNT(*), SUM(amount), MAX(amount) FROM orders WHERE id >= 3 GROUP BY region ORDER BY region DESC"
+        )
+        self.assertEqual(result[0], {'region': 'r2', 'count(*)': 9, 'sum(amount)': 153, 'max(amount)': 29})
+        self.assertEqual([row['region'] for row in result], ['r2', 'r1', 'r0'])
+        self.assertEqual(self.db.execute("SELECT AVG(amount) FROM orders WHERE id < 4"), [{'avg(amount)': 1.5}])
+        self.assertEqual(self.db.execute("SELECT COUNT(*) FROM orders WHERE id > 100"), [{'count(*)': 0}])
+        with self.assertRaises(ValueError):
+            self.db.execute("SELECT region, COUNT(*) FROM orders")
+        with self.assertRaises(ValueError):
+            self.db.execute("SELECT MEDIAN(amount) FROM orders")
+
+    def test_materialized_views(self):
+        self.db.execute("CREATE TABLE orders (id, region, amount)")
+        for i in range(30):
+            self.db.execute(f"INSERT INTO orders VALUES ({i}, 'r{i % 3}', {i})")
+        summary = "SELECT region, COUNT(*), SUM(amount), MIN(amount), MAX(amount) FROM orders WHERE id >= 3 GROUP BY region"
+        self.assertEqual(
+            self.db.execute(f"CREATE MATERIALIZED VIEW totals AS {summary}"), "Materialized view totals created."
+        )
+        self.assertEqual(self.db.execute("SELECT * FROM totals"), self.db.execute(summary))
+
+        self.db.execute("INSERT INTO orders VALUES (30, 'r3', 5)")
+        self.db.execute("INSERT INTO orders VALUES (4, 'r1', 40)")
+        self.db.execute("UPDATE orders SET region='r2' WHERE amount < 10")
+        self.db.execute("DELETE FROM orders WHERE amount = 29")
+        self.db.execute("DELETE FROM orders WHERE region = 'r0'")
+        self.assertEqual(self.db.execute("SELECT * FROM totals"), self.db.execute(summary))
+        self.assertEqual(self.db.execute("SELECT * FROM totals WHERE region = 'r2'")[0]['max(amount)'], 26)
+        self.assertIn("VIEW SCAN on totals", self.db.execute("EXPLAIN SELECT * FROM totals"))
+
+        # The view is read from its own storage after a restart
+        self.db.close()
+        self.db = Database(data_dir=self.data_dir)
+        self.db.execute("DELETE FROM orders WHERE id = 5")
+        self.assertEqual(self.db.execute("SELECT * FROM totals"), self.db.execute(summary))
+        self.assertEqual(self.db.tables['totals']['view']['sql'], summary)
+
+        # With an index on the group column, a deleted MAX is recomputed from its group's rows only
+        self.db.execute("CREATE INDEX by_region ON orders (region)")
+        orders = self.db.get_btree('orders')
+        scans = orders.stats['scans']
+        self.db.execute("DELETE FROM orders WHERE id = 26")
+        self.assertEqual(orders.stats['scans'], scans)
+        self.assertEqual(self.db.execute("SELECT * FROM totals"), self.db.execute(summary))
+        with self.assertRaises(ValueError):
+            self.db.execute("INSERT INTO totals VALUES ('r9', 1, 1, 1, 1)")
+        with self.assertRaises(ValueError):
+            self.db.execute("CREATE MATERIALIZED VIEW ids AS SELECT id FROM orders")
+
+    def test_parallel_scans(self):
+        db = Database(data_dir=self.data_dir, parallel_workers=2)
+        db.execute("CREATE TABLE orders (id, region, amount) WITH (fanout=4)")
+        for i in range(300):
+            db.execute(f"INSERT INTO orders VALUES ({i}, 'r{i % 3}', {i})")
+        self.assertIn("parallel: 2 workers", db.execute("EXPLAIN SELECT * FROM orders WHERE id > 10"))
+        self.assertEqual(db.execute("SELECT id FROM orders WHERE amount >= 295"), [{'id': i} for i in range(295, 300)])
+        # Scans that may stop at their LIMIT stay in this process
+        self.assertNotIn("parallel", db.execute("EXPLAIN SELECT * FROM orders LIMIT 1"))
+        loads = db.io_counters()['node_loads']
+        self.assertEqual(db.execute("SELECT id FROM orders LIMIT 1"), [{'id': 0}])
+        self.assertLess(db.io_counters()['node_loads'] - loads, 10)
+        self.assertIn("parallel", db.execute("EXPLAIN SELECT * FROM orders ORDER BY amount LIMIT 1"))
+        serial = Database(data_dir=self.data_dir)
+        self.assertEqual(
+            db.execute("SELECT region, SUM(amount) FROM orders GROUP BY region"),
+            serial.execute("SELECT region, SUM(amount) FROM orders GROUP BY region"),
+        )
+        serial.close()
+        self.assertEqual(db.execute("DELETE FROM orders WHERE id > 9"), "290 rows deleted from orders.")
+        self.assertEqual(db.execute("SELECT COUNT(*) FROM orders"), [{'count(*)': 10}])
+        # Once analyzed, the table is known to be too small to be worth the workers
+        db.execute("ANALYZE orders")
+        self.assertNotIn("parallel", db.execute("EXPLAIN SELECT * FROM orders"))
+        db.close()
+
+    def test_parallel_partitioned_scans(self):
+        db = Database(data_dir=self.data_dir, parallel_workers=2)
+        db.execute("CREATE TABLE users (id, name) PARTITION BY HASH (id) PARTITIONS 2")
+        for i in range(20):
+            db.execute(f"INSERT INTO users VALUES ({i}, 'user{i}')")
+        # The merge orders rows by the key even when the key is not selected
+        self.assertEqual(db.execute("SELECT name FROM users"), [{'name': f"user{i}"} for i in range(20)])
+        self.assertEqual(db.execute("SELECT name FROM users WHERE id > 17"), [{'name': 'user18'}, {'name': 'user19'}])
+        db.close()
+
+    def test_partitioned_tables(self):
+        self.db.execute(
+            "CREATE TABLE events (id, day, kind) PARTITION BY RANGE (day) "
+            "(PARTITION d1 VALUES LESS THAN (10), PARTITION d2 VALUES LESS THAN (20))"
+        )
+        for i in range(100):
+            self.db.execute(f"INSERT INTO events VALUES ({i}, {i % 20}, 'k{i % 3}')")
+        plan = self.db.execute("EXPLAIN SELECT * FROM events WHERE day >= 15")
+        self.assertIn("partitions: d2 (1 of 2 scanned)", plan)
+        self.assertEqual([row['id'] for row in self.db.execute("SELECT id FROM events WHERE day = 19")], [19, 39, 59, 79, 99])
+        self.assertEqual(self.db.execute("SELECT * FROM events WHERE id = 3"), [{'id': 3, 'day': 3, 'kind': 'k0'}])
+        with self.assertRaises(ValueError):
+            self.db.execute("INSERT INTO events VALUES (100, 25, 'k0')")
+
+        self.db.execute("CREATE INDEX by_kind ON events (kind)")
+        self.db.execute("CREATE MATERIALIZED VIEW kinds AS SELECT kind, COUNT(*) FROM events GROUP BY kind")
+        key_map = self.db.get_btree('events').key_map
+        deletes = key_map.stats['deletes']
+        self.assertEqual(self.db.execute("ALTER TABLE events DROP PARTITION d1"), "Partition d1 dropped from events.")
+        # The dropped rows' key map and index entries are left behind, and read as missing
+        self.assertEqual(key_map.stats['deletes'], deletes)
+        self.assertFalse(os.path.exists(os.path.join(self.data_dir, 'events', 'partitions', 'd1')))
+        self.assertFalse(os.path.exists(os.path.join(self.data_dir, 'events', 'partitions', 'd1.dropped')))
+        self.assertEqual(self.db.execute("SELECT * FROM events WHERE id = 3"), [])
+        self.assertTrue(all(row['day'] >= 10 for row in self.db.execute("SELECT * FROM events WHERE kind = 'k0'")))
+        self.assertEqual(self.db.execute("SELECT COUNT(*) FROM events"), [{'count(*)': 50}])
+        self.assertEqual(self.db.execute("SELECT * FROM kinds"), self.db.execute("SELECT kind, COUNT(*) FROM events GROUP BY kind"))
+        self.db.execute("VACUUM events")
+        index = self.db.get_index(self.db.tables['events']['indexes']['by_kind'])
+        self.assertTrue(all(key % 20 >= 10 for key in index.lookup('k0')))
+        self.assertEqual(len(list(self.db.get_btree('events').key_map.iter_items())), 50)
+        self.db.execute("ALTER TABLE events ADD PARTITION d3 VALUES LESS THAN (30)")
+        self.db.execute("INSERT INTO events VALUES (100, 25, 'k0')")
+        db_new = Database(data_dir=self.data_dir)
+        self.assertEqual(db_new.execute("SELECT id FROM events WHERE day > 20"), [{'id': 100}])
+        db_new.close()
+        with self.assertRaises(ValueError):
+            self.db.execute("ALTER TABLE events ADD PARTITION d4 VALUES LESS THAN (5)")
+
+        # Partition names cannot clash with the table's other storage
+        self.db.execute(
+            "CREATE TABLE logs (id, day) PARTITION BY RANGE (day) "
+            "(PARTITION key_map VALUES LESS THAN (10), PARTITION late VALUES LESS THAN (20))"
+        )
+        for i in range(20):
+            self.db.execute(f"INSERT INTO logs VALUES ({i}, {i})")
+        self.assertEqual(self.db.execute("SELECT COUNT(*) FROM logs"), [{'count(*)': 20}])
+        # A dropped partition's rows do not come back with a new partition of the same name
+        self.db.execute("ALTER TABLE logs DROP PARTITION late")
+        self.db.execute("ALTER TABLE logs ADD PARTITION late VALUES LESS THAN (20)")
+        self.assertEqual(self.db.execute("SELECT * FROM logs WHERE id = 15"), [])
+        self.db.execute("INSERT INTO logs VALUES (15, 15)")
+        self.assertEqual(self.db.execute("SELECT COUNT(*) FROM logs"), [{'count(*)': 11}])
+
+        self.db.execute("CREATE TABLE users (id, name) PARTITION BY HASH (id) PARTITIONS 4")
+        for i in range(40):
+            self.db.execute(f"INSERT INTO users VALUES ({i}, 'user{i}')")
+        self.assertIn("(4 of 4 scanned)", self.db.execute("EXPLAIN SELECT * FROM users WHERE id != 3"))
+        self.assertEqual(self.db.execute("SELECT name FROM users WHERE id = 7"), [{'name': 'user7'}])
+        self.assertEqual([row['id'] for row in self.db.execute("SELECT id FROM users WHERE id >= 37")], [37, 38, 39])
+        with self.assertRaises(ValueError):
+            self.db.execute("ALTER TABLE users DROP PARTITION p0")
+
+    def test_create_table_invalid_options(self):
+        with self.assertRaises(ValueError):
+            self.db.execute("CREATE TABLE users (id, name) WITH (fanout=3)")
+        with self.assertRaises(ValueError):
+            self.db.execute("CREATE TABLE users (id, name) WITH (colour='red')")
+        with self.assertRaises(ValueError):
+            self.db.execute("CREATE TABLE users (id, name) WITH (read_mode='direct')")
+        with self.assertRaises(ValueError):
+            self.db.execute("CREATE TABLE users (id, name) WITH (compression='snappy')")
+        with self.assertRaises(ValueError):
+            self.db.execute("CREATE TABLE users (id, name) ENGINE=heap")
+        with self.assertRaises(ValueError):
+            self.db.execute("CREATE TABLE users (id, name) ENGINE=lsm WITH (fanout=8)")
+
     def test_create_duplicate_table(self):
         self.db.execute("CREATE TABLE users (id, name)")
         with self.assertRaises(ValueError):
@@ -55,6 +363,148 @@ class TestDatabase(unittest.TestCase):
         ]
         self.assertEqual(result, expected)
 
+    def test_select_order_by_key_desc(self):
+        self.db.execute("CREATE TABLE users (id, name)")
+        for i in range(1, 21):
+            self.db.execute(f"INSERT INTO users VALUES ({i}, 'user{i}')")
+        result = self.db.execute("SELECT id FROM users ORDER BY id DESC")
+        self.assertEqual(result, [{'id': i} for i in range(20, 0, -1)])
+
+    def test_select_order_by_column_with_limit(self):
+        self.db.execute("CREATE TABLE users (id, name)")
+        self.db.execute("INSERT INTO users VALUES (1, 'Carol')")
+        self.db.execute("INSERT INTO users VALUES (2, 'Alice')")
+        self.db.execute("INSERT INTO users VALUES (3, 'Bob')")
+        self.db.execute("INSERT INTO users VALUES (4, 'Dave')")
+        result = self.db.execute("SELECT name FROM users ORDER BY name LIMIT 2")
+        self.assertEqual(result, [{'name': 'Alice'}, {'name': 'Bob'}])
+        result = self.db.execute("SELECT id FROM users ORDER BY name DESC LIMIT 1")
+        self.assertEqual(result, [{'id': 4}])
+
+    def test_select_order_by_spills_to_disk(self):
+        db = Database(data_dir=self.data_dir, sort_buffer_size=3)
+        db.execute("CREATE TABLE users (id, score)")
+        scores = [7, 3, 9, 1, 8, 2, 6, 5, 4]
+        for i, score in enumerate(scores):
+            db.execute(f"INSERT INTO users VALUES ({i}, {score})")
+        result = db.execute("SELECT score FROM users ORDER BY score")
+        self.assertEqual(result, [{'score': s} for s in sorted(scores)])
+
+    def test_select_order_by_unknown_column(self):
+        self.db.execute("CREATE TABLE users (id, name)")
+        with self.assertRaises(ValueError):
+            self.db.execute("SELECT * FROM users ORDER BY age")
+
+    def test_select_where(self):
+        self.db.execute("CREATE TABLE users (id, name)")
+        for i in range(1, 31):
+            self.db.execute(f"INSERT INTO users VALUES ({i}, 'user{i % 3}')")
+        self.assertEqual(self.db.execute("SELECT id FROM users WHERE id = 7"), [{'id': 7}])
+        self.assertEqual(self.db.execute("SELECT id FROM users WHERE id > 27"), [{'id': 28}, {'id': 29}, {'id': 30}])
+        self.assertEqual(
+            self.db.execute("SELECT id FROM users WHERE id <= 25 ORDER BY id DESC LIMIT 2"),
+            [{'id': 25}, {'id': 24}]
+        )
+        result = self.db.execute("SELECT id FROM users WHERE name = 'user0'")
+        self.assertEqual(result, [{'id': i} for i in range(3, 31, 3)])
+
+    def test_analyze_and_explain(self):
+        self.db.execute("CREATE TABLE users (id, name)")
+        for i in range(200):
+            self.db.execute(f"INSERT INTO users VALUES ({i}, 'user{i % 4}')")
+        self.assertEqual(self.db.execute("ANALYZE users"), "Table users analyzed.")
+        stats = self.db.tables['users']['statistics']
+        self.assertEqual(stats['row_count'], 200)
+        self.assertEqual(stats['columns']['name']['distinct'], 4)
+
+        plan = self.db.execute("EXPLAIN SELECT * FROM users WHERE id = 5")
+        self.assertTrue(plan.startswith("key lookup on users"))
+        plan = self.db.execute("EXPLAIN SELECT * FROM users WHERE id > 190")
+        self.assertTrue(plan.startswith("key range scan on users"))
+        self.assertIn("statistics: analyzed", plan)
+        plan = self.db.execute("EXPLAIN SELECT * FROM users WHERE name = 'user1'")
+        self.assertTrue(plan.startswith("full scan on users"))
+        self.assertIn("estimated rows: 50", plan)
+
+        db_new = Database(data_dir=self.data_dir)
+        self.assertEqual(db_new.tables['users']['statistics']['row_count'], 200)
+
+    def test_vacuum(self):
+        self.db.execute("CREATE TABLE users (id, name)")
+        for i in range(300):
+            self.db.execute(f"INSERT INTO users VALUES ({i}, 'user{i}')")
+        self.db.execute("DELETE FROM users WHERE id >= 50")
+        self.db.execute("ANALYZE users")
+        result = self.db.execute("VACUUM users")
+        self.assertTrue(result.startswith("Table users vacuumed:"))
+        self.assertEqual(self.db.execute("SELECT id FROM users WHERE id >= 45"), [{'id': i} for i in range(45, 50)])
+        stats = self.db.tables['users']['statistics']
+        self.assertEqual(stats['node_count'], len(self.db.get_btree('users').node_manager.node_ids()))
+
+        self.db.execute("CREATE TABLE events (id, kind) ENGINE=lsm WITH (memtable_size=16)")
+        for i in range(100):
+            self.db.execute(f"INSERT INTO events VALUES ({i}, 'kind{i}')")
+        self.db.execute("DELETE FROM events WHERE id < 90")
+        self.db.execute("VACUUM events")
+        self.assertEqual(len(self.db.get_btree('events').runs), 1)
+        self.assertEqual(len(self.db.execute("SELECT * FROM events")), 10)
+
+        with self.assertRaises(ValueError):
+            self.db.execute("VACUUM missing")
+
+    def test_explain_analyze(self):
+        self.db.execute("CREATE TABLE users (id, name)")
+        for i in range(50):
+            self.db.execute(f"INSERT INTO users VALUES ({i}, 'user{i}')")
+        plan = self.db.execute("EXPLAIN ANALYZE SELECT * FROM users WHERE id >= 45")
+        self.assertIn("actual:", plan)
+        self.assertIn("rows: 5,", plan)
+        self.assertIn("node writes: 0", plan)
+
+    def test_query_profile(self):
+        self.db.execute("CREATE TABLE users (id, name)")
+        self.db.execute("INSERT INTO users VALUES (1, 'Alice')")
+        profile = self.db.last_profile.to_dict()
+        self.assertEqual(profile['statement'], 'insert')
+        self.assertGreater(profile['node_writes'], 0)
+        self.db.execute("SELECT * FROM users")
+        profile = self.db.last_profile.to_dict()
+        self.assertEqual(profile['rows'], 1)
+        self.assertEqual(profile['node_loads'], 1)
+        self.assertIn('parse_ms', profile)
+        self.assertIn('plan_ms', profile)
+
+        metrics = self.db.metrics.render()
+        self.assertIn('simpldb_queries_total{statement="select"} 1', metrics)
+        self.assertIn('# TYPE simpldb_query_duration_seconds histogram', metrics)
+        self.assertIn('simpldb_cache_hit_ratio{cache="table_handle"}', metrics)
+
+    def test_delete_range(self):
+        self.db.execute("CREATE TABLE users (id, name)")
+        for i in range(10):
+            self.db.execute(f"INSERT INTO users VALUES ({i}, 'user{i}')")
+        self.assertEqual(self.db.execute("DELETE FROM users WHERE id >= 6"), "4 rows deleted from users.")
+        self.assertEqual(self.db.execute("SELECT id FROM users"), [{'id': i} for i in range(6)])
+
+    def test_update_key_column(self):
+        self.db.execute("CREATE TABLE users (id, name)")
+        self.db.execute("INSERT INTO users VALUES (1, 'Alice')")
+        self.db.execute("UPDATE users SET id=5 WHERE name='Alice'")
+        self.assertEqual(self.db.execute("SELECT * FROM users"), [{'id': 5, 'name': 'Alice'}])
+
+    def test_update_key_to_existing_key(self):
+        self.db.execute("CREATE TABLE users (id, name)")
+        self.db.execute("INSERT INTO users VALUES (1, 'Alice')")
+        self.db.execute("INSERT INTO users VALUES (2, 'Bob')")
+        with self.assertRaises(ValueError):
+            self.db.execute("UPDATE users SET id=2 WHERE name='Alice'")
+        with self.assertRaises(ValueError):
+            self.db.execute("UPDATE users SET id=7 WHERE id > 0")
+        self.assertEqual(self.db.execute("UPDATE users SET id=1 WHERE id=1"), "1 row updated in users.")
+        self.assertEqual(
+            self.db.execute("SELECT * FROM users"), [{'id': 1, 'name': 'Alice'}, {'id': 2, 'name': 'Bob'}],
+        )
+
     def test_select_from_unknown_table(self):
         with self.assertRaises(ValueError):
             self.db.execute("SELECT * FROM users")
@@ -87,3 +537,86 @@ class TestDatabase(unittest.TestCase):
 
     def tearDown(self):
         shutil.rmtree(self.data_dir, ignore_errors=True)
+
+
+class TestAsyncExecution(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.data_dir = 'test_data_async'
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+        self.db = Database(data_dir=self.data_dir)
+        self.db.execute("CREATE TABLE orders (id, region, amount) WITH (fanout=4)")
+        for i in range(2000):
+            self.db.execute(f"INSERT INTO orders VALUES ({i}, 'r{i % 3}', {i % 50})")
+
+    async def test_results_match_execute(self):
+        queries = [
+            "SELECT * FROM orders WHERE id = 7",
+            "SELECT id FROM orders WHERE id > 1990",
+            "SELECT * FROM orders ORDER BY id DESC LIMIT 5",
+            "SELECT id, amount FROM orders WHERE region = 'r1' ORDER BY amount LIMIT 10",
+            "SELECT region, COUNT(*), AVG(amount) FROM orders GROUP BY region",
+            "SELECT id FROM orders WHERE amount = 3 LIMIT 4",
+        ]
+        for query in queries:
+            self.assertEqual(await self.db.execute_async(query, batch_size=16), self.db.execute(query), query)
+        self.assertEqual(await self.db.execute_async("INSERT INTO orders VALUES (2000, 'r0', 1)"), "1 row inserted into orders.")
+        self.assertEqual(self.db.last_profile.statement, 'insert')
+        self.assertIn("syntax error", (await self.db.execute_async("SELEC id")).lower())
+        with self.assertRaises(ValueError):
+            await self.db.execute_async("SELECT missing FROM orders")
+
+    async def test_scans_share_the_event_loop(self):
+        """Test that light queries finish while a long scan runs, and writes wait for the scan."""
+        scan = asyncio.ensure_future(self.db.execute_async("SELECT * FROM orders WHERE amount = 7", batch_size=8))
+        await asyncio.sleep(0)
+        self.assertEqual(await self.db.execute_async("SELECT region FROM orders WHERE id = 5"), [{'region': 'r2'}])
+        self.assertFalse(scan.done())
+        insert = asyncio.ensure_future(self.db.execute_async("INSERT INTO orders VALUES (5000, 'r0', 7)"))
+        self.assertEqual(len(await scan), 40)
+        await insert
+        self.assertEqual(len(await self.db.execute_async("SELECT * FROM orders WHERE amount = 7")), 41)
+
+    async def test_other_engines_scan_in_worker_threads(self):
+        """Test that scans of engines without async reads leave the event loop free between batches."""
+        self.db.execute("CREATE TABLE events (id, kind) ENGINE=lsm WITH (memtable_size=64)")
+        for i in range(500):
+            self.db.execute(f"INSERT INTO events VALUES ({i}, 'k{i % 5}')")
+        query = "SELECT * FROM events WHERE kind = 'k1'"
+        scan = asyncio.ensure_future(self.db.execute_async(query, batch_size=4))
+        await asyncio.sleep(0)
+        self.assertEqual(await self.db.execute_async("SELECT region FROM orders WHERE id = 5"), [{'region': 'r2'}])
+        self.assertFalse(scan.done())
+        self.assertEqual(await scan, self.db.execute(query))
+
+        scan = asyncio.ensure_future(self.db.execute_async(query, batch_size=4))
+        for _ in range(3):
+            await asyncio.sleep(0)
+        scan.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await scan
+        self.assertEqual(self.db.lock.readers, 0)
+
+    async def test_partitioned_scans(self):
+        self.db.execute(
+            "CREATE TABLE events (id, day) PARTITION BY RANGE (id) "
+            "(PARTITION low VALUES LESS THAN (50), PARTITION high VALUES LESS THAN (100))"
+        )
+        for i in range(100):
+            self.db.execute(f"INSERT INTO events VALUES ({i}, {i % 7})")
+        for query in ["SELECT * FROM events", "SELECT id FROM events WHERE id > 5", "SELECT * FROM events ORDER BY id DESC LIMIT 3"]:
+            self.assertEqual(await self.db.execute_async(query, batch_size=8), self.db.execute(query), query)
+
+    async def test_cancelled_scan_lets_writes_run(self):
+        scan = asyncio.ensure_future(self.db.execute_async("SELECT * FROM orders ORDER BY amount", batch_size=8))
+        for _ in range(3):
+            await asyncio.sleep(0)
+        scan.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await scan
+        self.assertEqual(self.db.lock.readers, 0)
+        await asyncio.wait_for(self.db.execute_async("DELETE FROM orders WHERE id = 1"), timeout=5)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
@@ -0,0 +1,95 @@
+import random
+import shutil
+import unittest
+from hash_index import HashIndex, SecondaryIndex
+
+class TestHashIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_path = 'data_hash'
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+        self.index = HashIndex(self.storage_path, bucket_capacity=8)
+
+    def test_insert_and_search(self):
+        """Test that lookups find every key after the directory has grown."""
+        keys = list(range(500))
+        random.Random(3).shuffle(keys)
+        for key in keys:
+            self.index.insert(key, f"value{key}")
+        self.assertGreater(self.index.global_depth, 5)
+        for key in keys:
+            self.assertEqual(self.index.search(key), f"value{key}")
+        self.assertIsNone(self.index.search(-1))
+        self.index.insert(7, 'changed')
+        self.assertEqual(self.index.search(7), 'changed')
+
+    def test_lookup_reads_one_bucket(self):
+        """Test that an equality lookup loads a single bucket regardless of table size."""
+        for key in range(2000):
+            self.index.insert(f"key{key}", key)
+        loads = self.index.io_stats['node_loads']
+        for key in range(100):
+            self.index.search(f"key{key}")
+        self.assertEqual(self.index.io_stats['node_loads'] - loads, 100)
+
+    def test_absent_key_lookup_skips_buckets(self):
+        """Test that lookups of missing keys are answered by the key filter."""
+        for key in range(200):
+            self.index.insert(key, key)
+        loads = self.index.io_stats['node_loads']
+        for key in range(1000, 1100):
+            self.assertIsNone(self.index.search(key))
+        self.assertLess(self.index.io_stats['node_loads'] - loads, 10)
+
+    def test_split_rewrites_only_the_full_bucket(self):
+        """Test that growing the table splits buckets one at a time instead of rehashing."""
+        for key in range(200):
+            self.index.insert(key, key)
+        writes = self.index.io_stats['node_writes']
+        splits = self.index.stats['splits']
+        for key in range(200, 400):
+            self.index.insert(key, key)
+        new_splits = self.index.stats['splits'] - splits
+        # One write per insert plus two per split (the old bucket and its new sibling)
+        self.assertLessEqual(self.index.io_stats['node_writes'] - writes, 200 + 2 * new_splits)
+
+    def test_delete_and_iterate(self):
+        """Test deletes and that scans return keys in order."""
+        for key in range(100):
+            self.index.insert(key, key * 2)
+        for key in range(0, 100, 2):
+            self.index.delete(key)
+        self.index.delete(1000)
+        self.assertIsNone(self.index.search(4))
+        self.assertEqual([k for k, _ in self.index.iter_items()], list(range(1, 100, 2)))
+        self.assertEqual([k for k, _ in self.index.iter_range(10, 15, reverse=True)], [15, 13, 11])
+
+    def test_reopen(self):
+        """Test that the directory and buckets are read back from disk."""
+        for key in range(300):
+            self.index.insert(key, f"value{key}")
+        self.index.close()
+        self.index = HashIndex(self.storage_path)
+        self.assertEqual(self.index.bucket_capacity, 8)
+        self.assertEqual(self.index.search(299), 'value299')
+        self.assertEqual(len(list(self.index.iter_items())), 300)
+
+    def test_secondary_index(self):
+        """Test that a secondary index tracks the keys of rows holding each value."""
+        self.index.close()
+        secondary = SecondaryIndex(self.storage_path, 'city')
+        secondary.add({'id': 1, 'city': 'Paris'}, 1)
+        secondary.add({'id': 2, 'city': 'Paris'}, 2)
+        secondary.add({'id': 3, 'city': 'Rome'}, 3)
+        secondary.remove({'id': 1, 'city': 'Paris'}, 1)
+        self.assertEqual(secondary.lookup('Paris'), [2])
+        secondary.remove({'id': 3, 'city': 'Rome'}, 3)
+        self.assertEqual(secondary.lookup('Rome'), [])
+        self.index = secondary.hash_index
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import os
+import random
+import shutil
+import unittest
+from lsm import LSMTree, RUN_SUFFIX, WAL_FILE
+
+class TestLSMTree(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_path = 'data_lsm'
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+        self.lsm = self._open()
+
+    def _open(self):
+        return LSMTree(storage_path=self.storage_path, memtable_size=50, background_compaction=False)
+
+    def test_insert_and_search(self):
+        """Test point lookups across the memtable and flushed runs."""
+        keys = list(range(500))
+        random.Random(1).shuffle(keys)
+        for key in keys:
+            self.lsm.insert(key, f"value{key}")
+        self.assertGreater(self.lsm.stats['flushes'], 0)
+        for key in range(500):
+            self.assertEqual(self.lsm.search(key), f"value{key}")
+        self.assertIsNone(self.lsm.search(1000))
+
+    def test_newest_version_wins(self):
+        """Test that updates and deletes shadow older versions in earlier runs."""
+        for key in range(200):
+            self.lsm.insert(key, 'old')
+        for key in range(0, 200, 2):
+            self.lsm.insert(key, 'new')
+        for key in range(0, 200, 3):
+            self.lsm.delete(key)
+        expected = {key: ('new' if key % 2 == 0 else 'old') for key in range(200) if key % 3}
+        self.assertEqual(dict(self.lsm.iter_items()), expected)
+        self.assertIsNone(self.lsm.search(3))
+        self.assertEqual(self.lsm.search(4), 'new')
+
+    def test_iter_range(self):
+        """Test bounded and reverse scans merge runs in key order."""
+        keys = list(range(300))
+        random.Random(2).shuffle(keys)
+        for key in keys:
+            self.lsm.insert(key, key)
+        self.assertEqual([k for k, _ in self.lsm.iter_range(100, 110, low_inclusive=False)], list(range(101, 111)))
+        self.assertEqual([k for k, _ in self.lsm.iter_range(high=5, high_inclusive=False, reverse=True)], [4, 3, 2, 1, 0])
+        self.assertEqual([k for k, _ in self.lsm.iter_items(reverse=True)], list(range(299, -1, -1)))
+
+    def test_compaction_merges_runs_and_drops_tombstones(self):
+        """Test that compaction bounds the number of runs and discards deleted keys."""
+        for key in range(1000):
+            self.lsm.insert(key, key)
+        for key in range(500):
+            self.lsm.delete(key)
+        self.lsm.flush()
+        self.lsm.compact()
+        self.assertGreater(self.lsm.stats['compactions'], 0)
+        self.assertLess(len(self.lsm.runs), 8)
+        self.assertEqual([k for k, _ in self.lsm.iter_items()], list(range(500, 1000)))
+        run_files = [f for f in os.listdir(self.storage_path) if f.endswith(RUN_SUFFIX)]
+        self.assertEqual(sorted(run_files), sorted(run.name for run in self.lsm.runs))
+
+    def test_compaction_closes_replaced_runs(self):
+        """Test that a run replaced by compaction is closed once the last scan reading it finishes."""
+        for key in range(150):
+            self.lsm.insert(key, key)
+        self.lsm.flush()
+        old_runs = list(self.lsm.runs)
+        scan = self.lsm.iter_items()
+        self.assertEqual(next(scan), (0, 0))
+        self.lsm.compact(full=True)
+        self.assertTrue(all(run.retired for run in old_runs))
+        self.assertTrue(all(run._fd is not None for run in old_runs))
+        self.assertEqual([k for k, _ in scan], list(range(1, 150)))
+        self.assertTrue(all(run._fd is None for run in old_runs))
+
+        replaced = list(self.lsm.runs)
+        for key in range(150, 200):
+            self.lsm.insert(key, key)
+        self.lsm.flush()
+        self.lsm.compact(full=True)
+        self.assertTrue(all(run._fd is None for run in replaced))
+
+    def test_compaction_during_search(self):
+        """Test that a run replaced while a lookup reads it stays open until the lookup finishes."""
+        for key in range(150):
+            self.lsm.insert(key, key)
+        self.lsm.flush()
+        run = self.lsm.runs[-1]
+        get = run.get
+
+        def compact_then_get(key):
+            self.lsm.compact(full=True)
+            self.assertTrue(run.retired)
+            return get(key)
+        run.get = compact_then_get
+        self.assertEqual(self.lsm.search(5), 5)
+        self.assertIsNone(run._fd)
+
+    def test_bloom_filter_skips_runs(self):
+        """Test that lookups of absent keys are answered by the Bloom filters without reading blocks."""
+        for key in range(300):
+            self.lsm.insert(key, key)
+        self.lsm.flush()
+        loads = self.lsm.io_stats['node_loads']
+        for key in range(10000, 10100):
+            self.assertIsNone(self.lsm.search(key))
+        self.assertGreater(self.lsm.stats['bloom_skips'], 0)
+        self.assertLess(self.lsm.io_stats['node_loads'] - loads, 20)
+
+    def test_reopen_replays_wal(self):
+        """Test that unflushed writes survive a reopen and that a torn log record is ignored."""
+        for key in range(120):
+            self.lsm.insert(key, f"value{key}")
+        self.lsm.delete(5)
+        self.lsm.close()
+        with open(os.path.join(self.storage_path, WAL_FILE), 'ab') as f:
+            f.write(b'\x40\x00\x00\x00partial')
+
+        self.lsm = self._open()
+        self.assertEqual(self.lsm.search(119), 'value119')
+        self.assertIsNone(self.lsm.search(5))
+        self.assertEqual(len(list(self.lsm.iter_items())), 119)
+        self.lsm.insert(120, 'value120')
+        self.assertEqual(self.lsm.search(120), 'value120')
+
+    def test_background_compaction(self):
+        """Test that flushes hand compaction to a background thread."""
+        self.lsm.close()
+        self.lsm = LSMTree(storage_path=self.storage_path, memtable_size=20, compaction_fanout=2)
+        for key in range(400):
+            self.lsm.insert(key, key)
+        self.lsm.wait_for_compaction()
+        self.assertGreater(self.lsm.stats['compactions'], 0)
+        self.assertEqual([k for k, _ in self.lsm.iter_items()], list(range(400)))
+
+    def tearDown(self):
+        self.lsm.close()
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+from metrics import MetricsRegistry, QueryProfile
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_render_counters_and_histograms(self):
+        registry = MetricsRegistry()
+        registry.describe('requests_total', 'counter', 'Requests served.')
+        registry.describe('latency_seconds', 'histogram', 'Request latency.')
+        registry.inc('requests_total', route='/a')
+        registry.inc('requests_total', 2, route='/a')
+        registry.observe('latency_seconds', 0.003)
+        registry.observe('latency_seconds', 20)
+
+        text = registry.render()
+        self.assertIn('# TYPE requests_total counter', text)
+        self.assertIn('requests_total{route="/a"} 3', text)
+        self.assertIn('latency_seconds_bucket{le="0.0025"} 0', text)
+        self.assertIn('latency_seconds_bucket{le="0.005"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn('latency_seconds_count 2', text)
+
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry()
+        registry.set_gauge('info', 1, name='a "quoted" value')
+        self.assertIn('info{name="a \\"quoted\\" value"} 1', registry.render())
+
+class TestQueryProfile(unittest.TestCase):
+    def test_phases_accumulate(self):
+        profile = QueryProfile()
+        with profile.phase('parse'):
+            pass
+        with profile.phase('parse'):
+            pass
+        profile.counters['node_loads'] += 4
+        result = profile.to_dict()
+        self.assertIn('parse_ms', result)
+        self.assertEqual(result['node_loads'], 4)
@@ -0,0 +1,59 @@
+import unittest
+from page_codecs import Codec, CODECS, get_codec, register_codec, pack_record, unpack_record
+
+class TestPageCodecs(unittest.TestCase):
+    def test_zlib_round_trip(self):
+        codec = get_codec('zlib')
+        data = b'Springfield ' * 100
+        encoded = codec.encode(data)
+        self.assertLess(len(encoded), len(data))
+        self.assertEqual(codec.decode(encoded), data)
+
+    def test_no_compression(self):
+        self.assertIsNone(get_codec(None))
+        self.assertIsNone(get_codec('none'))
+        with self.assertRaises(ValueError):
+            get_codec('snappy')
+
+    def test_register_codec(self):
+        class ReverseCodec(Codec):
+            name = 'reverse'
+
+            def encode(self, data):
+                return bytes(reversed(data))
+
+            def decode(self, data):
+                return bytes(reversed(data))
+
+        register_codec(ReverseCodec)
+        try:
+            self.assertEqual(get_codec('reverse').decode(get_codec('reverse').encode(b'abc')), b'abc')
+        finally:
+            del CODECS['reverse']
+
+        class HalfCodec(Codec):
+            name = 'half'
+
+            def encode(self, data):
+                return data
+
+        with self.assertRaises(TypeError):
+            HalfCodec()
+
+    def test_pack_record_shares_key_prefix_and_columns(self):
+        keys = [(f"user-{i:04d}", {'id': f"user-{i:04d}", 'name': f"name{i}"}) for i in range(5)]
+        record = (True, keys, [])
+        packed = pack_record(record)
+        self.assertEqual(packed[2], 'user-000')
+        self.assertEqual(packed[4], ('id', 'name'))
+        self.assertEqual(unpack_record(packed), record)
+
+    def test_pack_record_mixed_rows(self):
+        record = (False, [(1, {'a': 1}), (2, {'b': 2}), (3, 'raw')], [10, 11, 12, 13])
+        packed = pack_record(record)
+        self.assertIsNone(packed[2])
+        self.assertIsNone(packed[4])
+        self.assertEqual(unpack_record(packed), record)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import shutil
+from ast_nodes import Aggregate, WhereClause
+from aggregation import Aggregator
+from btree import BTree
+from parallel import ParallelScanner
+
+
+class TestAggregator(unittest.TestCase):
+
+    def test_merge_matches_single_pass(self):
+        """Test that aggregating two halves separately and merging equals one pass over all rows."""
+        items = ['kind', Aggregate('count', '*'), Aggregate('sum', 'n'), Aggregate('avg', 'n'),
+                 Aggregate('min', 'n'), Aggregate('max', 'n'), Aggregate('count', 'note')]
+        rows = [{'kind': i % 3, 'n': i, 'note': None if i % 4 else 'x'} for i in range(100)]
+        whole = Aggregator(items, ['kind']).extend(rows)
+        merged = Aggregator(items, ['kind']).extend(rows[:37]).merge(Aggregator(items, ['kind']).extend(rows[37:]))
+        self.assertEqual(merged.results(), whole.results())
+        first = whole.results()[0]
+        self.assertEqual(first['kind'], 0)
+        self.assertEqual(first['count(*)'], 34)
+        self.assertEqual(first['sum(n)'], sum(range(0, 100, 3)))
+        self.assertEqual(first['min(n)'], 0)
+        self.assertEqual(first['max(n)'], 99)
+
+    def test_no_rows(self):
+        """Test that aggregating nothing yields one row without GROUP BY and none with it."""
+        items = [Aggregate('count', '*'), Aggregate('sum', 'n'), Aggregate('avg', 'n')]
+        self.assertEqual(Aggregator(items).results(), [{'count(*)': 0, 'sum(n)': None, 'avg(n)': None}])
+        self.assertEqual(Aggregator(['n'] + items, ['n']).results(), [])
+
+
+class TestParallelScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_path = 'data_parallel'
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+        self.scanner = ParallelScanner(workers=2)
+
+    def _fill(self, btree):
+        for key in range(1000):
+            btree.insert(key, {'id': key, 'group': key % 7})
+
+    def test_scan_matches_serial_scan(self):
+        """Test that parallel scans return the same rows, in the same order, as a serial scan."""
+        btree = BTree(t=3, storage_path=self.storage_path)
+        self._fill(btree)
+        rows = [row for _, row in btree.iter_items()]
+        self.assertEqual(list(self.scanner.scan(btree)), rows)
+        self.assertEqual(list(self.scanner.scan(btree, reverse=True)), rows[::-1])
+        self.assertEqual(list(self.scanner.scan(btree, 100, 200, low_inclusive=False)), rows[101:201])
+
+        where = WhereClause('group', 3)
+        self.assertEqual(
+            list(self.scanner.scan(btree, where_clause=where, where_value=3, columns=['id'])),
+            [{'id': row['id']} for row in rows if row['group'] == 3],
+        )
+        self.assertGreater(btree.io_stats['node_loads'], 0)
+        btree.close()
+
+    def test_scan_submits_subtrees_as_rows_are_read(self):
+        """Test that a scan read only in part leaves most subtrees unsubmitted."""
+        btree = BTree(t=3, storage_path=self.storage_path)
+        self._fill(btree)
+        submitted = []
+        list(self.scanner.scan(btree, high=0))
+        submit = self.scanner._executor.submit
+        self.scanner._executor.submit = lambda *args: submitted.append(args) or submit(*args)
+        scan = self.scanner.scan(btree)
+        self.assertEqual(next(scan), {'id': 0, 'group': 0})
+        scan.close()
+        # The subtree being read and one more per worker, out of PIECES_PER_WORKER per worker
+        self.assertEqual(len(submitted), self.scanner.workers + 1)
+        btree.close()
+
+    def test_aggregate_sees_writes(self):
+        """Test that worker aggregates reflect writes made after the workers first opened the tree."""
+        btree = BTree(t=3, storage_path=self.storage_path, read_mode='mmap')
+        self._fill(btree)
+        items = ['group', Aggregate('count', '*')]
+        counts = self.scanner.aggregate([btree], Aggregator(items, ['group'])).results()
+        self.assertEqual(sum(row['count(*)'] for row in counts), 1000)
+
+        for key in range(500):
+            btree.delete(key)
+        counts = self.scanner.aggregate([btree], Aggregator(items, ['group']), low=700).results()
+        self.assertEqual(sum(row['count(*)'] for row in counts), 300)
+        btree.close()
+
+    def tearDown(self):
+        self.scanner.close()
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,10 +2,17 @@ import unittest
 from parser import parser
 from ast_nodes import (
     CreateTableStatement,
+    CreateIndexStatement,
     InsertStatement,
     SelectStatement,
     UpdateStatement,
     DeleteStatement,
+    AnalyzeStatement,
+    VacuumStatement,
+    ExplainStatement,
+    Aggregate,
+    CreateViewStatement,
+    AlterTableStatement,
 )
 
 class TestSQLParser(unittest.TestCase):
@@ -16,6 +23,21 @@ class TestSQLParser(unittest.TestCase):
         self.assertEqual(ast.table_name, 'users')
         self.assertEqual(ast.columns, ['id', 'name'])
 
+    def test_create_table_with_options(self):
+        ast = parser.parse("CREATE TABLE users (id, name) WITH (fanout=64, page_size=8192)")
+        self.assertEqual(ast.columns, ['id', 'name'])
+        self.assertEqual(ast.options, {'fanout': 64, 'page_size': 8192})
+
+    def test_create_table_with_engine(self):
+        ast = parser.parse("CREATE TABLE events (id, kind) ENGINE=LSM WITH (memtable_size=100)")
+        self.assertEqual(ast.options, {'engine': 'lsm', 'memtable_size': 100})
+
+    def test_create_index(self):
+        ast = parser.parse("CREATE INDEX by_name ON users (name) USING HASH")
+        self.assertIsInstance(ast, CreateIndexStatement)
+        self.assertEqual((ast.index_name, ast.table_name, ast.column, ast.index_type), ('by_name', 'users', 'name', 'hash'))
+        self.assertEqual(parser.parse("CREATE INDEX by_name ON users (name)").index_type, 'hash')
+
     def test_insert_into(self):
         query = "INSERT INTO users VALUES (1, 'Alice')"
         ast = parser.parse(query)
@@ -30,6 +52,40 @@ class TestSQLParser(unittest.TestCase):
         self.assertEqual(ast.columns, ['id', 'name'])
         self.assertEqual(ast.table_name, 'users')
 
+    def test_select_order_by_limit(self):
+        query = "SELECT * FROM users ORDER BY name DESC LIMIT 10"
+        ast = parser.parse(query)
+        self.assertIsInstance(ast, SelectStatement)
+        self.assertEqual(ast.order_by.column, 'name')
+        self.assertTrue(ast.order_by.descending)
+        self.assertEqual(ast.limit, 10)
+
+    def test_select_order_by_default_ascending(self):
+        ast = parser.parse("SELECT id FROM users ORDER BY id")
+        self.assertFalse(ast.order_by.descending)
+        self.assertIsNone(ast.limit)
+
+    def test_select_where_comparison(self):
+        ast = parser.parse("SELECT * FROM users WHERE id >= 10")
+        self.assertEqual(ast.where_clause.column, 'id')
+        self.assertEqual(ast.where_clause.operator, '>=')
+        self.assertEqual(ast.where_clause.value, 10)
+        ast = parser.parse("SELECT * FROM users WHERE name <> 'Bob'")
+        self.assertEqual(ast.where_clause.operator, '!=')
+
+    def test_explain_and_analyze(self):
+        ast = parser.parse("EXPLAIN SELECT * FROM users WHERE id = 1")
+        self.assertIsInstance(ast, ExplainStatement)
+        self.assertIsInstance(ast.statement, SelectStatement)
+        ast = parser.parse("ANALYZE users")
+        self.assertIsInstance(ast, AnalyzeStatement)
+        self.assertEqual(ast.table_name, 'users')
+
+    def test_vacuum(self):
+        ast = parser.parse("VACUUM users")
+        self.assertIsInstance(ast, VacuumStatement)
+        self.assertEqual(ast.table_name, 'users')
+
     def test_update(self):
         query = "UPDATE users SET name='Bob' WHERE id=1"
         ast = parser.parse(query)
@@ -48,6 +104,39 @@ class TestSQLParser(unittest.TestCase):
         self.assertEqual(ast.where_clause.column, 'id')
         self.assertEqual(ast.where_clause.value, 1)
 
+    def test_partitioning(self):
+        ast = parser.parse(
+            "CREATE TABLE events (id, day) PARTITION BY RANGE (day) "
+            "(PARTITION d1 VALUES LESS THAN (10), PARTITION d2 VALUES LESS THAN (20)) WITH (fanout=8)"
+        )
+        self.assertEqual(ast.partition_by.method, 'range')
+        self.assertEqual(ast.partition_by.column, 'day')
+        self.assertEqual([(p.name, p.bound) for p in ast.partition_by.partitions], [('d1', 10), ('d2', 20)])
+        self.assertEqual(ast.options, {'fanout': 8})
+        ast = parser.parse("CREATE TABLE users (id, name) PARTITION BY HASH (id) PARTITIONS 4")
+        self.assertEqual(ast.partition_by.count, 4)
+        ast = parser.parse("ALTER TABLE events DROP PARTITION d1")
+        self.assertIsInstance(ast, AlterTableStatement)
+        self.assertEqual(ast.drop_partition, 'd1')
+        ast = parser.parse("ALTER TABLE events ADD PARTITION d3 VALUES LESS THAN (30)")
+        self.assertEqual(ast.add_partition.bound, 30)
+
+    def test_materialized_view(self):
+        ast = parser.parse("CREATE MATERIALIZED VIEW totals AS SELECT region, SUM(amount) FROM orders GROUP BY region")
+        self.assertIsInstance(ast, CreateViewStatement)
+        self.assertEqual(ast.view_name, 'totals')
+        self.assertEqual(ast.select.table_name, 'orders')
+        self.assertEqual(ast.select.columns[1].label, 'sum(amount)')
+
+    def test_select_aggregates(self):
+        ast = parser.parse("SELECT region, COUNT(*), sum(amount) FROM orders GROUP BY region ORDER BY region")
+        self.assertEqual(ast.columns[0], 'region')
+        self.assertIsInstance(ast.columns[1], Aggregate)
+        self.assertEqual(ast.columns[1].label, 'count(*)')
+        self.assertEqual(ast.columns[2].label, 'sum(amount)')
+        self.assertEqual(ast.group_by, ['region'])
+        self.assertIsNone(parser.parse("SELECT id FROM orders").group_by)
+
     def test_invalid_syntax(self):
         query = "SELECT FROM users"
         with self.assertRaises(SyntaxError):
@@ -0,0 +1,69 @@
+import unittest
+import os
+import shutil
+from ast_nodes import WhereClause
+from btree import BTree
+from partitioning import PartitionedTable
+
+
+class TestPartitionedTable(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_path = 'data_partitioned'
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+
+    def _open(self, partitioning):
+        for i, partition in enumerate(partitioning['partitions']):
+            partition.update(name=f"p{i}", id=i, btree_path=os.path.join(self.storage_path, f"p{i}"))
+        if partitioning['column'] != 'id':
+            partitioning['key_map'] = {'btree_path': os.path.join(self.storage_path, 'key_map')}
+        return PartitionedTable(partitioning, 'id', lambda partition: BTree(t=3, storage_path=partition['btree_path']))
+
+    def test_range_partitions_on_key(self):
+        """Test routing, pruning and ordered scans of a table range partitioned on its key."""
+        table = self._open({'method': 'range', 'column': 'id', 'partitions': [{'bound': 100}, {'bound': 200}, {'bound': 300}]})
+        for key in range(300):
+            table.insert(key, {'id': key})
+        self.assertEqual([len(list(tree.iter_items())) for tree in table.trees], [100, 100, 100])
+        self.assertEqual(table.search(150), {'id': 150})
+        self.assertIsNone(table.search(400))
+        with self.assertRaises(ValueError):
+            table.insert(300, {'id': 300})
+
+        self.assertEqual([k for k, _ in table.iter_range(95, 205)], list(range(95, 206)))
+        self.assertEqual([k for k, _ in table.iter_range(high=5, reverse=True)], [5, 4, 3, 2, 1, 0])
+        self.assertEqual(table.prune(WhereClause('id', 100, '>='), 100), table.trees[1:])
+        self.assertEqual(table.prune(WhereClause('id', 100, '<'), 100), table.trees[:1])
+        self.assertEqual(table.prune(WhereClause('id', 150, '='), 150), table.trees[1:2])
+        table.close()
+
+    def test_hash_partitions_on_other_column(self):
+        """Test that rows follow their partition column and scans merge partitions in key order."""
+        table = self._open({'method': 'hash', 'column': 'city', 'partitions': [{}, {}, {}]})
+        for key in range(60):
+            table.insert(key, {'id': key, 'city': f"city{key % 5}"})
+        self.assertEqual([k for k, _ in table.iter_items()], list(range(60)))
+        self.assertEqual([k for k, _ in table.iter_items(reverse=True)], list(range(59, -1, -1)))
+        self.assertEqual(len(table.prune(WhereClause('city', 'city1'), 'city1')), 1)
+
+        # Moving a row to another city moves it to that city's partition
+        table.insert(1, {'id': 1, 'city': 'elsewhere'})
+        self.assertEqual(sum(tree.search(1) is not None for tree in table.trees), 1)
+        self.assertEqual(table.search(1)['city'], 'elsewhere')
+
+        # The key map sends key lookups and writes to the one partition holding the key
+        searches = [tree.stats['searches'] for tree in table.trees]
+        table.insert(2, {'id': 2, 'city': 'city2'})
+        self.assertEqual(table.search(2), {'id': 2, 'city': 'city2'})
+        self.assertEqual(sum(tree.stats['searches'] for tree in table.trees) - sum(searches), 1)
+        table.delete(1)
+        self.assertIsNone(table.search(1))
+        self.assertEqual(len(list(table.iter_items())), 59)
+        table.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
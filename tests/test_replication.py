@@ -0,0 +1,234 @@
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import requests
+from client import SQLClient
+from dbms import Database
+from replication import ChangeLog, Replica, CHANGE_LOG_FILE
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+
+class TestChangeLog(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = 'test_changelog'
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+        os.makedirs(self.data_dir)
+
+    def test_read_after_lsn(self):
+        log = ChangeLog(self.data_dir)
+        for i in range(10):
+            self.assertEqual(log.append(f"INSERT INTO t VALUES ({i})"), i + 1)
+        changes = log.read(after=3, limit=4)
+        self.assertEqual([lsn for lsn, _, _ in changes], [4, 5, 6, 7])
+        self.assertEqual(changes[0][2], "INSERT INTO t VALUES (3)")
+        self.assertEqual(log.read(after=10), [])
+        log.close()
+
+        with open(os.path.join(self.data_dir, CHANGE_LOG_FILE), 'ab') as f:
+            f.write(b'\x50\x00\x00\x00partial')
+        reopened = ChangeLog(self.data_dir)
+        self.assertEqual(reopened.last_lsn, 10)
+        self.assertEqual(reopened.uncommitted(), [])
+        self.assertEqual(reopened.append("DELETE FROM t WHERE id = 1"), 11)
+        self.assertEqual(reopened.read(after=9)[-1][2], "DELETE FROM t WHERE id = 1")
+        reopened.close()
+
+    def test_primary_logs_writes_and_replica_refuses_them(self):
+        primary = Database(data_dir=self.data_dir, change_log=True)
+        primary.execute("CREATE TABLE users (id, name)")
+        primary.execute("INSERT INTO users VALUES (1, 'Alice')")
+        primary.execute("SELECT * FROM users")
+        with self.assertRaises(ValueError):
+            primary.execute("INSERT INTO users VALUES (1)")
+        self.assertEqual([statement for _, _, statement in primary.change_log.read()],
+                         ["CREATE TABLE users (id, name)", "INSERT INTO users VALUES (1, 'Alice')"])
+
+        replica = Database(data_dir=os.path.join(self.data_dir, 'replica'), read_only=True)
+        for _, _, statement in primary.change_log.read():
+            replica.apply_change(statement)
+        self.assertEqual(replica.execute("SELECT name FROM users"), [{'name': 'Alice'}])
+        with self.assertRaises(ValueError):
+            replica.execute("DELETE FROM users WHERE id = 1")
+        primary.close()
+        replica.close()
+
+    def test_uncommitted_change_is_hidden_and_discardable(self):
+        log = ChangeLog(self.data_dir)
+        log.append("CREATE TABLE t (id)")
+        lsn = log.write("INSERT INTO t VALUES (1)")
+        self.assertEqual(log.last_lsn, 1)
+        self.assertEqual(log.read(), log.read(after=0, limit=1))
+        log.close()
+        log = ChangeLog(self.data_dir)
+        self.assertEqual(log.last_lsn, 1)
+        self.assertEqual([statement for _, _, statement in log.uncommitted()], ["INSERT INTO t VALUES (1)"])
+        log.discard(lsn)
+        self.assertEqual(log.append("INSERT INTO t VALUES (2)"), 2)
+        self.assertEqual([statement for _, _, statement in log.read()], ["CREATE TABLE t (id)", "INSERT INTO t VALUES (2)"])
+        log.close()
+
+    def test_primary_redoes_last_change_after_crash(self):
+        primary = Database(data_dir=self.data_dir, change_log=True)
+        primary.execute("CREATE TABLE users (id, name)")
+        # A crash after the change was logged but before it reached the table
+        primary.change_log.write("INSERT INTO users VALUES (1, 'Alice')")
+        primary.close()
+
+        primary = Database(data_dir=self.data_dir, change_log=True)
+        self.assertEqual(primary.change_log.last_lsn, 2)
+        self.assertEqual(primary.execute("SELECT * FROM users"), [{'id': 1, 'name': 'Alice'}])
+        # Committed changes are not run again, so a later delete is not undone on reopening
+        primary.execute("DELETE FROM users WHERE id = 1")
+        # A crash after a failed statement was logged but before it was discarded
+        primary.change_log.write("INSERT INTO users VALUES (2)")
+        primary.close()
+
+        primary = Database(data_dir=self.data_dir, change_log=True)
+        self.assertEqual(primary.execute("SELECT * FROM users"), [])
+        self.assertEqual(primary.change_log.last_lsn, 3)
+        self.assertEqual(primary.change_log.uncommitted(), [])
+        self.assertEqual(primary.change_log.read(after=2)[0][2], "DELETE FROM users WHERE id = 1")
+        primary.close()
+
+    def test_replica_stops_on_failed_change(self):
+        changes = [
+            (1, time.time(), "CREATE TABLE users (id, name)"),
+            (2, time.time(), "INSERT INTO users VALUES (1, 'Alice')"),
+            (3, time.time(), "CREATE TABLE users (id)"),
+            (4, time.time(), "INSERT INTO users VALUES (2, 'Bob')"),
+        ]
+        replica_db = Database(data_dir=self.data_dir, read_only=True)
+        replica = Replica(replica_db, 'http://primary')
+        replica._session = _FakeSession(changes)
+        self.assertEqual(replica.poll(), 2)
+        self.assertEqual(replica.status()['applied_lsn'], 2)
+        self.assertIn("LSN 3", replica.status()['diverged'])
+        self.assertEqual(replica.poll(), 0)
+        replica_db.close()
+
+        # After a restart, the first change may already have been applied before the crash
+        replica_db = Database(data_dir=self.data_dir, read_only=True)
+        replica = Replica(replica_db, 'http://primary')
+        replica.applied_lsn = 0
+        replica._replayed_lsn = 1
+        replica._session = _FakeSession(changes[:2])
+        self.assertEqual(replica.poll(), 2)
+        self.assertIsNone(replica.diverged)
+        self.assertEqual(replica_db.execute("SELECT name FROM users"), [{'name': 'Alice'}])
+        replica_db.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+
+class _FakeSession:
+    """Answers a replica's requests for changes from a fixed list, in place of a primary."""
+
+    def __init__(self, changes):
+        self.changes = changes
+
+    def get(self, url, params, timeout):
+        return _FakeResponse({
+            'changes': [change for change in self.changes if change[0] > params['after']][:params['limit']],
+            'last_lsn': len(self.changes),
+        })
+
+
+class _FakeResponse:
+
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TestReplicaProcesses(unittest.TestCase):
+    """Runs a primary and two replicas as local server processes."""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='simpldb-replication-')
+        self.processes = []
+        self.primary_port = self._start_server('primary', {'SIMPLDB_ROLE': 'primary'})
+        self.replica_ports = [
+            self._start_server(f"replica{i}", {
+                'SIMPLDB_ROLE': 'replica',
+                'SIMPLDB_PRIMARY_URL': f"http://127.0.0.1:{self.primary_port}",
+            })
+            for i in range(2)
+        ]
+
+    def _start_server(self, name, env):
+        port = _free_port()
+        cwd = os.path.join(self.workdir, name)
+        os.makedirs(cwd)
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'server:app', '--port', str(port), '--log-level', 'warning'],
+            cwd=cwd, env={**os.environ, 'PYTHONPATH': SRC_DIR, **env},
+        )
+        self.processes.append(process)
+        deadline = time.time() + 15
+        while True:
+            try:
+                requests.get(f"http://127.0.0.1:{port}/replication")
+                return port
+            except requests.exceptions.ConnectionError:
+                if time.time() > deadline or process.poll() is not None:
+                    raise RuntimeError("uvicorn did not start")
+                time.sleep(0.1)
+
+    def _wait_for_replicas(self, lsn):
+        deadline = time.time() + 15
+        for port in self.replica_ports:
+            while requests.get(f"http://127.0.0.1:{port}/replication").json()['applied_lsn'] < lsn:
+                self.assertLess(time.time(), deadline, "replica did not catch up")
+                time.sleep(0.05)
+
+    def test_replicas_serve_reads(self):
+        client = SQLClient('127.0.0.1', self.primary_port, replicas=[('127.0.0.1', port) for port in self.replica_ports])
+        client.send_command("CREATE TABLE users (id, name)")
+        for i in range(20):
+            client.send_command(f"INSERT INTO users VALUES ({i}, 'user{i}')")
+        status = requests.get(f"http://127.0.0.1:{self.primary_port}/replication").json()
+        self.assertEqual(status['last_lsn'], 21)
+        self._wait_for_replicas(21)
+
+        for _ in self.replica_ports:
+            response = client.send_command("SELECT name FROM users WHERE id = 7")
+            self.assertEqual(response['result'], [{'name': 'user7'}])
+            self.assertEqual(response['replication']['lag_changes'], 0)
+        response = requests.post(
+            f"http://127.0.0.1:{self.replica_ports[0]}/execute", json={'command': "DELETE FROM users WHERE id = 1"}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("read-only replica", response.json()['detail'])
+
+        client.send_command("UPDATE users SET name='changed' WHERE id=7")
+        self._wait_for_replicas(22)
+        self.assertEqual(client.send_command("SELECT name FROM users WHERE id = 7")['result'], [{'name': 'changed'}])
+
+    def tearDown(self):
+        for process in self.processes:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
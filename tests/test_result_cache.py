@@ -0,0 +1,46 @@
+import unittest
+from collections import Counter
+from result_cache import ResultCache
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResultCache(max_bytes=10000)
+        self.versions = Counter()
+
+    def test_normalize(self):
+        key = self.cache.normalize("SELECT * FROM users WHERE id = 1")
+        self.assertEqual(key, self.cache.normalize("select  *\nfrom users where id = 1"))
+        self.assertNotEqual(key, self.cache.normalize("SELECT * FROM users WHERE id = 2"))
+        self.assertNotEqual(key, self.cache.normalize("SELECT * FROM Users WHERE id = 1"))
+        self.assertIsNone(self.cache.normalize("INSERT INTO users VALUES (1, 'a')"))
+        self.assertIsNone(self.cache.normalize("SELECT # FROM users"))
+
+    def test_hit_miss_and_invalidation(self):
+        key = self.cache.normalize("SELECT * FROM users")
+        self.assertIsNone(self.cache.get(key, self.versions))
+        self.cache.put(key, 'users', self.versions['users'], [{'id': 1}])
+        result = self.cache.get(key, self.versions)
+        self.assertEqual(result, [{'id': 1}])
+        result[0]['id'] = 2
+        self.assertEqual(self.cache.get(key, self.versions), [{'id': 1}])
+
+        self.versions['users'] += 1
+        self.assertIsNone(self.cache.get(key, self.versions))
+        self.assertEqual(self.cache.stats, Counter(hits=2, misses=2, invalidations=1))
+        self.assertEqual(self.cache.size, 0)
+
+    def test_lru_eviction(self):
+        rows = [{'id': i, 'name': f"{i:0100d}"} for i in range(10)]
+        keys = [self.cache.normalize(f"SELECT * FROM t WHERE id = {i}") for i in range(20)]
+        for key in keys[:10]:
+            self.cache.put(key, 't', 0, rows)
+        self.cache.get(keys[0], self.versions)
+        for key in keys[10:]:
+            self.cache.put(key, 't', 0, rows)
+        self.assertLessEqual(self.cache.size, self.cache.max_bytes)
+        self.assertGreater(self.cache.stats['evictions'], 0)
+        self.assertIn(keys[-1], self.cache.entries)
+        self.assertNotIn(keys[1], self.cache.entries)
+
+if __name__ == '__main__':
+    unittest.main()
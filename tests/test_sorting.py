@@ -0,0 +1,38 @@
+import random
+import unittest
+from sorting import ExternalSorter, TopK
+
+class TestExternalSorter(unittest.TestCase):
+    def test_sort_in_memory(self):
+        sorter = ExternalSorter(key=lambda x: x)
+        sorter.extend([5, 1, 4, 2, 3])
+        self.assertEqual(list(sorter), [1, 2, 3, 4, 5])
+        self.assertEqual(sorter.runs, [])
+
+    def test_sort_spills_runs(self):
+        values = list(range(2500))
+        random.Random(7).shuffle(values)
+        sorter = ExternalSorter(key=lambda x: x, buffer_size=100)
+        sorter.extend(values)
+        self.assertEqual(len(sorter.runs), 25)
+        self.assertEqual(list(sorter), sorted(values))
+
+    def test_sort_descending_is_stable(self):
+        rows = [(i % 3, i) for i in range(30)]
+        sorter = ExternalSorter(key=lambda r: r[0], reverse=True, buffer_size=4)
+        sorter.extend(rows)
+        self.assertEqual(list(sorter), sorted(rows, key=lambda r: r[0], reverse=True))
+
+class TestTopK(unittest.TestCase):
+    def test_top_k(self):
+        values = list(range(1000))
+        random.Random(3).shuffle(values)
+        top = TopK(5, key=lambda x: x)
+        top.extend(values)
+        self.assertEqual(list(top), [0, 1, 2, 3, 4])
+        self.assertLessEqual(len(top.buffer), 5)
+
+    def test_top_k_descending(self):
+        top = TopK(3, key=lambda x: x, reverse=True)
+        top.extend([4, 9, 1, 7, 3])
+        self.assertEqual(list(top), [9, 7, 4])
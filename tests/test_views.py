@@ -0,0 +1,57 @@
+import unittest
+import shutil
+from ast_nodes import Aggregate, SelectStatement, WhereClause
+from btree import BTree
+from views import MaterializedView, view_aggregator
+
+
+class TestMaterializedView(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_path = 'data_view'
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+        self.select = SelectStatement(
+            ['kind', Aggregate('sum', 'n'), Aggregate('min', 'n')], 'source',
+            where_clause=WhereClause('n', 0, '>'), group_by=['kind'],
+        )
+        self.view = MaterializedView(self.select, 0, BTree(t=3, storage_path=self.storage_path))
+
+    def _expected(self, rows):
+        return view_aggregator(self.select).extend(row for row in rows if row['n'] > 0).results()
+
+    def test_deltas_match_recomputation(self):
+        """Test that applying row changes one at a time gives the same groups as aggregating anew."""
+        rows = {i: {'kind': i % 4, 'n': i} for i in range(40)}
+        self.view.load(view_aggregator(self.select).extend(row for row in rows.values() if row['n'] > 0))
+        for i in range(0, 40, 3):
+            self.view.apply(rows.pop(i), None)
+        self.view.apply(rows[7], {'kind': 9, 'n': 7})
+        rows[7] = {'kind': 9, 'n': 7}
+        self.view.apply(None, {'kind': 0, 'n': -5})
+        rows[40] = {'kind': 0, 'n': -5}
+
+        # Deleting the minimum of a group leaves it to be recomputed from the source
+        self.assertEqual(self.view.stale, {(3,)})
+        self.view.refresh(rows.values())
+        self.assertEqual(self.view.stale, set())
+        self.assertEqual(
+            self.view.rows(),
+            [{key: value for key, value in row.items() if key != 'count(*)'} for row in self._expected(rows.values())],
+        )
+
+    def test_groups_without_rows_are_dropped(self):
+        """Test that a group disappears once its last row is deleted."""
+        self.view.apply(None, {'kind': 'a', 'n': 1})
+        self.view.apply(None, {'kind': 'b', 'n': 2})
+        self.assertEqual([row['kind'] for row in self.view.rows()], ['a', 'b'])
+        self.view.apply({'kind': 'a', 'n': 1}, None)
+        self.view.refresh([{'kind': 'b', 'n': 2}])
+        self.assertEqual(self.view.rows(), [{'kind': 'b', 'sum(n)': 2, 'min(n)': 2}])
+
+    def tearDown(self):
+        self.view.btree.close()
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()